@@ -1,12 +1,17 @@
 """
 Preset: a 3-wheel robot (kinematic model a. k. a. non-holonomic integrator).
 
+The preset may also be imported, e.g., by ``sweep_3wrobot_NI.py``: :func:`setup` then makes a configuration from command-line arguments,
+with which :func:`run_episode` runs episodes without relaunching Python.
+
 """
   
 import pathlib  
   
 import warnings
 import csv
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
 from datetime import datetime
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
@@ -36,12 +41,22 @@ parser = argparse.ArgumentParser(description=description)
 
 parser.add_argument('--ctrl_mode', metavar='ctrl_mode', type=str,
                     choices=['MPC',
+                             'MPPI',
+                             'CEM',
+                             'EMPC',
+                             'RTI',
+                             'RQL',
+                             'SQL',
                              "N_CTRL"],
                     default='N_CTRL',
                     help='Control mode. Currently available: ' +
                     '----manual: manual constant control specified by action_manual; ' +
                     '----nominal: nominal controller, usually used to benchmark optimal controllers;' +                     
                     '----MPC:model-predictive control; ' +
+                    '----MPPI: model-predictive control via model-predictive path integral (sampling-based optimizer); ' +
+                    '----CEM: model-predictive control via cross-entropy method (sampling-based optimizer); ' +
+                    '----EMPC: explicit model-predictive control, i.e., interpolation in a policy table precomputed by build_policy_table_3wrobot_NI.py; ' +
+                    '----RTI: model-predictive control via real-time iterations, i.e., rti_iters optimizer iterations per sample; ' +
                     '----RQL: Q-learning actor-critic with Nactor-1 roll-outs of running objective; ' +
                     '----SQL: stacked Q-learning; ' + 
                     '----RLStabLyap: (experimental!) learning agent with Lyapunov-like stabilizing contraints.')
@@ -51,9 +66,31 @@ parser.add_argument('--dt', type=float, metavar='dt',
 parser.add_argument('--t1', type=float, metavar='t1',
                     default=30,
                     help='Final time of episode.' )
+parser.add_argument('--solver', type=str,
+                    default='RK45',
+                    choices=['RK45',
+                             'RK4',
+                             'exact'],
+                    help='Integration scheme of the simulator. ' +
+                    '----RK45: adaptive Runge-Kutta scheme; ' +
+                    '----RK4: fixed-step Runge-Kutta scheme, one step dt per simulation step; ' +
+                    '----exact: closed-form solution of the robot kinematics under the held action, one step dt per simulation step.')
+parser.add_argument('--is_event_driven', type=int,
+                    default=0,
+                    help='Flag to integrate (with RK45) straight to the next controller sample time on each simulation step, ' +
+                    'so that the controller and the logger are only called at sample instants.')
+parser.add_argument('--Ninterp', type=int,
+                    default=0,
+                    help='Number of interpolated points per simulation step in the event-driven mode, drawn in the visualization between the samples. ' +
+                    'If 0, only the samples are drawn.')
 parser.add_argument('--Nruns', type=int,
                     default=1,
                     help='Number of episodes. Learned parameters are not reset after an episode.')
+parser.add_argument('--workers', type=int,
+                    default=0,
+                    help='Number of worker processes to run the episodes in parallel. ' +
+                    'Each episode then starts with a fresh controller and own seeds derived from --seed, so that results do not depend on the number of workers. ' +
+                    'Zero runs the episodes back to back in one process.')
 parser.add_argument('--is_log_data', type=int,
                     default=1,
                     help='Flag to log data into a data file. Data are stored in simdata folder.')
@@ -113,6 +150,15 @@ parser.add_argument('--critic_struct', type=str,
                     '----poly3: 3-order model, see the code for the exact structure; ' +
                     '----poly4: 4-order model, see the code for the exact structure. '
                     )
+parser.add_argument('--critic_forget', type=float,
+                    default=1.0,
+                    help='Forgetting factor in (0, 1] of the recursive least-squares critic update.')
+parser.add_argument('--is_est_model', type=int,
+                    default=0,
+                    help='Flag to predict with a linear model identified online (every critic period) from the controller buffers instead of the true robot model.')
+parser.add_argument('--model_est_forget', type=float,
+                    default=1.0,
+                    help='Forgetting factor in (0, 1] of the recursive least-squares model update.')
 parser.add_argument('--actor_struct', type=str,
                     default='quad-nomix', choices=['quad-lin',
                                                    'quadratic',
@@ -121,6 +167,72 @@ parser.add_argument('--actor_struct', type=str,
                     '----quad-lin: quadratic-linear; ' +
                     '----quadratic: quadratic; ' +
                     '----quad-nomix: quadratic, no mixed terms.')
+parser.add_argument('--is_warm_start', type=int,
+                    default=0,
+                    help='Flag to warm-start the actor optimizer with the previous optimal action sequence shifted by one sample. ' +
+                    'See "python benchmarks.py warm_start" for the solver work with vs. without warm start.')
+parser.add_argument('--warm_start_tail', type=str,
+                    default='repeat', choices=['repeat',
+                                               'zero',
+                                               'nominal'],
+                    help='How to fill the tail of the shifted warm-start sequence: ' +
+                    '----repeat: repeat the last action; ' +
+                    '----zero: zero action; ' +
+                    '----nominal: action of the nominal controller at the predicted terminal observation.')
+parser.add_argument('--Nsamples', type=int,
+                    default=1000,
+                    help='Number of sampled action sequences per iteration of sampling-based optimizers (MPPI, CEM).')
+parser.add_argument('--sampling_iters', type=int,
+                    default=3,
+                    help='Number of iterations of sampling-based optimizers (MPPI, CEM).')
+parser.add_argument('--sampling_temperature', type=float,
+                    default=0.1,
+                    help='Temperature of MPPI sample weighting relative to the spread of sampled costs.')
+parser.add_argument('--is_sampling_float32', type=int,
+                    default=0,
+                    help='Flag to compute rollouts of sampling-based optimizers (MPPI, CEM) in single precision.')
+parser.add_argument('--policy_table_file', type=str,
+                    default='policy_tables/3wrobot_NI.npz',
+                    help='Policy table for explicit MPC (EMPC), see build_policy_table_3wrobot_NI.py.')
+parser.add_argument('--cache_size', type=int,
+                    default=0,
+                    help='Size of the action cache in front of the actor optimizer (least recently used entries are evicted). Zero disables the cache.')
+parser.add_argument('--cache_quant', type=float, nargs='+',
+                    default=[1e-2],
+                    help='Quantization step of observations used as cache keys. Either a single number or one per observation component.')
+parser.add_argument('--cache_mode', type=str,
+                    default='exact', choices=['exact',
+                                              'warm'],
+                    help='Use of cached action sequences: ' +
+                    '----exact: as the solution; ' +
+                    '----warm: only as the initial guess of the actor optimizer.')
+parser.add_argument('--actor_formulation', type=str,
+                    default='single', choices=['single',
+                                               'multiple'],
+                    help='Formulation of the actor problem in MPC mode: ' +
+                    '----single: single shooting (prediction nested inside the cost); ' +
+                    '----multiple: multiple shooting (predicted states as decision variables with defect constraints, solved by trust-constr with sparse derivatives), experimental and slower than single shooting.')
+parser.add_argument('--is_glob_opt', type=int,
+                    default=0,
+                    help='Flag to run the actor optimizer from several initial guesses in parallel worker processes and keep the best solution.')
+parser.add_argument('--Nstarts', type=int,
+                    default=4,
+                    help='Number of starts of the multi-start actor optimizer.')
+parser.add_argument('--Nworkers', type=int,
+                    default=None,
+                    help='Number of worker processes of the multi-start actor optimizer. Defaults to the number of CPUs.')
+parser.add_argument('--rti_iters', type=int,
+                    default=1,
+                    help='Iteration budget of the actor optimizer per sample in RTI mode.')
+parser.add_argument('--deadline', type=float,
+                    default=0,
+                    help='Wall-clock budget (in seconds) of the controller per sample. If exceeded, the solve is abandoned and a fallback action is applied. Zero disables the deadline.')
+parser.add_argument('--deadline_fallback', type=str,
+                    default='nominal', choices=['nominal',
+                                                'shift'],
+                    help='Fallback action on a deadline miss: ' +
+                    '----nominal: action of the nominal controller; ' +
+                    '----shift: respective action of the last plan computed in time.')
 parser.add_argument('--init_robot_pose_x', type=float,
                     default=-3.0,
                     help='Initial x-coordinate of the robot pose.')
@@ -143,38 +255,38 @@ parser.add_argument('--seed', type=int,
                     default=1,
                     help='Seed for random number generation.')
 
-args = parser.parse_args()
-
-seed=args.seed
-print(seed)
-
-xdistortion_x = args.distortion_x
-ydistortion_y = args.distortion_y
-distortion_sigma = args.distortion_sigma
-
-x = args.init_robot_pose_x
-y = args.init_robot_pose_y
-theta = args.init_robot_pose_theta
-
-while theta > np.pi:
-        theta -= 2 * np.pi
-while theta < -np.pi:
-        theta += 2 * np.pi
-
-state_init = np.array([x, y, theta])
-
-args.action_manual = np.array(args.action_manual)
-
-pred_step_size = args.dt * args.pred_step_size_multiplier
-critic_period = args.dt * args.critic_period_multiplier
-
-R1 = np.diag(np.array(args.R1_diag))
-R2 = np.diag(np.array(args.R2_diag))
-
-assert args.t1 > args.dt > 0.0
-assert state_init.size == dim_state
-
-globals().update(vars(args))
+def setup(argv=None):
+    """
+    Configuration of the preset from the command-line arguments ``argv`` (defaults to ``sys.argv[1:]``): 
+    the parsed arguments along with the settings derived from them (``state_init``, ``pred_step_size``, ``critic_period``, ``R1`` and ``R2``).
+    It is passed to :func:`make_sys`, :func:`make_ctrl`, :func:`make_simulator` and :func:`run_episode`.
+    
+    """
+    config = parser.parse_args(argv)
+    
+    x = config.init_robot_pose_x
+    y = config.init_robot_pose_y
+    theta = config.init_robot_pose_theta
+    
+    while theta > np.pi:
+            theta -= 2 * np.pi
+    while theta < -np.pi:
+            theta += 2 * np.pi
+    
+    config.state_init = np.array([x, y, theta])
+    
+    config.action_manual = np.array(config.action_manual)
+    
+    assert config.t1 > config.dt > 0.0
+    assert config.state_init.size == dim_state
+    
+    config.pred_step_size = config.dt * config.pred_step_size_multiplier
+    config.critic_period = config.dt * config.critic_period_multiplier
+    
+    config.R1 = np.diag(np.array(config.R1_diag))
+    config.R2 = np.diag(np.array(config.R2_diag))
+    
+    return config
 
 #----------------------------------------Fixed settings
 is_disturb = 0
@@ -203,213 +315,346 @@ omega_max = 2.84
 ctrl_bnds=np.array([[v_min, v_max], [omega_min, omega_max]])
 
 #----------------------------------------Initialization : : system
-my_sys = systems.Sys3WRobotNI(sys_type="diff_eqn", 
-                                     dim_state=dim_state,
-                                     dim_input=dim_input,
-                                     dim_output=dim_output,
-                                     dim_disturb=dim_disturb,
-                                     pars=[],
-                                     ctrl_bnds=ctrl_bnds,
-                                     is_dyn_ctrl=is_dyn_ctrl,
-                                     is_disturb=is_disturb,
-                                     pars_disturb=[])
-
-observation_init = my_sys.out(state_init)
-
-xCoord0 = state_init[0]
-yCoord0 = state_init[1]
-alpha0 = state_init[2]
-alpha_deg_0 = alpha0/2/np.pi
+def make_sys(config, seed):
+    """
+    System of the preset with the configuration ``config`` (see :func:`setup`). ``seed`` (integer or ``numpy.random.SeedSequence``) seeds the disturbance noise.
+    
+    """
+    return systems.Sys3WRobotNI(sys_type="diff_eqn", 
+                                dim_state=dim_state,
+                                dim_input=dim_input,
+                                dim_output=dim_output,
+                                dim_disturb=dim_disturb,
+                                pars=[],
+                                ctrl_bnds=ctrl_bnds,
+                                is_dyn_ctrl=is_dyn_ctrl,
+                                is_disturb=is_disturb,
+                                pars_disturb=[],
+                                seed=seed)
 
 #----------------------------------------Initialization : : model
 
 #----------------------------------------Initialization : : controller
 my_ctrl_nominal = None 
 
-# Predictive optimal controller
-my_ctrl_opt_pred = controllers.ControllerOptimalPredictive(dim_input,
-                                           dim_output,
-                                           ctrl_mode,
-                                           ctrl_bnds = ctrl_bnds,
-                                           action_init = [],
-                                           t0 = t0,
-                                           sampling_time = dt,
-                                           Nactor = Nactor,
-                                           pred_step_size = pred_step_size,
-                                           sys_rhs = my_sys._state_dyn,
-                                           sys_out = my_sys.out,
-                                           state_sys = state_init,
-                                           buffer_size = buffer_size,
-                                           gamma = gamma,
-                                           Ncritic = Ncritic,
-                                           critic_period = critic_period,
-                                           critic_struct = critic_struct,
-                                           run_obj_struct = run_obj_struct,
-                                           run_obj_pars = [R1],
-                                           observation_target = [],
-                                           state_init=state_init,
-                                           obstacle=[xdistortion_x, ydistortion_y,distortion_sigma],
-                                           seed=seed)
-
-
-my_ctrl_benchm = my_ctrl_opt_pred
+def make_ctrl(config, my_sys, seed):
+    """
+    Benchmarked controller of the preset (possibly under a deadline supervisor) with the configuration ``config`` (see :func:`setup`) for the given system.
+    ``seed`` is an integer or ``numpy.random.SeedSequence``.
+    
+    """
+    # Predictive optimal controller
+    my_ctrl_opt_pred = controllers.ControllerOptimalPredictive(dim_input,
+                                               dim_output,
+                                               config.ctrl_mode,
+                                               ctrl_bnds = ctrl_bnds,
+                                               action_init = [],
+                                               t0 = t0,
+                                               sampling_time = config.dt,
+                                               Nactor = config.Nactor,
+                                               pred_step_size = config.pred_step_size,
+                                               sys_rhs = my_sys._state_dyn,
+                                               sys_out = my_sys.out,
+                                               is_batch_sys = 1,
+                                               sys_rhs_jac = my_sys._state_dyn_jac,
+                                               sys_out_jac = my_sys.out_jac,
+                                               state_sys = config.state_init,
+                                               buffer_size = config.buffer_size,
+                                               gamma = config.gamma,
+                                               Ncritic = config.Ncritic,
+                                               critic_period = config.critic_period,
+                                               critic_struct = config.critic_struct,
+                                               run_obj_struct = config.run_obj_struct,
+                                               run_obj_pars = [config.R1],
+                                               observation_target = [],
+                                               state_init=config.state_init,
+                                               obstacle=[config.distortion_x, config.distortion_y,config.distortion_sigma],
+                                               seed=seed,
+                                               is_warm_start=config.is_warm_start,
+                                               warm_start_tail=config.warm_start_tail,
+                                               Nsamples=config.Nsamples,
+                                               sampling_iters=config.sampling_iters,
+                                               sampling_temperature=config.sampling_temperature,
+                                               is_sampling_float32=config.is_sampling_float32,
+                                               policy_table_file=config.policy_table_file,
+                                               cache_size=config.cache_size,
+                                               cache_quant=np.array(config.cache_quant),
+                                               cache_mode=config.cache_mode,
+                                               actor_formulation=config.actor_formulation,
+                                               is_glob_opt=config.is_glob_opt,
+                                               Nstarts=config.Nstarts,
+                                               Nworkers=config.Nworkers,
+                                               rti_iters=config.rti_iters,
+                                               critic_forget=config.critic_forget,
+                                               is_est_model=config.is_est_model,
+                                               model_est_forget=config.model_est_forget)
+    
+    if config.deadline > 0:
+        my_ctrl_benchm = controllers.DeadlineSupervisor(my_ctrl_opt_pred, config.deadline, fallback=config.deadline_fallback)
+    else:
+        my_ctrl_benchm = my_ctrl_opt_pred
+    
+    return my_ctrl_benchm
     
 #----------------------------------------Initialization : : simulator
-my_simulator = simulator.Simulator(sys_type = "diff_eqn",
-                                   closed_loop_rhs = my_sys.closed_loop_rhs,
-                                   sys_out = my_sys.out,
-                                   state_init = state_init,
-                                   disturb_init = [],
-                                   action_init = action_init,
-                                   t0 = t0,
-                                   t1 = t1,
-                                   dt = dt,
-                                   max_step = dt,
-                                   first_step = 1e-4,
-                                   atol = atol,
-                                   rtol = rtol,
-                                   is_disturb = is_disturb,
-                                   is_dyn_ctrl = is_dyn_ctrl)
-
-#----------------------------------------Initialization : : logger
-date = datetime.now().strftime("%Y-%m-%d")
-time = datetime.now().strftime("%Hh%Mm%Ss")
-datafiles = [None] * Nruns
-
-data_folder = 'simdata/' + ctrl_mode + "/Init_angle_{}_seed_{}_Nactor_{}".format(str(state_init[2]), seed, Nactor)
-
-if is_log_data:
-    pathlib.Path(data_folder).mkdir(parents=True, exist_ok=True) 
-
-for k in range(0, Nruns):
-    datafiles[k] = data_folder + '/' + my_sys.name + '_' + ctrl_mode + '_' + date + '_' + time + '__run{run:02d}.csv'.format(run=k+1)
-    
-    if is_log_data:
-        print('Logging data to:    ' + datafiles[k])
-            
-        with open(datafiles[k], 'w', newline='') as outfile:
-            writer = csv.writer(outfile)
-            writer.writerow(['System', my_sys.name ] )
-            writer.writerow(['Controller', ctrl_mode ] )
-            writer.writerow(['dt', str(dt) ] )
-            writer.writerow(['state_init', str(state_init) ] )
-            writer.writerow(['Nactor', str(Nactor) ] )
-            writer.writerow(['pred_step_size_multiplier', str(pred_step_size_multiplier) ] )
-            writer.writerow(['buffer_size', str(buffer_size) ] )
-            writer.writerow(['run_obj_struct', str(run_obj_struct) ] )
-            writer.writerow(['R1_diag', str(R1_diag) ] )
-            writer.writerow(['R2_diag', str(R2_diag) ] )
-            writer.writerow(['Ncritic', str(Ncritic) ] )
-            writer.writerow(['gamma', str(gamma) ] )
-            writer.writerow(['critic_period_multiplier', str(critic_period_multiplier) ] )
-            writer.writerow(['critic_struct', str(critic_struct) ] )
-            writer.writerow(['actor_struct', str(actor_struct) ] )   
-            writer.writerow(['t [s]', 'x [m]', 'y [m]', 'alpha [rad]', 'run_obj', 'accum_obj', 'v [m/s]', 'omega [rad/s]'] )
-
-# Do not display annoying warnings when print is on
-if is_print_sim_step:
+def make_simulator(config, my_sys):
+    """
+    Simulator of the preset with the configuration ``config`` (see :func:`setup`) for the given system.
+    
+    """
+    return simulator.Simulator(sys_type = "diff_eqn",
+                               closed_loop_rhs = my_sys.closed_loop_rhs,
+                               sys_out = my_sys.out,
+                               state_init = config.state_init,
+                               disturb_init = [],
+                               action_init = action_init,
+                               t0 = t0,
+                               t1 = config.t1,
+                               dt = config.dt,
+                               max_step = config.dt,
+                               first_step = 1e-4,
+                               atol = atol,
+                               rtol = rtol,
+                               is_disturb = is_disturb,
+                               is_dyn_ctrl = is_dyn_ctrl,
+                               solver = config.solver,
+                               closed_loop_step = my_sys.closed_loop_step,
+                               is_event_driven = config.is_event_driven,
+                               Ninterp = config.Ninterp)
+
+#----------------------------------------Episode runner (parallel mode)
+def run_episode(config, run, seed_seq, datafile):
+    """
+    Run one episode of the configuration ``config`` (see :func:`setup`) with a fresh system, controller and simulator, seeded by children of ``seed_seq``. 
+    Data rows are appended to ``datafile`` if ``config.is_log_data``.
+    Returns the summary of the episode: final time, accumulated objective, whether the target was reached and the mean controller latency (over the samples, NaN if the episode ended before the first sample).
+    
+    """
+    # Silences the warnings of the worker process
     warnings.filterwarnings('ignore')
     
-my_logger = loggers.Logger3WRobotNI()
-
-#----------------------------------------Main loop
-state_full_init = my_simulator.state_full
-
-if is_visualization:
-    my_animator = visuals.Animator3WRobotNI(objects=(my_simulator,
-                                                     my_sys,
-                                                     my_ctrl_nominal,
-                                                     my_ctrl_benchm,
-                                                     datafiles,
-                                                     controllers.ctrl_selector,
-                                                     my_logger),
-                                            pars=(state_init,
-                                                  action_init,
-                                                  t0,
-                                                  t1,
-                                                  state_full_init,
-                                                  xMin,
-                                                  xMax,
-                                                  yMin,
-                                                  yMax,
-                                                  ctrl_mode,
-                                                  action_manual,
-                                                  v_min,
-                                                  omega_min,
-                                                  v_max,
-                                                  omega_max,
-                                                  Nruns,
-                                                  is_print_sim_step, is_log_data, 0, [], [xdistortion_x, ydistortion_y,distortion_sigma]))
-
-    anm = animation.FuncAnimation(my_animator.fig_sim,
-                                  my_animator.animate,
-                                  init_func=my_animator.init_anim,
-                                  blit=False, interval=dt/1e6, repeat=False)
-    print("ALSO GOOD")
-    my_animator.get_anm(anm)
-    
-    cId = my_animator.fig_sim.canvas.mpl_connect('key_press_event', lambda event: on_key_press(event, anm))
-    
-    anm.running = True
-    
-    my_animator.fig_sim.tight_layout()
-    
-    plt.show()
-    
-else:   
-    run_curr = 1
-    datafile = datafiles[0]
-    
-    while True:
-        
-        my_simulator.sim_step()
-        
-        t, state, observation, state_full = my_simulator.get_sim_step_data()
-        
-        action = controllers.ctrl_selector(t, observation, action_manual, my_ctrl_nominal, my_ctrl_benchm, ctrl_mode)
+    seed_sys, seed_ctrl = seed_seq.spawn(2)
+    
+    my_sys = make_sys(config, seed_sys)
+    my_ctrl_benchm = make_ctrl(config, my_sys, seed_ctrl)
+    my_simulator = make_simulator(config, my_sys)
+    my_logger = loggers.Logger3WRobotNI()
+    
+    latencies = []
+    
+    # The controller is closed also on errors, since its worker processes, if any, would block the exit of this process
+    try:
+        while True:
+            
+            my_simulator.sim_step()
+            
+            t, state, observation, state_full = my_simulator.get_sim_step_data()
+            
+            # Latencies are recorded for new samples only, the controller holds the action in between
+            ctrl_clock = my_ctrl_benchm.ctrl_clock
+            tic = perf_counter()
+            action = controllers.ctrl_selector(t, observation, config.action_manual, my_ctrl_nominal, my_ctrl_benchm, config.ctrl_mode)
+            if my_ctrl_benchm.ctrl_clock != ctrl_clock:
+                latencies.append(perf_counter() - tic)
+            
+            my_sys.receive_action(action)
+            my_ctrl_benchm.receive_sys_state(my_sys._state)
+            my_ctrl_benchm.upd_accum_obj(observation, action)
+            
+            run_obj = my_ctrl_benchm.run_obj(observation, action)
+            accum_obj = my_ctrl_benchm.accum_obj_val
+            
+            if config.is_log_data:
+                my_logger.log_data_row(datafile, t, state_full[0], state_full[1], state_full[2], run_obj, accum_obj, action)
+            
+            is_target_reached = np.linalg.norm(observation[:2]) < 0.2
+            
+            if t >= config.t1 or is_target_reached:
+                break
+    finally:
+        my_ctrl_benchm.close()
+    
+    return {'run': run,
+            't_final': t,
+            'accum_obj': accum_obj,
+            'is_target_reached': int(is_target_reached),
+            'latency_mean': np.mean(latencies) if latencies else np.nan}
+
+if __name__ == '__main__':
+    config = setup()
+    
+    print(config.seed)
+    
+    my_sys = make_sys(config, config.seed)
+    my_ctrl_benchm = make_ctrl(config, my_sys, config.seed)
+    my_simulator = make_simulator(config, my_sys)
+    
+    #----------------------------------------Initialization : : logger
+    date = datetime.now().strftime("%Y-%m-%d")
+    time = datetime.now().strftime("%Hh%Mm%Ss")
+    datafiles = [None] * config.Nruns
+
+    data_folder = 'simdata/' + config.ctrl_mode + "/Init_angle_{}_seed_{}_Nactor_{}".format(str(config.state_init[2]), config.seed, config.Nactor)
+
+    if config.is_log_data:
+        pathlib.Path(data_folder).mkdir(parents=True, exist_ok=True) 
+
+    for k in range(0, config.Nruns):
+        datafiles[k] = data_folder + '/' + my_sys.name + '_' + config.ctrl_mode + '_' + date + '_' + time + '__run{run:02d}.csv'.format(run=k+1)
+    
+        if config.is_log_data:
+            print('Logging data to:    ' + datafiles[k])
+            
+            with open(datafiles[k], 'w', newline='') as outfile:
+                writer = csv.writer(outfile)
+                writer.writerow(['System', my_sys.name ] )
+                writer.writerow(['Controller', config.ctrl_mode ] )
+                writer.writerow(['dt', str(config.dt) ] )
+                writer.writerow(['state_init', str(config.state_init) ] )
+                writer.writerow(['Nactor', str(config.Nactor) ] )
+                writer.writerow(['pred_step_size_multiplier', str(config.pred_step_size_multiplier) ] )
+                writer.writerow(['buffer_size', str(config.buffer_size) ] )
+                writer.writerow(['run_obj_struct', str(config.run_obj_struct) ] )
+                writer.writerow(['R1_diag', str(config.R1_diag) ] )
+                writer.writerow(['R2_diag', str(config.R2_diag) ] )
+                writer.writerow(['Ncritic', str(config.Ncritic) ] )
+                writer.writerow(['gamma', str(config.gamma) ] )
+                writer.writerow(['critic_period_multiplier', str(config.critic_period_multiplier) ] )
+                writer.writerow(['critic_struct', str(config.critic_struct) ] )
+                writer.writerow(['actor_struct', str(config.actor_struct) ] )   
+                writer.writerow(['t [s]', 'x [m]', 'y [m]', 'alpha [rad]', 'run_obj', 'accum_obj', 'v [m/s]', 'omega [rad/s]'] )
+
+    # Do not display annoying warnings when print is on
+    if config.is_print_sim_step:
+        warnings.filterwarnings('ignore')
+    
+    my_logger = loggers.Logger3WRobotNI()
+
+    #----------------------------------------Main loop
+    state_full_init = my_simulator.state_full
+
+    if config.is_visualization:
+        my_animator = visuals.Animator3WRobotNI(objects=(my_simulator,
+                                                         my_sys,
+                                                         my_ctrl_nominal,
+                                                         my_ctrl_benchm,
+                                                         datafiles,
+                                                         controllers.ctrl_selector,
+                                                         my_logger),
+                                                pars=(config.state_init,
+                                                      action_init,
+                                                      t0,
+                                                      config.t1,
+                                                      state_full_init,
+                                                      xMin,
+                                                      xMax,
+                                                      yMin,
+                                                      yMax,
+                                                      config.ctrl_mode,
+                                                      config.action_manual,
+                                                      v_min,
+                                                      omega_min,
+                                                      v_max,
+                                                      omega_max,
+                                                      config.Nruns,
+                                                      config.is_print_sim_step, config.is_log_data, 0, [], [config.distortion_x, config.distortion_y,config.distortion_sigma]))
+
+        anm = animation.FuncAnimation(my_animator.fig_sim,
+                                      my_animator.animate,
+                                      init_func=my_animator.init_anim,
+                                      blit=False, interval=config.dt/1e6, repeat=False)
+        print("ALSO GOOD")
+        my_animator.get_anm(anm)
+    
+        cId = my_animator.fig_sim.canvas.mpl_connect('key_press_event', lambda event: on_key_press(event, anm))
+    
+        anm.running = True
+    
+        my_animator.fig_sim.tight_layout()
+    
+        plt.show()
         
-        my_sys.receive_action(action)
-        my_ctrl_benchm.receive_sys_state(my_sys._state)
-        my_ctrl_benchm.upd_accum_obj(observation, action)
+        my_ctrl_benchm.close()
+    
+    elif config.workers > 0:
+        # One seed sequence per run, independent of the number of workers
+        seed_seqs = np.random.SeedSequence(config.seed).spawn(config.Nruns)
         
-        xCoord = state_full[0]
-        yCoord = state_full[1]
-        alpha = state_full[2]
+        with ProcessPoolExecutor(max_workers=config.workers) as pool:
+            summaries = list( pool.map(run_episode, [config] * config.Nruns, range(1, config.Nruns+1), seed_seqs, datafiles) )
+            
+        my_logger.print_runs_summary(summaries)
         
-        run_obj = my_ctrl_benchm.run_obj(observation, action)
-        accum_obj = my_ctrl_benchm.accum_obj_val
+        if config.is_log_data:
+            summary_file = data_folder + '/' + my_sys.name + '_' + config.ctrl_mode + '_' + date + '_' + time + '__summary.csv'
+            print('Logging summary to: ' + summary_file)
+            my_logger.log_runs_summary(summary_file, summaries)
         
-        count_CALF = my_ctrl_benchm.D_count()
-        count_N_CTRL = my_ctrl_benchm.get_N_CTRL_count()
-
-        if is_print_sim_step:
-            my_logger.print_sim_step(t, xCoord, yCoord, alpha, run_obj, accum_obj, action)
+    else:   
+        run_curr = 1
+        datafile = datafiles[0]
+    
+        # The controller is closed also on errors, since its worker processes, if any, would block the exit
+        try:
+            while True:
             
-        if is_log_data:
-            my_logger.log_data_row(datafile, t, xCoord, yCoord, alpha, run_obj, accum_obj, action)
-        
-
-        if t >= t1 or np.linalg.norm(observation[:2]) < 0.2:
-
-            # Reset simulator
-            my_simulator.reset()
+                my_simulator.sim_step()
             
-            if ctrl_mode != 'nominal':
-                my_ctrl_benchm.reset(t0)
-            else:
-                my_ctrl_nominal.reset(t0)
+                t, state, observation, state_full = my_simulator.get_sim_step_data()
+            
+                action = controllers.ctrl_selector(t, observation, config.action_manual, my_ctrl_nominal, my_ctrl_benchm, config.ctrl_mode)
+            
+                my_sys.receive_action(action)
+                my_ctrl_benchm.receive_sys_state(my_sys._state)
+                my_ctrl_benchm.upd_accum_obj(observation, action)
+            
+                xCoord = state_full[0]
+                yCoord = state_full[1]
+                alpha = state_full[2]
+            
+                run_obj = my_ctrl_benchm.run_obj(observation, action)
+                accum_obj = my_ctrl_benchm.accum_obj_val
             
-            accum_obj = 0 
 
-            if is_print_sim_step:
-                print('.....................................Run {run:2d} done.....................................'.format(run = run_curr))
+                if config.is_print_sim_step:
+                    my_logger.print_sim_step(t, xCoord, yCoord, alpha, run_obj, accum_obj, action)
                 
-            run_curr += 1
+                if config.is_log_data:
+                    my_logger.log_data_row(datafile, t, xCoord, yCoord, alpha, run_obj, accum_obj, action)
             
-            if run_curr > Nruns:
-                plt.close('all')
-                break
+
+                if t >= config.t1 or np.linalg.norm(observation[:2]) < 0.2:
+
+                    # Reset simulator
+                    my_simulator.reset()
+                
+                    if config.ctrl_mode != 'nominal':
+                        my_ctrl_benchm.reset(t0)
+                    else:
+                        my_ctrl_nominal.reset(t0)
+                
+                    accum_obj = 0 
+
+                    if config.is_print_sim_step:
+                        print('.....................................Run {run:2d} done.....................................'.format(run = run_curr))
+                    
+                        if config.ctrl_mode in ['MPC', 'RTI', 'MPPI', 'CEM']:
+                            my_logger.print_solver_stats(my_ctrl_benchm.warm_start.get_stats())
+                        
+                        if my_ctrl_benchm.action_cache is not None:
+                            my_logger.print_cache_stats(my_ctrl_benchm.action_cache.get_stats())
+                        
+                        if config.deadline > 0:
+                            my_logger.print_deadline_stats(my_ctrl_benchm.get_stats())
+                    
+                    run_curr += 1
                 
-            if is_log_data:
-                datafile = datafiles[run_curr-1]
+                    if run_curr > config.Nruns:
+                        plt.close('all')
+                        break
+                    
+                    if config.is_log_data:
+                        datafile = datafiles[run_curr-1]
+        finally:
+            my_ctrl_benchm.close()
                  
@@ -0,0 +1,473 @@
+"""
+Benchmarks of controllers and simulators on the 3-wheel robot setup of ``PRESET_3wrobot_NI.py``.
+
+Usage:
+
+::
+
+    python3 benchmarks.py <benchmark> [options]
+
+Call ``python3 benchmarks.py -h`` for the list of benchmarks and ``python3 benchmarks.py <benchmark> -h`` for their options.
+
+"""
+
+import warnings
+import time
+import numpy as np
+import scipy as sp
+import scipy.integrate
+from tabulate import tabulate
+
+import systems
+import simulator
+import controllers
+
+import argparse
+
+#----------------------------------------Fixed settings (as in the preset)
+dim_state = 3
+dim_input = 2
+dim_output = dim_state
+dim_disturb = 0
+
+# xy-plane
+xMin = -4
+xMax = 0.2
+yMin = -4
+yMax = 0.2
+
+# Control constraints
+v_min = -0.22 *10
+v_max = 0.22 *10
+omega_min = -2.84
+omega_max = 2.84
+
+ctrl_bnds=np.array([[v_min, v_max], [omega_min, omega_max]])
+
+R1 = np.diag([100, 100, 10, 0, 0])
+
+def make_sys():
+    return systems.Sys3WRobotNI(sys_type="diff_eqn",
+                                dim_state=dim_state,
+                                dim_input=dim_input,
+                                dim_output=dim_output,
+                                dim_disturb=dim_disturb,
+                                pars=[],
+                                ctrl_bnds=ctrl_bnds,
+                                is_dyn_ctrl=0,
+                                is_disturb=0,
+                                pars_disturb=[])
+
+def make_ctrl(my_sys, state_init, mode='MPC', Nactor=6, dt=0.1, pred_step_size_multiplier=5.0, gamma=0.9, seed=1, **kwargs):
+    """
+    Predictive controller with the settings of the preset. Extra keyword arguments are passed to :class:`~controllers.ControllerOptimalPredictive`.
+
+    """
+    return controllers.ControllerOptimalPredictive(dim_input,
+                                                   dim_output,
+                                                   mode,
+                                                   ctrl_bnds = ctrl_bnds,
+                                                   action_init = [],
+                                                   t0 = 0,
+                                                   sampling_time = dt,
+                                                   Nactor = Nactor,
+                                                   pred_step_size = dt * pred_step_size_multiplier,
+                                                   sys_rhs = my_sys._state_dyn,
+                                                   sys_out = my_sys.out,
+                                                   is_batch_sys = 1,
+                                                   state_sys = state_init,
+                                                   gamma = gamma,
+                                                   run_obj_struct = 'quadratic',
+                                                   run_obj_pars = [R1],
+                                                   seed = seed,
+                                                   sys_rhs_jac = my_sys._state_dyn_jac,
+                                                   sys_out_jac = my_sys.out_jac,
+                                                   **kwargs)
+
+def random_states(rng, N):
+    """
+    Random robot poses in the xy-box of the preset.
+
+    """
+    return np.column_stack([rng.uniform(xMin, xMax, N),
+                            rng.uniform(yMin, yMax, N),
+                            rng.uniform(-np.pi, np.pi, N)])
+
+def run_episode(my_sys, my_ctrl, state_init, t1=10, dt=0.1):
+    """
+    Closed-loop episode as in the preset (without visualization and logging).
+    The episode ends at ``t1`` or when the robot is within 0.2 m of the origin.
+
+    Returns
+    -------
+    accum_obj : : number
+        Accumulated running objective of the episode.
+    t : : number
+        Time at the end of the episode.
+    latencies : : array
+        Wall-clock times (in seconds) of all controller calls that computed a new action.
+
+    """
+    my_simulator = simulator.Simulator(sys_type = "diff_eqn",
+                                       closed_loop_rhs = my_sys.closed_loop_rhs,
+                                       sys_out = my_sys.out,
+                                       state_init = state_init,
+                                       action_init = np.zeros(dim_input),
+                                       t0 = 0,
+                                       t1 = t1,
+                                       dt = dt,
+                                       max_step = dt,
+                                       first_step = 1e-4,
+                                       atol = 1e-3,
+                                       rtol = 1e-2)
+
+    my_sys.receive_action(np.zeros(dim_input))
+    my_ctrl.receive_sys_state(state_init)
+
+    latencies = []
+
+    while True:
+        my_simulator.sim_step()
+
+        t, state, observation, state_full = my_simulator.get_sim_step_data()
+
+        ctrl_clock = my_ctrl.ctrl_clock
+        time_start = time.perf_counter()
+        action = my_ctrl.compute_action(t, observation)
+        if my_ctrl.ctrl_clock != ctrl_clock:
+            latencies.append(time.perf_counter() - time_start)
+
+        my_sys.receive_action(action)
+        my_ctrl.receive_sys_state(my_sys._state)
+        my_ctrl.upd_accum_obj(observation, action)
+
+        if t >= t1 or np.linalg.norm(observation[:2]) < 0.2:
+            break
+
+    return my_ctrl.accum_obj_val, t, np.array(latencies)
+
+def print_table(row_header, rows, floatfmt='10.3f'):
+    print(tabulate([row_header, *rows], floatfmt=floatfmt, headers='firstrow', tablefmt='grid'))
+
+#----------------------------------------Benchmarks
+def bench_shooting(args):
+    """
+    Solve time of single- vs. multiple-shooting formulations of the actor problem over horizon lengths.
+
+    """
+    rng = np.random.default_rng(args.seed)
+    states = random_states(rng, args.Nstates)
+
+    my_sys = make_sys()
+
+    rows = []
+    for Nactor in args.Nactor:
+        for actor_formulation in ['single', 'multiple']:
+            with make_ctrl(my_sys, states[0], Nactor=Nactor, pred_step_size_multiplier=args.pred_step_size_multiplier, actor_formulation=actor_formulation) as my_ctrl:
+                solve_time = 0
+                J = 0
+                for state in states:
+                    my_ctrl.receive_sys_state(state)
+                    my_ctrl.warm_start.reset()
+
+                    time_start = time.perf_counter()
+                    my_ctrl._actor_optimizer(state)
+                    solve_time += time.perf_counter() - time_start
+
+                    J += my_ctrl._actor_cost(my_ctrl.warm_start.action_sqn.ravel(), state)
+
+                stats = my_ctrl.warm_start.get_stats()['cold']
+                rows.append([Nactor, actor_formulation, solve_time / args.Nstates * 1e3, stats['nit'], J / args.Nstates])
+
+    print_table(['Nactor', 'formulation', 'solve time [ms]', 'iterations', 'avg. actor cost'], rows)
+
+def bench_rti(args):
+    """
+    Closed-loop cost and per-step latency of real-time iterations (RTI) with different iteration budgets vs. MPC solved to convergence.
+
+    """
+    state_init = np.array(args.state_init)
+
+    my_sys = make_sys()
+
+    configs = [('MPC', None)] + [('RTI', rti_iters) for rti_iters in args.rti_iters]
+
+    rows = []
+    for mode, rti_iters in configs:
+        with make_ctrl(my_sys, state_init, mode=mode, Nactor=args.Nactor, is_warm_start=1, rti_iters=rti_iters or 1) as my_ctrl:
+            accum_obj, t, latencies = run_episode(my_sys, my_ctrl, state_init, t1=args.t1)
+
+        rows.append([mode, rti_iters or '-', accum_obj, t, np.mean(latencies) * 1e3, np.max(latencies) * 1e3])
+
+    print_table(['mode', 'iterations per sample', 'accum_obj', 'final time [s]', 'avg. latency [ms]', 'max. latency [ms]'], rows)
+
+def bench_warm_start(args):
+    """
+    Actor optimizer work (iterations and cost function evaluations per solve) and latency with vs. without warm start over closed-loop episodes.
+
+    """
+    rng = np.random.default_rng(args.seed)
+    states_init = random_states(rng, args.Nepisodes)
+
+    my_sys = make_sys()
+
+    rows = []
+    for mode in args.modes:
+        for is_warm_start in [0, 1]:
+            with make_ctrl(my_sys, states_init[0], mode=mode, Nactor=args.Nactor, is_warm_start=is_warm_start) as my_ctrl:
+                accum_objs = []
+                latencies = []
+                for state_init in states_init:
+                    my_ctrl.reset(0)
+                    accum_obj, t, my_latencies = run_episode(my_sys, my_ctrl, state_init, t1=args.t1)
+                    accum_objs.append(accum_obj)
+                    latencies.extend(my_latencies)
+
+                # Solves of a warm-started controller are cold on the first sample of each episode
+                for start, stats in my_ctrl.warm_start.get_stats().items():
+                    if stats['solves'] > 0:
+                        rows.append([mode, is_warm_start, start, stats['solves'], stats['nit'], stats['nfev'], np.mean(latencies) * 1e3, np.mean(accum_objs)])
+
+    print_table(['mode', 'is_warm_start', 'start', 'solves', 'avg. iterations', 'avg. nfev', 'avg. latency [ms]', 'avg. accum_obj'], rows)
+
+def bench_critic(args):
+    """
+    Closed-loop cost and per-step latency of RQL and SQL with a short horizon and a learned critic vs. MPC over horizon lengths.
+
+    """
+    state_init = np.array(args.state_init)
+    rng = np.random.default_rng(args.seed)
+
+    my_sys = make_sys()
+
+    configs = [('MPC', Nactor) for Nactor in args.Nactor_mpc] + [(mode, args.Nactor_rl) for mode in ['RQL', 'SQL']]
+
+    rows = []
+    for mode, Nactor in configs:
+        with make_ctrl(my_sys, state_init, mode=mode, Nactor=Nactor, is_warm_start=1,
+                       buffer_size=args.Ncritic+1, Ncritic=args.Ncritic, critic_period=args.critic_period, critic_struct=args.critic_struct) as my_ctrl:
+            # Critic learning. The learned weights are retained across episodes
+            if mode in ['RQL', 'SQL']:
+                for my_state_init in random_states(rng, args.Nepisodes_train):
+                    my_ctrl.reset(0)
+                    run_episode(my_sys, my_ctrl, my_state_init, t1=args.t1)
+
+            my_ctrl.reset(0)
+            accum_obj, t, latencies = run_episode(my_sys, my_ctrl, state_init, t1=args.t1)
+
+        rows.append([mode, Nactor, accum_obj, t, np.mean(latencies) * 1e3, np.max(latencies) * 1e3])
+
+    print_table(['mode', 'Nactor', 'accum_obj', 'final time [s]', 'avg. latency [ms]', 'max. latency [ms]'], rows)
+
+def bench_simulator(args):
+    """
+    Throughput of the simulator's integration schemes (and of the event-driven mode) under piecewise-constant random actions and their trajectory error against a tightly toleranced RK45 solution.
+
+    """
+    rng = np.random.default_rng(args.seed)
+    
+    state_init = random_states(rng, 1)[0]
+    actions = rng.uniform(ctrl_bnds[:, 0], ctrl_bnds[:, 1], size=[int(np.round(args.t1 / args.dt)) + 1, dim_input])
+
+    rows = []
+    configs = [('RK45', 'RK45', 0), ('RK45, event-driven', 'RK45', 1), ('RK4', 'RK4', 0), ('exact', 'exact', 0)]
+    
+    for label, solver, is_event_driven in configs:
+        my_sys = make_sys()
+        
+        Nrhs_calls = [0]
+        def closed_loop_rhs(t, state_full, out=None):
+            Nrhs_calls[0] += 1
+            return my_sys.closed_loop_rhs(t, state_full, out=out)
+        
+        my_simulator = simulator.Simulator(sys_type = "diff_eqn",
+                                           closed_loop_rhs = closed_loop_rhs,
+                                           sys_out = my_sys.out,
+                                           state_init = state_init,
+                                           action_init = actions[0],
+                                           t0 = 0,
+                                           t1 = args.t1,
+                                           dt = args.dt,
+                                           max_step = args.dt,
+                                           first_step = 1e-4,
+                                           atol = 1e-3,
+                                           rtol = 1e-2,
+                                           solver = solver,
+                                           closed_loop_step = my_sys.closed_loop_step,
+                                           is_event_driven = is_event_driven)
+        
+        # Actions switch at the controller sample times (as in the preset), which are recorded along with the states
+        my_sys.receive_action(actions[0])
+        switch_times = [0]
+        switch_states = [state_init]
+        Nsteps = 0
+        
+        time_start = time.perf_counter()
+        while my_simulator.t < args.t1:
+            my_simulator.sim_step()
+            Nsteps += 1
+            
+            if my_simulator.t - switch_times[-1] >= args.dt * (1 - 1e-9):
+                my_sys.receive_action(actions[len(switch_times)])
+                switch_times.append(my_simulator.t)
+                switch_states.append(my_simulator.state.copy())
+        wall_time = time.perf_counter() - time_start
+        
+        # Reference: each hold interval integrated from the reference state with the same action
+        state_ref = state_init
+        error = 0
+        for k in range(1, len(switch_times)):
+            my_sys.receive_action(actions[k-1])
+            state_ref = sp.integrate.solve_ivp(my_sys.closed_loop_rhs, [switch_times[k-1], switch_times[k]], state_ref, 
+                                               method='RK45', rtol=1e-10, atol=1e-12).y[:, -1]
+            error = max(error, np.linalg.norm(switch_states[k][:2] - state_ref[:2]))
+        
+        rows.append([label, Nsteps / wall_time, args.t1 / wall_time, Nsteps / args.t1, Nrhs_calls[0] / args.t1, error])
+
+    print_table(['solver', 'steps per second', 'simulated seconds per second', 'steps per simulated second', 'rhs calls per simulated second', 'max. position error [m]'], 
+                rows, floatfmt='10.3g')
+
+def bench_vecsim(args):
+    """
+    Throughput (environment steps per second) of the vectorized simulator over the number of environments vs. one fixed-step simulator per environment.
+
+    """
+    rng = np.random.default_rng(args.seed)
+    
+    my_sys = make_sys()
+    
+    def is_terminal(observations):
+        return np.linalg.norm(observations[:, :2], axis=1) < 0.2
+
+    rows = []
+    
+    # Reference: a single environment with the (non-vectorized) simulator with the same scheme
+    state_init = random_states(rng, 1)[0]
+    my_simulator = simulator.Simulator(sys_type = "diff_eqn",
+                                       closed_loop_rhs = my_sys.closed_loop_rhs,
+                                       sys_out = my_sys.out,
+                                       state_init = state_init,
+                                       action_init = np.zeros(dim_input),
+                                       t0 = 0,
+                                       t1 = args.t1,
+                                       dt = args.dt,
+                                       solver = 'RK4')
+    
+    actions = rng.uniform(ctrl_bnds[:, 0], ctrl_bnds[:, 1], size=[args.Nsteps, dim_input])
+    
+    time_start = time.perf_counter()
+    for action in actions:
+        my_sys.receive_action(action)
+        my_simulator.sim_step()
+    rows.append(['Simulator (RK4)', 1, args.Nsteps / (time.perf_counter() - time_start)])
+    
+    for Nenvs in args.Nenvs:
+        my_vec_simulator = simulator.VecSimulator(my_sys._state_dyn,
+                                                  my_sys.out,
+                                                  random_states(rng, Nenvs),
+                                                  ctrl_bnds = ctrl_bnds,
+                                                  t0 = 0,
+                                                  t1 = args.t1,
+                                                  dt = args.dt,
+                                                  is_terminal = is_terminal,
+                                                  state_init_sampler = lambda Nresets: random_states(rng, Nresets))
+        
+        actions = rng.uniform(ctrl_bnds[:, 0], ctrl_bnds[:, 1], size=[Nenvs, dim_input])
+        
+        time_start = time.perf_counter()
+        for _ in range(args.Nsteps):
+            my_vec_simulator.sim_step(actions)
+        rows.append(['VecSimulator', Nenvs, Nenvs * args.Nsteps / (time.perf_counter() - time_start)])
+
+    print_table(['simulator', 'environments', 'environment steps per second'], rows, floatfmt='10.3g')
+
+BENCHMARKS = {'shooting': bench_shooting,
+              'rti': bench_rti,
+              'warm_start': bench_warm_start,
+              'critic': bench_critic,
+              'simulator': bench_simulator,
+              'vecsim': bench_vecsim}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks on the 3-wheel robot setup of the preset.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parser_shooting = subparsers.add_parser('shooting', help=bench_shooting.__doc__.strip())
+    parser_shooting.add_argument('--Nactor', type=int, nargs='+', default=[5, 10, 20, 40, 80],
+                                 help='Horizon lengths.')
+    parser_shooting.add_argument('--pred_step_size_multiplier', type=float, default=1.0,
+                                 help='Size of each prediction step is a pred_step_size_multiplier multiple of the sampling time.')
+    parser_shooting.add_argument('--Nstates', type=int, default=10,
+                                 help='Number of random initial states to solve at.')
+    parser_shooting.add_argument('--seed', type=int, default=1,
+                                 help='Seed for random number generation.')
+
+    parser_rti = subparsers.add_parser('rti', help=bench_rti.__doc__.strip())
+    parser_rti.add_argument('--rti_iters', type=int, nargs='+', default=[1, 2, 5],
+                            help='Iteration budgets per sample.')
+    parser_rti.add_argument('--Nactor', type=int, default=6,
+                            help='Horizon length.')
+    parser_rti.add_argument('--state_init', type=float, nargs=3, default=[-3.0, -3.0, 1.57],
+                            help='Initial robot pose.')
+    parser_rti.add_argument('--t1', type=float, default=10,
+                            help='Final time of the episode.')
+
+    parser_warm_start = subparsers.add_parser('warm_start', help=bench_warm_start.__doc__.strip())
+    parser_warm_start.add_argument('--modes', type=str, nargs='+', default=['MPC', 'MPPI'],
+                                   choices=['MPC', 'MPPI', 'CEM'],
+                                   help='Controller modes.')
+    parser_warm_start.add_argument('--Nactor', type=int, default=6,
+                                   help='Horizon length.')
+    parser_warm_start.add_argument('--Nepisodes', type=int, default=5,
+                                   help='Number of episodes (from random initial poses).')
+    parser_warm_start.add_argument('--t1', type=float, default=5,
+                                   help='Final time of an episode.')
+    parser_warm_start.add_argument('--seed', type=int, default=1,
+                                   help='Seed for random number generation.')
+
+    parser_critic = subparsers.add_parser('critic', help=bench_critic.__doc__.strip())
+    parser_critic.add_argument('--Nactor_mpc', type=int, nargs='+', default=[3, 6, 12],
+                               help='Horizon lengths of MPC.')
+    parser_critic.add_argument('--Nactor_rl', type=int, default=3,
+                               help='Horizon length of RQL and SQL.')
+    parser_critic.add_argument('--critic_struct', type=str, default='quad-mix',
+                               choices=['quad-lin', 'quadratic', 'quad-nomix', 'quad-mix', 'poly3', 'poly4'],
+                               help='Feature structure (critic).')
+    parser_critic.add_argument('--Ncritic', type=int, default=50,
+                               help='Critic stack size.')
+    parser_critic.add_argument('--critic_period', type=float, default=0.5,
+                               help='Critic update period.')
+    parser_critic.add_argument('--Nepisodes_train', type=int, default=5,
+                               help='Number of critic learning episodes (from random initial poses) before the evaluation episode.')
+    parser_critic.add_argument('--state_init', type=float, nargs=3, default=[-3.0, -3.0, 1.57],
+                               help='Initial robot pose of the evaluation episode.')
+    parser_critic.add_argument('--t1', type=float, default=10,
+                               help='Final time of an episode.')
+    parser_critic.add_argument('--seed', type=int, default=1,
+                               help='Seed for random number generation.')
+
+    parser_simulator = subparsers.add_parser('simulator', help=bench_simulator.__doc__.strip())
+    parser_simulator.add_argument('--dt', type=float, default=0.1,
+                                  help='Controller sampling time, which is also the step size of the fixed-step schemes.')
+    parser_simulator.add_argument('--t1', type=float, default=100,
+                                  help='Final time.')
+    parser_simulator.add_argument('--seed', type=int, default=1,
+                                  help='Seed for random number generation.')
+
+    parser_vecsim = subparsers.add_parser('vecsim', help=bench_vecsim.__doc__.strip())
+    parser_vecsim.add_argument('--Nenvs', type=int, nargs='+', default=[1, 10, 100, 1000, 10000],
+                               help='Numbers of environments.')
+    parser_vecsim.add_argument('--Nsteps', type=int, default=1000,
+                               help='Number of simulation steps.')
+    parser_vecsim.add_argument('--dt', type=float, default=0.1,
+                               help='Step size.')
+    parser_vecsim.add_argument('--t1', type=float, default=30,
+                               help='Final time of an episode.')
+    parser_vecsim.add_argument('--seed', type=int, default=1,
+                               help='Seed for random number generation.')
+
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+
+    BENCHMARKS[args.benchmark](args)
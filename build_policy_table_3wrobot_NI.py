@@ -0,0 +1,157 @@
+"""
+Offline builder of an explicit MPC policy table for the 3-wheel robot preset (kinematic model a. k. a. non-holonomic integrator).
+
+Solves the MPC problem of the preset on a regular grid over the xy-box of the preset and all orientation angles,
+stores the first actions in a compact array file for the ``EMPC`` controller mode and reports the interpolation error
+against the online solver on held-out states.
+
+"""
+
+import pathlib
+
+import warnings
+import time
+import numpy as np
+from tabulate import tabulate
+
+import systems
+import controllers
+
+import argparse
+
+#----------------------------------------Set up dimensions
+dim_state = 3
+dim_input = 2
+dim_output = dim_state
+dim_disturb = 0
+
+description = "Builder of an explicit MPC policy table for the 3-wheel robot preset."
+
+parser = argparse.ArgumentParser(description=description)
+
+parser.add_argument('--dt', type=float, metavar='dt',
+                    default=0.1,
+                    help='Controller sampling time.' )
+parser.add_argument('--Nactor', type=int,
+                    default=6,
+                    help='Horizon length (in steps) for predictive controllers.')
+parser.add_argument('--pred_step_size_multiplier', type=float,
+                    default=5.0,
+                    help='Size of each prediction step in seconds is a pred_step_size_multiplier multiple of controller sampling time dt.')
+parser.add_argument('--run_obj_struct', type=str,
+                    default='quadratic',
+                    choices=['quadratic',
+                             'biquadratic'],
+                    help='Structure of running objective function.')
+parser.add_argument('--R1_diag', type=float, nargs='+',
+                    default=[100, 100, 10, 0, 0],
+                    help='Parameter of running objective function. Must have proper dimension.')
+parser.add_argument('--R2_diag', type=float, nargs='+',
+                    default=[1, 10, 1, 0, 0],
+                    help='Parameter of running objective function. Must have proper dimension.')
+parser.add_argument('--gamma', type=float,
+                    default=0.9,
+                    help='Discount factor.')
+parser.add_argument('--grid_size', type=int, nargs=3,
+                    default=[22, 22, 25],
+                    help='Number of grid points along x, y and the orientation angle.')
+parser.add_argument('--Nheldout', type=int,
+                    default=100,
+                    help='Number of random held-out states to evaluate the interpolation error on.')
+parser.add_argument('--policy_table_file', type=str,
+                    default='policy_tables/3wrobot_NI.npz',
+                    help='File to store the policy table in.')
+parser.add_argument('--seed', type=int,
+                    default=1,
+                    help='Seed for random number generation.')
+
+args = parser.parse_args()
+
+pred_step_size = args.dt * args.pred_step_size_multiplier
+
+R1 = np.diag(np.array(args.R1_diag))
+R2 = np.diag(np.array(args.R2_diag))
+
+#----------------------------------------Fixed settings (as in the preset)
+# xy-plane
+xMin = -4
+xMax = 0.2
+yMin = -4
+yMax = 0.2
+
+# Control constraints
+v_min = -0.22 *10
+v_max = 0.22 *10
+omega_min = -2.84
+omega_max = 2.84
+
+ctrl_bnds=np.array([[v_min, v_max], [omega_min, omega_max]])
+
+#----------------------------------------Initialization : : system
+my_sys = systems.Sys3WRobotNI(sys_type="diff_eqn",
+                                     dim_state=dim_state,
+                                     dim_input=dim_input,
+                                     dim_output=dim_output,
+                                     dim_disturb=dim_disturb,
+                                     pars=[],
+                                     ctrl_bnds=ctrl_bnds,
+                                     is_dyn_ctrl=0,
+                                     is_disturb=0,
+                                     pars_disturb=[])
+
+#----------------------------------------Initialization : : controller
+my_ctrl = controllers.ControllerOptimalPredictive(dim_input,
+                                           dim_output,
+                                           'MPC',
+                                           ctrl_bnds = ctrl_bnds,
+                                           action_init = [],
+                                           t0 = 0,
+                                           sampling_time = args.dt,
+                                           Nactor = args.Nactor,
+                                           pred_step_size = pred_step_size,
+                                           sys_rhs = my_sys._state_dyn,
+                                           sys_out = my_sys.out,
+                                           is_batch_sys = 1,
+                                           state_sys = np.zeros(dim_state),
+                                           gamma = args.gamma,
+                                           run_obj_struct = args.run_obj_struct,
+                                           run_obj_pars = [R1, R2],
+                                           seed = args.seed,
+                                           sys_rhs_jac = my_sys._state_dyn_jac,
+                                           sys_out_jac = my_sys.out_jac)
+
+warnings.filterwarnings('ignore')
+
+#----------------------------------------Build
+axes = [np.linspace(xMin, xMax, args.grid_size[0]),
+        np.linspace(yMin, yMax, args.grid_size[1]),
+        np.linspace(-np.pi, np.pi, args.grid_size[2])]
+
+print('Solving MPC on a {}x{}x{} grid...'.format(*args.grid_size))
+
+time_start = time.perf_counter()
+policy_table = controllers.PolicyTable.build(my_ctrl, axes, periodic_dims=[2])
+build_time = time.perf_counter() - time_start
+
+pathlib.Path(args.policy_table_file).parent.mkdir(parents=True, exist_ok=True)
+policy_table.save(args.policy_table_file)
+
+print('Policy table stored to: ' + args.policy_table_file + ' (built in {:.1f} s)'.format(build_time))
+
+#----------------------------------------Evaluate on held-out states
+rng = np.random.default_rng(args.seed)
+
+observations_heldout = np.column_stack([rng.uniform(xMin, xMax, args.Nheldout),
+                                        rng.uniform(yMin, yMax, args.Nheldout),
+                                        rng.uniform(-np.pi, np.pi, args.Nheldout)])
+
+errors, lookup_time, solve_time = policy_table.eval_error(my_ctrl, observations_heldout)
+
+row_header = ['', 'v [m/s]', 'omega [rad/s]']
+rows = [['mean abs. error', *np.mean(errors, axis=0)],
+        ['median abs. error', *np.median(errors, axis=0)],
+        ['max abs. error', *np.max(errors, axis=0)],
+        ['action range', v_max - v_min, omega_max - omega_min]]
+
+print(tabulate([row_header, *rows], floatfmt='8.4f', headers='firstrow', tablefmt='grid'))
+print('Average lookup time: {:.1f} us, average online solve time: {:.1f} ms'.format(lookup_time*1e6, solve_time*1e3))
@@ -3,10 +3,9 @@ Contains controllers a.k.a. agents.
 
 """
 
-from utilities import dss_sim
 from utilities import rep_mat
-from utilities import uptria2vec
-from utilities import push_vec
+from utilities import RingBuffer
+from utilities import PolyFeatures
 import models
 import numpy as np
 import scipy as sp
@@ -19,6 +18,11 @@ from numpy.linalg import lstsq
 from numpy import reshape
 import warnings
 import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 # For debugging purposes
 from tabulate import tabulate
 import os
@@ -74,6 +78,12 @@ class ControllerOptimalPredictive:
              - :math:`J_a \\left( y_1, \\{action\}_{1}^{N_a}\\right) = \\sum_{k=1}^{N_a-1} \\gamma^{k-1} \\rho(y_k, u_k) + \\hat Q^{\\theta}(y_{N_a}, u_{N_a})` 
            * - 'SQL' - RL/ADP via stacked Q-learning
              - :math:`J_a \\left( y_1, \\{action\\}_1^{N_a} \\right) = \\sum_{k=1}^{N_a-1} \\hat \\gamma^{k-1} Q^{\\theta}(y_{N_a}, u_{N_a})`               
+           * - 'MPPI', 'CEM' - MPC via sampling-based optimizers (model-predictive path integral, resp., cross-entropy method)
+             - Same as 'MPC'
+           * - 'EMPC' - Explicit MPC: interpolation in a precomputed table of MPC actions, see :class:`~controllers.PolicyTable`
+             - Same as 'MPC' (offline)
+           * - 'RTI' - MPC via real-time iterations: only ``rti_iters`` optimizer iterations per sample, continued from the previous sample's iterate
+             - Same as 'MPC'
         
         Here, :math:`\\theta` are the critic parameters (neural network weights, say) and :math:`y_1` is the current observation.
         
@@ -99,6 +109,62 @@ class ControllerOptimalPredictive:
         The latter could be, for instance, the true model of the system.
         In turn, ``state_sys`` represents the (true) current state of the system and should be updated accordingly.
         Parameters ``sys_rhs, sys_out, state_sys`` are used in those controller modes which rely on them.
+    sys_rhs_jac, sys_out_jac : : functions
+        Jacobians of ``sys_rhs`` (with respect to the state and the action, returned as a tuple) and ``sys_out`` (with respect to the state), 
+        e.g., :func:`~systems.System._state_dyn_jac` and :func:`~systems.System.out_jac`.
+        If ``sys_rhs_jac`` is passed, the actor optimizer uses the exact gradient of the actor cost computed by an adjoint (backward) sweep over the horizon.
+        If ``sys_out_jac`` is empty, the output is assumed identical to the state.
+    is_warm_start : : 0 or 1
+        If 1, the actor optimizer is initialized with the previous optimal action sequence shifted by one sample (receding-horizon warm start)
+        instead of ``action_sqn_init``. See :class:`~controllers.ActorWarmStart`.
+    warm_start_tail : : string
+        How the warm start fills the tail of the shifted sequence: ``'repeat'`` (repeat the last action), ``'zero'`` (zero action) or
+        ``'nominal'`` (action of the nominal controller ``N_CTRL`` at the predicted terminal observation).
+    Nsamples, sampling_iters : : natural numbers
+        Number of sampled action sequences per iteration, resp., number of iterations of the sampling-based optimizers (modes ``'MPPI'``, ``'CEM'``).
+        All samples of an iteration are rolled out at once, so the latency per controller sample is bounded and predictable.
+    sampling_temperature : : number
+        Temperature of the exponential weighting of samples in ``'MPPI'`` mode relative to the spread of the sampled costs.
+        Smaller values favor the best samples more aggressively.
+    is_sampling_float32 : : 0 or 1
+        If 1, sampled rollouts are computed in single precision.
+    policy_table_file : : string
+        File of a policy table built by :func:`~controllers.PolicyTable.build` (mode ``'EMPC'``) with the settings of this controller, see :func:`~controllers.PolicyTable.check_ctrl`.
+    cache_size : : natural number
+        Size of the action cache in front of the actor optimizer, see :class:`~controllers.ActionCache`. Zero disables the cache (default).
+    cache_quant : : number or array of shape ``[dim_output, ]``
+        Quantization step of observations used as cache keys.
+    cache_mode : : string
+        ``'exact'``: a cached action sequence is returned as the solution (no solve),
+        ``'warm'``: a cached action sequence is only used as the initial guess of the actor optimizer.
+    actor_formulation : : string
+        Formulation of the actor problem in ``'MPC'`` and ``'RTI'`` modes.
+        ``'single'``: single shooting, the prediction is nested inside the cost (default).
+        ``'multiple'``: multiple shooting, the predicted states are decision variables subject to defect constraints, solved by ``trust-constr`` with sparse derivatives (experimental).
+        On the 3-wheel robot, it is still considerably slower than single shooting over the horizons of interest (see ``benchmarks.py shooting``).
+        See :func:`~controllers.ControllerOptimalPredictive._actor_solve_ms`.
+    is_glob_opt : : 0 or 1
+        If 1, the actor optimizer runs ``Nstarts`` independent local solves from different initial guesses in parallel and keeps the best one,
+        see :func:`~controllers.ControllerOptimalPredictive._actor_multistart`. Helps to escape local minima, e.g., around obstacles.
+    Nstarts, Nworkers : : natural numbers
+        Number of starts of the multi-start optimizer, resp., number of its worker processes (if ``None``, the number of CPUs).
+        The worker processes are started on the first solve and run until :func:`~controllers.ControllerOptimalPredictive.close`. 
+        Call it when done with the controller or use the controller in a ``with`` statement, since the worker processes are no daemons and would otherwise block the interpreter exit.
+    rti_iters : : natural number
+        Iteration budget of the actor optimizer per controller sample in ``'RTI'`` mode.
+        The partially converged action sequence is always carried forward to the next sample (shifted as in the warm start), so that the solution converges over time.
+    critic_forget : : number in (0, 1]
+        Forgetting factor of the recursive least-squares critic update. Values smaller than 1 let the critic track the changing policy.
+    is_est_model : : 0 or 1
+        If 1, predictions use a linear model :math:`y^+ = A y + B u` of the system at the controller sampling time, identified online from the buffered observations and actions
+        (see :class:`~models.IdentifierSS`), instead of ``sys_rhs`` and ``sys_out``. The model estimate is updated every ``critic_period`` and retained across resets.
+        Each action of a predicted sequence is held for ``pred_step_size/sampling_time`` (rounded) model steps. The actor problem is then solved in single-shooting formulation 
+        with a finite-difference gradient.
+    model_est_forget : : number in (0, 1]
+        Forgetting factor of the recursive least-squares model update.
+    is_batch_sys : : 0 or 1
+        If 1, ``sys_rhs`` and ``sys_out`` accept states and actions with a leading batch dimension, i.e., of shape ``[batch, n]`` (see the batched interface of :class:`~systems.System`).
+        The batched rollout then calls them once per prediction step for the whole batch instead of once per sequence.
     buffer_size : : natural number
         Size of the buffer to store data.
     gamma : : number in (0, 1]
@@ -109,6 +175,9 @@ class ControllerOptimalPredictive:
         optimal infinite-horizon cost (a.k.a. the value function). The temporal errors are stacked up using the said buffer.
     critic_period : : number
         The critic is updated every ``critic_period`` units of time. 
+        Each update processes the temporal difference pairs that were buffered since the previous update (at most ``Ncritic`` of them)
+        by recursive least squares (see :class:`~models.RLS`) at the cost of :math:`O(d^2)` per pair, where :math:`d` is the number of critic weights.
+        The weights are projected onto the box ``[Wmin, Wmax]`` of the critic structure.
     critic_struct : : natural number
         Choice of the structure of the critic's features.
         
@@ -180,7 +249,28 @@ class ControllerOptimalPredictive:
                  observation_target=[],
                  state_init=[],
                  obstacle=[],
-                 seed=1):
+                 seed=1,
+                 is_batch_sys=0,
+                 sys_rhs_jac=[],
+                 sys_out_jac=[],
+                 is_warm_start=0,
+                 warm_start_tail='repeat',
+                 Nsamples=1000,
+                 sampling_iters=3,
+                 sampling_temperature=0.1,
+                 is_sampling_float32=0,
+                 policy_table_file='',
+                 cache_size=0,
+                 cache_quant=1e-2,
+                 cache_mode='exact',
+                 actor_formulation='single',
+                 is_glob_opt=0,
+                 Nstarts=4,
+                 Nworkers=None,
+                 rti_iters=1,
+                 critic_forget=1,
+                 is_est_model=0,
+                 model_est_forget=1):
         """
             Parameters
             ----------
@@ -201,6 +291,12 @@ class ControllerOptimalPredictive:
                     - :math:`J_a \\left( y_1, \\{action\}_{1}^{N_a}\\right) = \\sum_{k=1}^{N_a-1} \\gamma^{k-1} \\rho(y_k, u_k) + \\hat Q^{\\theta}(y_{N_a}, u_{N_a})` 
                 * - 'SQL' - RL/ADP via stacked Q-learning
                     - :math:`J_a \\left( y_1, \\{action\\}_1^{N_a} \\right) = \\sum_{k=1}^{N_a-1} \\gamma^{k-1} \\hat Q^{\\theta}(y_{N_a}, u_{N_a})`               
+                * - 'MPPI', 'CEM' - MPC via sampling-based optimizers (model-predictive path integral, resp., cross-entropy method)
+                    - Same as 'MPC'
+                * - 'EMPC' - Explicit MPC: interpolation in a precomputed table of MPC actions, see :class:`~controllers.PolicyTable`
+                    - Same as 'MPC' (offline)
+                * - 'RTI' - MPC via real-time iterations: only ``rti_iters`` optimizer iterations per sample, continued from the previous sample's iterate
+                    - Same as 'MPC'
                 
                 Here, :math:`\\theta` are the critic parameters (neural network weights, say) and :math:`y_1` is the current observation.
                 
@@ -226,6 +322,62 @@ class ControllerOptimalPredictive:
                 The latter could be, for instance, the true model of the system.
                 In turn, ``state_sys`` represents the (true) current state of the system and should be updated accordingly.
                 Parameters ``sys_rhs, sys_out, state_sys`` are used in those controller modes which rely on them.
+            sys_rhs_jac, sys_out_jac : : functions
+                Jacobians of ``sys_rhs`` (with respect to the state and the action, returned as a tuple) and ``sys_out`` (with respect to the state), 
+                e.g., :func:`~systems.System._state_dyn_jac` and :func:`~systems.System.out_jac`.
+                If ``sys_rhs_jac`` is passed, the actor optimizer uses the exact gradient of the actor cost computed by an adjoint (backward) sweep over the horizon.
+                If ``sys_out_jac`` is empty, the output is assumed identical to the state.
+            is_warm_start : : 0 or 1
+                If 1, the actor optimizer is initialized with the previous optimal action sequence shifted by one sample (receding-horizon warm start)
+                instead of ``action_sqn_init``. See :class:`~controllers.ActorWarmStart`.
+            warm_start_tail : : string
+                How the warm start fills the tail of the shifted sequence: ``'repeat'`` (repeat the last action), ``'zero'`` (zero action) or
+                ``'nominal'`` (action of the nominal controller ``N_CTRL`` at the predicted terminal observation).
+            Nsamples, sampling_iters : : natural numbers
+                Number of sampled action sequences per iteration, resp., number of iterations of the sampling-based optimizers (modes ``'MPPI'``, ``'CEM'``).
+                All samples of an iteration are rolled out at once, so the latency per controller sample is bounded and predictable.
+            sampling_temperature : : number
+                Temperature of the exponential weighting of samples in ``'MPPI'`` mode relative to the spread of the sampled costs.
+                Smaller values favor the best samples more aggressively.
+            is_sampling_float32 : : 0 or 1
+                If 1, sampled rollouts are computed in single precision.
+            policy_table_file : : string
+                File of a policy table built by :func:`~controllers.PolicyTable.build` (mode ``'EMPC'``) with the settings of this controller, see :func:`~controllers.PolicyTable.check_ctrl`.
+            cache_size : : natural number
+                Size of the action cache in front of the actor optimizer, see :class:`~controllers.ActionCache`. Zero disables the cache (default).
+            cache_quant : : number or array of shape ``[dim_output, ]``
+                Quantization step of observations used as cache keys.
+            cache_mode : : string
+                ``'exact'``: a cached action sequence is returned as the solution (no solve),
+                ``'warm'``: a cached action sequence is only used as the initial guess of the actor optimizer.
+            actor_formulation : : string
+                Formulation of the actor problem in ``'MPC'`` and ``'RTI'`` modes.
+                ``'single'``: single shooting, the prediction is nested inside the cost (default).
+                ``'multiple'``: multiple shooting, the predicted states are decision variables subject to defect constraints, solved by ``trust-constr`` with sparse derivatives (experimental).
+                On the 3-wheel robot, it is still considerably slower than single shooting over the horizons of interest (see ``benchmarks.py shooting``).
+                See :func:`~controllers.ControllerOptimalPredictive._actor_solve_ms`.
+            is_glob_opt : : 0 or 1
+                If 1, the actor optimizer runs ``Nstarts`` independent local solves from different initial guesses in parallel and keeps the best one,
+                see :func:`~controllers.ControllerOptimalPredictive._actor_multistart`. Helps to escape local minima, e.g., around obstacles.
+            Nstarts, Nworkers : : natural numbers
+                Number of starts of the multi-start optimizer, resp., number of its worker processes (if ``None``, the number of CPUs).
+                The worker processes are started on the first solve and run until :func:`~controllers.ControllerOptimalPredictive.close`. 
+                Call it when done with the controller or use the controller in a ``with`` statement, since the worker processes are no daemons and would otherwise block the interpreter exit.
+            rti_iters : : natural number
+                Iteration budget of the actor optimizer per controller sample in ``'RTI'`` mode.
+                The partially converged action sequence is always carried forward to the next sample (shifted as in the warm start), so that the solution converges over time.
+            critic_forget : : number in (0, 1]
+                Forgetting factor of the recursive least-squares critic update. Values smaller than 1 let the critic track the changing policy.
+            is_est_model : : 0 or 1
+                If 1, predictions use a linear model :math:`y^+ = A y + B u` of the system at the controller sampling time, identified online from the buffered observations and actions
+                (see :class:`~models.IdentifierSS`), instead of ``sys_rhs`` and ``sys_out``. The model estimate is updated every ``critic_period`` and retained across resets.
+                Each action of a predicted sequence is held for ``pred_step_size/sampling_time`` (rounded) model steps. The actor problem is then solved in single-shooting formulation 
+                with a finite-difference gradient.
+            model_est_forget : : number in (0, 1]
+                Forgetting factor of the recursive least-squares model update.
+            is_batch_sys : : 0 or 1
+                If 1, ``sys_rhs`` and ``sys_out`` accept states and actions with a leading batch dimension, i.e., of shape ``[batch, n]`` (see the batched interface of :class:`~systems.System`).
+                The batched rollout then calls them once per prediction step for the whole batch instead of once per sequence.
             buffer_size : : natural number
                 Size of the buffer to store data.
             gamma : : number in (0, 1]
@@ -236,6 +388,9 @@ class ControllerOptimalPredictive:
                 optimal infinite-horizon cost (a.k.a. the value function). The temporal errors are stacked up using the said buffer.
             critic_period : : number
                 The critic is updated every ``critic_period`` units of time. 
+                Each update processes the temporal difference pairs that were buffered since the previous update (at most ``Ncritic`` of them)
+                by recursive least squares (see :class:`~models.RLS`) at the cost of :math:`O(d^2)` per pair, where :math:`d` is the number of critic weights.
+                The weights are projected onto the box ``[Wmin, Wmax]`` of the critic structure.
             critic_struct : : natural number
                 Choice of the structure of the critic's features.
                 
@@ -276,8 +431,14 @@ class ControllerOptimalPredictive:
                     should be ``[R1, R2]``
             """        
 
-        np.random.seed(seed)
+        # The legacy global generator is seeded as well. A seed sequence provides the seed words for it
+        if isinstance(seed, np.random.SeedSequence):
+            np.random.seed(seed.generate_state(4))
+        else:
+            np.random.seed(seed)
         print(seed)
+        
+        self.rng = np.random.default_rng(seed)
 
         self.dim_input = dim_input
         self.dim_output = dim_output
@@ -307,13 +468,16 @@ class ControllerOptimalPredictive:
             self.action_sqn_init = rep_mat( action_init , 1, self.Nactor)
         
         
-        self.action_buffer = np.zeros( [buffer_size, dim_input] )
-        self.observation_buffer = np.zeros( [buffer_size, dim_output] )        
+        self.action_buffer = RingBuffer(buffer_size, dim_input)
+        self.observation_buffer = RingBuffer(buffer_size, dim_output)
         
         # Exogeneous model's things
         self.sys_rhs = sys_rhs
         self.sys_out = sys_out
         self.state_sys = state_sys   
+        self.is_batch_sys = is_batch_sys
+        self.sys_rhs_jac = sys_rhs_jac
+        self.sys_out_jac = sys_out_jac
         
         # Learning-related things
         self.buffer_size = buffer_size
@@ -328,6 +492,13 @@ class ControllerOptimalPredictive:
         self.observation_target = observation_target
         
         self.accum_obj_val = 0
+        
+        # Sample at which the running objective was last accumulated
+        self._accum_obj_clock = t0
+        
+        # Discounting weights along the prediction horizon
+        self.discount_sqn = self.gamma**np.arange(self.Nactor)
+        
         print('---Critic structure---', self.critic_struct)
 
         if self.critic_struct == 'quad-lin':
@@ -355,6 +526,60 @@ class ControllerOptimalPredictive:
             self.Wmin = np.zeros(self.dim_critic) 
             self.Wmax = np.ones(self.dim_critic) 
         self.N_CTRL = N_CTRL(ctrl_bnds)
+        
+        self.critic_feature_map = PolyFeatures(self.critic_struct, self.dim_output, self.dim_input)
+        
+        # Critic learned online by recursive least squares. The weights are retained across resets
+        self.critic_rls = models.RLS(np.clip(np.zeros(self.dim_critic), self.Wmin, self.Wmax),
+                                     forget=critic_forget,
+                                     theta_min=self.Wmin,
+                                     theta_max=self.Wmax)
+        self.w_critic = self.critic_rls.theta
+        
+        # Number of samples not yet processed by the critic
+        self.Nnew_samples = 0
+        
+        # Online model identification
+        self.is_est_model = is_est_model
+        if self.is_est_model:
+            self.model_est = models.IdentifierSS(self.dim_output, self.dim_input, forget=model_est_forget)
+            self.model_est_Nhold = max(int( np.round(self.pred_step_size / self.sampling_time) ), 1)
+        
+        # Sampling-based optimizers
+        self.Nsamples = Nsamples
+        self.sampling_iters = sampling_iters
+        self.sampling_temperature = sampling_temperature
+        self.is_sampling_float32 = is_sampling_float32
+        
+        # Explicit MPC
+        if self.mode == 'EMPC':
+            self.policy_table = PolicyTable.load(policy_table_file, self)
+        
+        self.actor_formulation = actor_formulation
+        
+        self.rti_iters = rti_iters
+        
+        # Multi-start optimization. The worker pool is started on first use
+        self.is_glob_opt = is_glob_opt
+        self.Nstarts = Nstarts
+        self.Nworkers = Nworkers
+        self._actor_pool = None
+        
+        # Action cache keyed on quantized observations and the settings that determine the actor problem
+        if cache_size > 0:
+            self.action_cache = ActionCache(cache_size,
+                                            cache_quant,
+                                            settings=(self.mode, self.Nactor, self.pred_step_size, self.gamma),
+                                            mode=cache_mode)
+        else:
+            self.action_cache = None
+        
+        # Receding-horizon warm start of the actor. The number of prediction steps that elapse per controller sample determines the shift
+        self.is_warm_start = is_warm_start
+        self.warm_start = ActorWarmStart(self.Nactor,
+                                         self.dim_input,
+                                         shift=int( np.round(self.sampling_time / self.pred_step_size) ),
+                                         tail=warm_start_tail)
 
     def reset(self,t0):
         """
@@ -374,18 +599,27 @@ class ControllerOptimalPredictive:
             self.action_curr = self.action_init
             self.action_sqn_init = rep_mat( self.action_init , 1, self.Nactor)
         
-        self.action_buffer = np.zeros( [self.buffer_size, self.dim_input] )
-        self.observation_buffer = np.zeros( [self.buffer_size, self.dim_output] )        
+        self.action_buffer.reset()
+        self.observation_buffer.reset()
+
+        self.Nnew_samples = 0
+        
+        self.accum_obj_val = 0
+        self._accum_obj_clock = t0
 
         self.critic_clock = t0
         self.ctrl_clock = t0
+        
+        # Previous episode's solution is not a meaningful initial guess. Solver statistics are retained
+        self.warm_start.reset()
     
     def receive_sys_state(self, state):
         """
         Fetch exogenous model state. Used in some controller modes. See class documentation.
+        The state is copied, since systems track their state in place.
 
         """
-        self.state_sys = state
+        self.state_sys = np.array(state)
     
     def upd_accum_obj(self, observation, action):
         """
@@ -393,8 +627,13 @@ class ControllerOptimalPredictive:
         If the agent succeeded to stabilize the system, ``accum_obj`` would converge to a finite value which is the performance mark.
         The smaller, the better (depends on the problem specification of course - you might want to maximize cost instead).
         
+        The running objective is accumulated once per sample of the controller, i.e., if ``compute_action`` has started a new sample since the last call.
+        Thus, the result does not depend on the number of simulation steps per sample (which varies with the simulator's integration scheme).
+        
         """
-        self.accum_obj_val += self.run_obj(observation, action)*self.sampling_time
+        if self.ctrl_clock != self._accum_obj_clock:
+            self._accum_obj_clock = self.ctrl_clock
+            self.accum_obj_val += self.run_obj(observation, action)*self.sampling_time
                  
     def run_obj(self, observation, action):
         """
@@ -403,14 +642,233 @@ class ControllerOptimalPredictive:
         See class documentation.
         """
 
-        #####################################################################################################
-        ################################# write down here cost-function #####################################
-        #####################################################################################################
+        chi = np.concatenate([observation, action])
+        
+        if self.run_obj_struct == 'quadratic':
+            R1 = self.run_obj_pars[0]
+            run_obj = chi @ R1 @ chi
+        elif self.run_obj_struct == 'biquadratic':
+            R1 = self.run_obj_pars[0]
+            R2 = self.run_obj_pars[1]
+            run_obj = chi**2 @ R2 @ chi**2 + chi @ R1 @ chi
 
         return run_obj
 
-    def _actor_cost(self, action_sqn, observation):
+    def run_obj_batch(self, observations, actions):
+        """
+        Batched running objective: evaluates the structure ``run_obj_struct`` for arrays of observations and actions with arbitrary leading dimensions.
+        Returns an array of running objective values of the respective leading shape.
+        
+        Used by the batched rollout. See class documentation.
+        
+        Customization
+        -------------
+        
+        When customizing :func:`~controllers.ControllerOptimalPredictive.run_obj`, adjust this method accordingly so that both agree.
+
+        """
+        chi = np.concatenate([observations, actions], axis=-1)
+        
+        R1 = np.asarray(self.run_obj_pars[0], dtype=chi.dtype)
+        
+        run_obj = np.einsum('...i,ij,...j->...', chi, R1, chi)
+        
+        if self.run_obj_struct == 'biquadratic':
+            R2 = np.asarray(self.run_obj_pars[1], dtype=chi.dtype)
+            chi_sqr = chi**2
+            run_obj = run_obj + np.einsum('...i,ij,...j->...', chi_sqr, R2, chi_sqr)
+            
+        return run_obj
+    
+    def _run_obj_grad_batch(self, observations, actions):
+        """
+        Gradients of :func:`~controllers.ControllerOptimalPredictive.run_obj_batch` with respect to observations and actions.
+        
+        Customization
+        -------------
+        
+        Adjust this method along with the running objective.
+
+        """
+        chi = np.concatenate([observations, actions], axis=-1)
+        
+        R1 = self.run_obj_pars[0]
+        
+        grad = chi @ (R1 + R1.T)
+        
+        if self.run_obj_struct == 'biquadratic':
+            R2 = self.run_obj_pars[1]
+            grad = grad + 2 * chi * ( chi**2 @ (R2 + R2.T) )
+            
+        return grad[..., :self.dim_output], grad[..., self.dim_output:]
+    
+    def _sys_rhs_batch(self, states, actions):
+        """
+        Right-hand side of the exogenously passed model over a batch of states and actions of shape ``[batch, n]``.
+        
+        """
+        if self.is_batch_sys:
+            return self.sys_rhs([], states, actions)
+        
+        return np.array( [self.sys_rhs([], state, action) for state, action in zip(states, actions)] )
+    
+    def _sys_out_batch(self, states):
+        """
+        Output of the exogenously passed model over a batch of states of shape ``[batch, dim_state]``.
+        
+        """
+        if self.is_batch_sys:
+            return self.sys_out(states)
+        
+        return np.array( [self.sys_out(state) for state in states] )
+    
+    def _rollout_batch(self, action_sqns, observation):
+        """
+        Predict observation trajectories for a whole stack of action sequences at once.
+        
+        Parameters
+        ----------
+        action_sqns : : array of shape ``[batch, Nactor, dim_input]``
+            Candidate action sequences.
+        observation : : array of shape ``[dim_output, ]``
+            Current observation which starts each predicted trajectory.
+            
+        Returns
+        -------
+        state_sqns : : array of shape ``[batch, Nactor, dim_state]``
+            Predicted state trajectories (via the Euler scheme with step ``pred_step_size``) starting at ``state_sys``.
+        observation_sqns : : array of shape ``[batch, Nactor, dim_output]``
+            Predicted observation trajectories starting at ``observation``.
+
+        """
+        batch_size = action_sqns.shape[0]
+        
+        if self.is_est_model:
+            return self._rollout_batch_model_est(action_sqns, observation)
+        
+        state = np.tile(self.state_sys, (batch_size, 1)).astype(action_sqns.dtype)
+        
+        state_sqns = np.zeros([batch_size, self.Nactor, state.shape[1]], dtype=action_sqns.dtype)
+        observation_sqns = np.zeros([batch_size, self.Nactor, self.dim_output], dtype=action_sqns.dtype)
+        
+        state_sqns[:, 0, :] = state
+        observation_sqns[:, 0, :] = observation
+        
+        # The horizon is stepped sequentially, the batch is handled by array operations
+        for k in range(1, self.Nactor):
+            state = state + self.pred_step_size * self._sys_rhs_batch(state, action_sqns[:, k-1, :])  # Euler scheme
+            
+            state_sqns[:, k, :] = state
+            observation_sqns[:, k, :] = self._sys_out_batch(state)
+            
+        return state_sqns, observation_sqns
+    
+    def _rollout_batch_model_est(self, action_sqns, observation):
+        """
+        Variant of :func:`~controllers.ControllerOptimalPredictive._rollout_batch` with the identified model, whose state is the observation.
+        Each action is held for ``model_est_Nhold`` model steps and all sequences are simulated at once by :func:`~models.ModelSS.sim_batch`.
+
         """
+        Nhold = self.model_est_Nhold
+        
+        my_action_sqns = np.repeat(action_sqns, Nhold, axis=1)[:, :(self.Nactor-1)*Nhold + 1, :]
+        
+        observation_sqns = self.model_est.model.sim_batch(my_action_sqns, x0=observation)[:, ::Nhold, :].astype(action_sqns.dtype)
+        
+        return observation_sqns, observation_sqns
+    
+    def _model_est_update(self):
+        """
+        Update the model estimate with the samples buffered since the previous update. 
+
+        """
+        Nsamples = min(self.Nnew_samples + 1, self.observation_buffer.count)
+        
+        if Nsamples < 2:
+            return
+        
+        self.model_est.update(self.observation_buffer.view()[-Nsamples:, :], self.action_buffer.view()[-Nsamples:, :])
+        
+        # Cached actions were optimized against the previous model
+        if self.action_cache is not None:
+            self.action_cache.clear()
+
+    def _critic_features(self, observations, actions):
+        """
+        Features of the critic according to ``critic_struct`` for observations and actions with arbitrary (equal) leading dimensions.
+        See class documentation and :class:`~utilities.PolyFeatures`.
+        
+        Customization
+        -------------
+        
+        Add your critic structure to :class:`~utilities.PolyFeatures` (or compute its features here) and to :func:`~controllers.ControllerOptimalPredictive.__init__`
+        (which sets up ``dim_critic`` and the weight bounds).
+
+        """
+        return self.critic_feature_map(observations, actions)
+    
+    def _critic(self, observations, actions, weights=[]):
+        """
+        Critic: a linear combination of the features with the critic weights (the current ones, if ``weights`` is not given).
+        Accepts observations and actions with arbitrary (equal) leading dimensions.
+
+        """
+        if len(weights) == 0:
+            weights = self.w_critic
+            
+        return self._critic_features(observations, actions) @ weights
+    
+    def _critic_grad(self, observations, actions):
+        """
+        Gradients of the critic (with the current weights) with respect to observations and actions with arbitrary (equal) leading dimensions.
+        Used by :func:`~controllers.ControllerOptimalPredictive._actor_cost_grad`.
+
+        """
+        Dchi = np.einsum('...dn,d->...n', self.critic_feature_map.jac(observations, actions), self.w_critic)
+        
+        return Dchi[..., :self.dim_output], Dchi[..., self.dim_output:]
+    
+    def _critic_update(self):
+        """
+        Incremental critic update by recursive least squares on the temporal difference pairs buffered since the previous update.
+        
+        For a pair of consecutive samples :math:`(y_{k-1}, u_{k-1})`, :math:`(y_k, u_k)`, the temporal difference
+        
+        .. math::
+            \\hat Q(y_{k-1}, u_{k-1}) - \\gamma \\hat Q(y_k, u_k) - \\rho(y_{k-1}, u_{k-1})
+            
+        is linear in the weights :math:`w`, so that :math:`w` is fitted to the target :math:`\\rho(y_{k-1}, u_{k-1})`
+        with the regressor :math:`\\varphi(y_{k-1}, u_{k-1}) - \\gamma \\varphi(y_k, u_k)`, where :math:`\\varphi` are the critic's features.
+
+        """
+        Npairs = min(self.Nnew_samples, self.observation_buffer.count - 1, self.Ncritic)
+        
+        if Npairs < 1:
+            return
+        
+        observations = self.observation_buffer.view()[-Npairs-1:, :]
+        actions = self.action_buffer.view()[-Npairs-1:, :]
+        
+        features = self._critic_features(observations, actions)
+        
+        regressors = features[:-1, :] - self.gamma * features[1:, :]
+        run_objs = self.run_obj_batch(observations[:-1, :], actions[:-1, :])
+        
+        for k in range(Npairs):
+            self.critic_rls.update(regressors[k, :], run_objs[k])
+            
+        self.w_critic = self.critic_rls.theta
+        self.Nnew_samples = 0
+        
+        # Cached actions were optimized against the previous critic
+        if self.action_cache is not None and self.mode in ['RQL', 'SQL']:
+            self.action_cache.clear()
+
+    def _actor_cost_batch(self, action_sqns, observation):
+        """
+        Actor cost for a whole stack of action sequences of shape ``[batch, Nactor, dim_input]`` (or flattened ``[batch, Nactor*dim_input]``).
+        Returns an array of shape ``[batch, ]``.
+        
         See class documentation.
         
         Customization
@@ -419,25 +877,255 @@ class ControllerOptimalPredictive:
         Introduce your mode and the respective actor loss in this method. Don't forget to provide description in the class documentation.
 
         """
+        my_action_sqns = np.reshape(action_sqns, [-1, self.Nactor, self.dim_input])
+        
+        _, observation_sqns = self._rollout_batch(my_action_sqns, observation)
         
+        J = np.zeros(my_action_sqns.shape[0])
+        if self.mode in ['MPC', 'RTI', 'MPPI', 'CEM']:
+            J = self.run_obj_batch(observation_sqns, my_action_sqns) @ self.discount_sqn
+        elif self.mode == 'RQL':
+            J = ( self.run_obj_batch(observation_sqns[:, :-1, :], my_action_sqns[:, :-1, :]) @ self.discount_sqn[:-1]
+                  + self._critic(observation_sqns[:, -1, :], my_action_sqns[:, -1, :]) )
+        elif self.mode == 'SQL':
+            J = np.sum(self._critic(observation_sqns, my_action_sqns), axis=1)
+            
+        return J
+
+    def _actor_cost(self, action_sqn, observation):
+        """
+        See class documentation.
+        
+        This is the single-sequence interface used by the optimizers.
+        The cost itself is computed by :func:`~controllers.ControllerOptimalPredictive._actor_cost_batch`.
+
+        """
+        
+        my_action_sqn = np.reshape(action_sqn, [1, self.Nactor, self.dim_input])
+        
+        J = self._actor_cost_batch(my_action_sqn, observation)[0]
+
+        return J
+    
+    def _actor_cost_grad(self, action_sqn, observation):
+        """
+        Exact gradient of :func:`~controllers.ControllerOptimalPredictive._actor_cost` with respect to the (flattened) action sequence.
+        Requires ``sys_rhs_jac``, see class documentation.
+        
+        The gradient is computed by an adjoint (backward) sweep: one forward rollout stores the predicted states,
+        then the co-state :math:`\\lambda_k = \\partial J_a / \\partial x_k` is propagated from the end of the horizon backwards via
+        
+        .. math::
+            \\lambda_k = \\gamma^k \\left( \\frac{\\partial h}{\\partial x} \\right)^\\top \\nabla_y \\rho(y_k, u_k) + \\left( I + \\delta \\frac{\\partial f}{\\partial x}(x_k, u_k) \\right)^\\top \\lambda_{k+1},
+        
+        where :math:`f` is ``sys_rhs``, :math:`h` is ``sys_out`` and :math:`\\delta` is ``pred_step_size``.
+        In modes ``'RQL'`` and ``'SQL'``, the gradients of the respective critic terms replace those of :math:`\\gamma^k \\rho`.
+        This costs about one extra rollout instead of ``Nactor*dim_input`` rollouts of a finite-difference approximation.
+
+        """
         my_action_sqn = np.reshape(action_sqn, [self.Nactor, self.dim_input])
         
-        observation_sqn = np.zeros([self.Nactor, self.dim_output])
+        state_sqns, observation_sqns = self._rollout_batch(my_action_sqn[np.newaxis, :, :], observation)
+        state_sqn = state_sqns[0]
         
-        # System observation prediction
-        observation_sqn[0, :] = observation
-        state = self.state_sys
-        for k in range(1, self.Nactor):
-            state = state + self.pred_step_size * self.sys_rhs([], state, my_action_sqn[k-1, :])  # Euler scheme
+        # Gradients of the cost terms of all prediction steps (including their weights in the cost)
+        if self.mode in ['MPC', 'RTI', 'RQL']:
+            Dobs, Daction = self._run_obj_grad_batch(observation_sqns[0], my_action_sqn)
+            Dobs = self.discount_sqn[:, np.newaxis] * Dobs
+            Daction = self.discount_sqn[:, np.newaxis] * Daction
+            
+            if self.mode == 'RQL':
+                Dobs[-1, :], Daction[-1, :] = self._critic_grad(observation_sqns[0, -1, :], my_action_sqn[-1, :])
+        elif self.mode == 'SQL':
+            Dobs, Daction = self._critic_grad(observation_sqns[0], my_action_sqn)
+            
+        grad = Daction
+        
+        costate = np.zeros(state_sqn.shape[1])
+        
+        for k in range(self.Nactor-1, 0, -1):
+            if self.sys_out_jac:
+                costate += self.sys_out_jac(state_sqn[k, :]).T @ Dobs[k, :]
+            else:
+                costate += Dobs[k, :]
+            
+            Dstate_state, Dstate_action = self.sys_rhs_jac([], state_sqn[k-1, :], my_action_sqn[k-1, :])
             
-            observation_sqn[k, :] = self.sys_out(state)
+            grad[k-1, :] += self.pred_step_size * Dstate_action.T @ costate
+            costate = costate + self.pred_step_size * Dstate_state.T @ costate
+            
+        return np.reshape(grad, [self.Nactor*self.dim_input,])
+    
+    def _actor_solve_ms(self, action_sqn_init, observation):
+        """
+        Multiple-shooting formulation of the actor problem in ``'MPC'`` and ``'RTI'`` modes.
+        
+        The decision variables are the action sequence together with the predicted states :math:`x_1, \\dots, x_{N_a-1}`, 
+        tied by the defect constraints of the Euler scheme
+        
+        .. math::
+            x_k - x_{k-1} - \\delta f(x_{k-1}, u_{k-1}) = 0, \\quad k = 1, \\dots, N_a-1,
+            
+        where :math:`x_0` is ``state_sys``, :math:`f` is ``sys_rhs`` and :math:`\\delta` is ``pred_step_size``.
+        Each defect only couples neighboring stages, so the constraint Jacobian is block-banded and passed as a sparse matrix
+        (exactly via ``sys_rhs_jac`` if available, otherwise by finite differences with the known sparsity pattern).
+        The cost Hessian is block-diagonal and exact for the structures of ``run_obj_struct`` while the curvature of the constraints is neglected (Gauss-Newton).
+        Altogether, the work per iteration of ``trust-constr`` grows about linearly with ``Nactor``.
+        
+        The tolerance on the gradient of the Lagrangian is relative to the cost of the initial guess, since the running objective is not normalized.
+        The action sequence is well inside the bounds initially (they are kept feasible), so the trust region starts large.
         
-        J = 0         
-        if self.mode=='MPC':
-            for k in range(self.Nactor):
-                J += self.gamma**k * self.run_obj(observation_sqn[k, :], my_action_sqn[k, :])
+        Returns
+        -------
+        opt_result : : ``OptimizeResult``
+            Result of ``trust-constr`` with ``x`` restricted to the action sequence.
+            If the iteration limit was hit, ``success`` is ``False``, see :func:`~controllers.ControllerOptimalPredictive._actor_solve_local`.
 
-        return J
+        """
+        N = self.Nactor
+        dim_state = len(self.state_sys)
+        dim_actions = N * self.dim_input
+        dim_states = (N-1) * dim_state
+        
+        state_init = np.asarray(self.state_sys, dtype=np.float64)
+        
+        def split(z):
+            return np.reshape(z[:dim_actions], [N, self.dim_input]), np.reshape(z[dim_actions:], [N-1, dim_state])
+        
+        def observations_of(states):
+            if self.sys_out_jac:
+                return np.vstack([observation, self._sys_out_batch(states)])
+            return np.vstack([observation, states])
+        
+        def out_jacs(states):
+            if self.sys_out_jac:
+                return np.array( [self.sys_out_jac(state) for state in states] )
+            return np.tile( np.eye(self.dim_output, dim_state), (N-1, 1, 1) )
+        
+        def cost(z):
+            actions, states = split(z)
+            return self.run_obj_batch(observations_of(states), actions) @ self.discount_sqn
+        
+        def cost_grad(z):
+            actions, states = split(z)
+            Dobs, Daction = self._run_obj_grad_batch(observations_of(states), actions)
+            
+            grad_actions = self.discount_sqn[:, np.newaxis] * Daction
+            grad_states = self.discount_sqn[1:, np.newaxis] * np.einsum('kij,ki->kj', out_jacs(states), Dobs[1:, :])
+            
+            return np.concatenate([grad_actions.ravel(), grad_states.ravel()])
+        
+        def cost_hess(z):
+            actions, states = split(z)
+            chi = np.hstack([observations_of(states), actions])
+            
+            R1 = self.run_obj_pars[0]
+            hess_chi = np.tile(R1 + R1.T, (N, 1, 1))
+            
+            if self.run_obj_struct == 'biquadratic':
+                R2 = self.run_obj_pars[1]
+                S = R2 + R2.T
+                hess_chi = hess_chi + 2 * np.einsum('ij,ki->kij', np.eye(chi.shape[1]), chi**2 @ S) + 4 * np.einsum('ki,ij,kj->kij', chi, S, chi)
+            
+            hess_chi = self.discount_sqn[:, np.newaxis, np.newaxis] * hess_chi
+            
+            p = self.dim_output
+            G = out_jacs(states)
+            
+            hess_uu = sp.sparse.block_diag(hess_chi[:, p:, p:])
+            hess_xx = sp.sparse.block_diag( np.einsum('kai,kab,kbj->kij', G, hess_chi[1:, :p, :p], G) )
+            hess_xu = np.einsum('kai,kab->kib', G, hess_chi[1:, :p, p:])
+            hess_xu = sp.sparse.hstack([sp.sparse.block_diag(hess_xu), sp.sparse.csr_matrix((dim_states, self.dim_input))])
+            
+            return sp.sparse.bmat([[hess_uu, hess_xu.T], [hess_xu, hess_xx]], format='csr')
+        
+        def defects(z):
+            actions, states = split(z)
+            states_prev = np.vstack([state_init, states[:-1, :]])
+            return np.ravel( states - states_prev - self.pred_step_size * self._sys_rhs_batch(states_prev, actions[:-1, :]) )
+        
+        # Sparsity pattern of the defect Jacobian: stage k depends on u_{k-1}, x_{k-1} and x_k
+        rows_u, cols_u, rows_x, cols_x = [], [], [], []
+        for k in range(N-1):
+            block_rows = np.arange(k*dim_state, (k+1)*dim_state)
+            rows_u.append( np.repeat(block_rows, self.dim_input) )
+            cols_u.append( np.tile(np.arange(k*self.dim_input, (k+1)*self.dim_input), dim_state) )
+            if k > 0:
+                rows_x.append( np.repeat(block_rows, dim_state) )
+                cols_x.append( dim_actions + np.tile(np.arange((k-1)*dim_state, k*dim_state), dim_state) )
+        rows_u = np.concatenate(rows_u)
+        cols_u = np.concatenate(cols_u)
+        rows_x = np.concatenate(rows_x) if rows_x else np.zeros(0, dtype=int)
+        cols_x = np.concatenate(cols_x) if cols_x else np.zeros(0, dtype=int)
+        rows_id = np.arange(dim_states)
+        cols_id = dim_actions + np.arange(dim_states)
+        
+        def defects_jac(z):
+            actions, states = split(z)
+            states_prev = np.vstack([state_init, states[:-1, :]])
+            
+            jacs = [self.sys_rhs_jac([], state, action) for state, action in zip(states_prev, actions[:-1, :])]
+            
+            vals_u = np.concatenate( [-self.pred_step_size * Dstate_action.ravel() for _, Dstate_action in jacs] )
+            vals_x = np.concatenate( [-(np.eye(dim_state) + self.pred_step_size * Dstate_state).ravel() for Dstate_state, _ in jacs[1:]] + [np.zeros(0)] )
+            
+            return sp.sparse.csr_matrix( (np.concatenate([vals_u, vals_x, np.ones(dim_states)]),
+                                          (np.concatenate([rows_u, rows_x, rows_id]), np.concatenate([cols_u, cols_x, cols_id]))),
+                                         shape=(dim_states, dim_actions + dim_states) )
+        
+        zero_hess = sp.sparse.csr_matrix((dim_actions + dim_states, dim_actions + dim_states))
+        
+        if self.sys_rhs_jac:
+            defect_constraints = NonlinearConstraint(defects, 0, 0, jac=defects_jac, hess=lambda z, v: zero_hess)
+        else:
+            sparsity = sp.sparse.csr_matrix( (np.ones(rows_u.size + rows_x.size + dim_states),
+                                              (np.concatenate([rows_u, rows_x, rows_id]), np.concatenate([cols_u, cols_x, cols_id]))),
+                                             shape=(dim_states, dim_actions + dim_states) )
+            defect_constraints = NonlinearConstraint(defects, 0, 0, jac='2-point', hess=lambda z, v: zero_hess, finite_diff_jac_sparsity=sparsity)
+        
+        # Initial states by rolling out the initial action sequence
+        state_sqns, _ = self._rollout_batch(np.reshape(action_sqn_init, [1, N, self.dim_input]), observation)
+        z_init = np.concatenate([action_sqn_init, state_sqns[0, 1:, :].ravel()])
+        
+        bnds = sp.optimize.Bounds(np.concatenate([self.action_sqn_min, -np.inf*np.ones(dim_states)]),
+                                  np.concatenate([self.action_sqn_max, np.inf*np.ones(dim_states)]),
+                                  keep_feasible=np.concatenate([np.ones(dim_actions, dtype=bool), np.zeros(dim_states, dtype=bool)]))
+        
+        maxiter = self.rti_iters if self.mode == 'RTI' else 50
+        
+        opt_result = minimize(cost,
+                              z_init,
+                              method='trust-constr',
+                              jac=cost_grad,
+                              hess=cost_hess,
+                              bounds=bnds,
+                              constraints=[defect_constraints],
+                              options={'maxiter': maxiter,
+                                       'gtol': 1e-4 * max(1, abs(cost(z_init))),
+                                       'xtol': 1e-3,
+                                       'initial_tr_radius': 10,
+                                       'disp': False})
+        
+        opt_result.x = opt_result.x[:dim_actions]
+        
+        return opt_result
+    
+    def _warm_start_sqn(self, observation):
+        """
+        Initial guess for the actor optimizer: the previous optimal action sequence shifted by one sample, with the tail filled according to ``warm_start_tail``.
+        
+        """
+        if self.warm_start.tail == 'nominal':
+            action_sqn = self.warm_start.shifted()
+            # Nominal action at the end of the predicted trajectory
+            _, observation_sqns = self._rollout_batch(action_sqn[np.newaxis, :, :], observation)
+            action_tail = self.N_CTRL.pure_loop(observation_sqns[0, -1, :])
+            action_sqn = self.warm_start.shifted(action_tail)
+        else:
+            action_sqn = self.warm_start.shifted()
+        
+        # Keep the initial guess feasible
+        return np.clip(action_sqn, self.action_min, self.action_max)
     
     def _actor_optimizer(self, observation):
         """
@@ -484,32 +1172,38 @@ class ControllerOptimalPredictive:
         # actor_opt_method = 'SLSQP' # Standard
         """
         
-        actor_opt_method = 'SLSQP'
-        if actor_opt_method == 'trust-constr':
-            actor_opt_options = {'maxiter': 40, 'disp': False} #'disp': True, 'verbose': 2}
+        if self.action_cache is not None:
+            action_sqn_cached = self.action_cache.get(observation)
         else:
-            actor_opt_options = {'maxiter': 40, 'maxfev': 60, 'disp': False, 'adaptive': True, 'xatol': 1e-3, 'fatol': 1e-3}
-       
-        isGlobOpt = 0
+            action_sqn_cached = None
+            
+        if action_sqn_cached is not None and self.action_cache.mode == 'exact':
+            self.warm_start.store(action_sqn_cached)
+            return action_sqn_cached[0, :]
         
-        my_action_sqn_init = np.reshape(self.action_sqn_init, [self.Nactor*self.dim_input,])
+        # Real-time iterations always continue from the previous iterate
+        is_warm = action_sqn_cached is not None or ( (self.is_warm_start or self.mode == 'RTI') and self.warm_start.is_ready() )
         
-        bnds = sp.optimize.Bounds(self.action_sqn_min, self.action_sqn_max, keep_feasible=True)
+        if action_sqn_cached is not None:
+            my_action_sqn_init = np.reshape(action_sqn_cached, [self.Nactor*self.dim_input,])
+        elif is_warm:
+            my_action_sqn_init = np.reshape(self._warm_start_sqn(observation), [self.Nactor*self.dim_input,])
+        else:
+            my_action_sqn_init = np.reshape(self.action_sqn_init, [self.Nactor*self.dim_input,])
         
         try:
-            if isGlobOpt:
-                minimizer_kwargs = {'method': actor_opt_method, 'bounds': bnds, 'tol': 1e-3, 'options': actor_opt_options}
-                action_sqn = basinhopping(lambda action_sqn: self._actor_cost(action_sqn, observation),
-                                          my_action_sqn_init,
-                                          minimizer_kwargs=minimizer_kwargs,
-                                          niter = 10).x
+            if self.is_glob_opt:
+                opt_result = self._actor_multistart(my_action_sqn_init, observation)
             else:
-                action_sqn = minimize(lambda action_sqn: self._actor_cost(action_sqn, observation),
-                                      my_action_sqn_init,
-                                      method=actor_opt_method,
-                                      tol=1e-3,
-                                      bounds=bnds,
-                                      options=actor_opt_options).x        
+                opt_result = self._actor_solve_local(my_action_sqn_init, observation)
+            
+            action_sqn = opt_result.x
+            
+            self.warm_start.record(is_warm, opt_result.nit, opt_result.nfev)
+            self.warm_start.store( np.reshape(action_sqn, [self.Nactor, self.dim_input]) )
+            
+            if self.action_cache is not None:
+                self.action_cache.put(observation, np.reshape(action_sqn, [self.Nactor, self.dim_input]))
 
         except ValueError:
             print('Actor''s optimizer failed. Returning default action')
@@ -517,6 +1211,183 @@ class ControllerOptimalPredictive:
         
         return action_sqn[:self.dim_input]    # Return first action
                     
+    def _actor_solve_local(self, action_sqn_init, observation):
+        """
+        One local solve of the actor problem from the initial guess ``action_sqn_init`` (flattened action sequence).
+        Returns the ``OptimizeResult`` of the optimizer.
+        
+        If the multiple-shooting solve (see :func:`~controllers.ControllerOptimalPredictive._actor_solve_ms`) does not converge in ``'MPC'`` mode,
+        a warning is issued and its iterate is refined by single shooting, so that an unconverged iterate is never used silently.
+        Real-time iterations stop early by design and are returned as is.
+        
+        """
+        actor_opt_method = 'SLSQP'
+        if actor_opt_method == 'trust-constr':
+            actor_opt_options = {'maxiter': 40, 'disp': False} #'disp': True, 'verbose': 2}
+        else:
+            actor_opt_options = {'maxiter': 40, 'maxfev': 60, 'disp': False, 'adaptive': True, 'xatol': 1e-3, 'fatol': 1e-3}
+        
+        if self.mode == 'RTI':
+            actor_opt_options['maxiter'] = self.rti_iters
+        
+        opt_result_ms = None
+        if self.actor_formulation == 'multiple' and self.mode in ['MPC', 'RTI'] and not self.is_est_model:
+            opt_result_ms = self._actor_solve_ms(action_sqn_init, observation)
+            
+            if opt_result_ms.success or self.mode == 'RTI':
+                return opt_result_ms
+            
+            warnings.warn('Multiple-shooting actor solve did not converge ({}). Refining by single shooting'.format(opt_result_ms.message))
+            action_sqn_init = opt_result_ms.x
+        
+        bnds = sp.optimize.Bounds(self.action_sqn_min, self.action_sqn_max, keep_feasible=True)
+        
+        # Exact gradient via the adjoint sweep, if the model Jacobian is available. Otherwise, SciPy resorts to finite differences
+        if self.sys_rhs_jac and self.mode in ['MPC', 'RTI', 'RQL', 'SQL'] and not self.is_est_model:
+            actor_cost_grad = lambda action_sqn: self._actor_cost_grad(action_sqn, observation)
+        else:
+            actor_cost_grad = None
+        
+        opt_result = minimize(lambda action_sqn: self._actor_cost(action_sqn, observation),
+                              action_sqn_init,
+                              method=actor_opt_method,
+                              jac=actor_cost_grad,
+                              tol=1e-3,
+                              bounds=bnds,
+                              options=actor_opt_options)
+        
+        if opt_result_ms is not None:
+            opt_result.nit += opt_result_ms.nit
+            opt_result.nfev += opt_result_ms.nfev
+        
+        return opt_result
+    
+    def _actor_worker_state(self):
+        """
+        The part of the controller's state that changes between solves and that worker processes of the multi-start optimizer need to reproduce the actor problem.
+        
+        Customization
+        -------------
+        
+        Add attributes here that your actor cost depends on and that change during operation.
+        
+        """
+        worker_state = {'state_sys': self.state_sys,
+                        'w_critic': self.w_critic}
+        
+        if self.is_est_model:
+            worker_state['model_est'] = self.model_est
+            
+        return worker_state
+    
+    def _actor_multistart(self, action_sqn_init, observation):
+        """
+        Multi-start optimization of the actor: ``Nstarts`` independent local solves, one from ``action_sqn_init`` and the others from random action sequences within the bounds,
+        run in parallel in a pool of worker processes. The best solution is kept.
+        
+        The pool is persistent: the controller is sent to the workers once when the pool is started, each solve only transfers the current observation, 
+        the state returned by :func:`~controllers.ControllerOptimalPredictive._actor_worker_state` and the initial guess.
+        
+        """
+        if self._actor_pool is None:
+            self._actor_pool = ProcessPoolExecutor(max_workers=self.Nworkers,
+                                                   initializer=_actor_worker_init,
+                                                   initargs=(self,))
+        
+        action_sqn_inits = [action_sqn_init]
+        for _ in range(self.Nstarts - 1):
+            action_sqn_inits.append( self.rng.uniform(self.action_sqn_min, self.action_sqn_max) )
+            
+        worker_state = self._actor_worker_state()
+        
+        futures = [self._actor_pool.submit(_actor_worker_solve, worker_state, observation, my_action_sqn_init) for my_action_sqn_init in action_sqn_inits]
+        results = [future.result() for future in futures]
+        
+        opt_result = min(results, key=lambda result: result.fun)
+        opt_result.nit = sum(result.nit for result in results)
+        opt_result.nfev = sum(result.nfev for result in results)
+        
+        return opt_result
+    
+    def close(self):
+        """
+        Shut down the worker processes of the multi-start optimizer, if any. 
+        The controller remains usable: the next multi-start solve starts a new pool.
+        
+        """
+        if self._actor_pool is not None:
+            self._actor_pool.shutdown()
+            self._actor_pool = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+            
+    def __getstate__(self):
+        # The worker pool stays with the process that started it
+        state = self.__dict__.copy()
+        state['_actor_pool'] = None
+        return state
+    
+    def _actor_sampler(self, observation):
+        """
+        Sampling-based minimizer of :func:`~controllers.ControllerOptimalPredictive._actor_cost_batch`, used instead of :func:`~controllers.ControllerOptimalPredictive._actor_optimizer`
+        in modes ``'MPPI'`` (model-predictive path integral) and ``'CEM'`` (cross-entropy method).
+        
+        Each iteration draws ``Nsamples`` action sequences from a Gaussian around the current mean sequence, clipped to ``action_sqn_min``, ``action_sqn_max``,
+        rolls all of them out at once and updates the mean and spread:
+        
+        * ``'MPPI'``: by exponentially weighting the samples with their costs,
+        * ``'CEM'``: by fitting the best 10% of the samples (the elite).
+        
+        The number of rollouts per controller sample is fixed at ``Nsamples*sampling_iters``.
+
+        """
+        dtype = np.float32 if self.is_sampling_float32 else np.float64
+        
+        is_warm = self.is_warm_start and self.warm_start.is_ready()
+        
+        if is_warm:
+            action_sqn_mean = self._warm_start_sqn(observation)
+        else:
+            action_sqn_mean = np.reshape(self.action_sqn_init, [self.Nactor, self.dim_input])
+            
+        action_sqn_mean = action_sqn_mean.astype(dtype)
+        action_sqn_std = np.tile( (self.action_max - self.action_min)/2, (self.Nactor, 1) ).astype(dtype)
+        
+        Nelite = max(self.Nsamples // 10, 1)
+        
+        for _ in range(self.sampling_iters):
+            action_sqns = action_sqn_mean + action_sqn_std * self.rng.standard_normal([self.Nsamples, self.Nactor, self.dim_input], dtype=dtype)
+            action_sqns = np.clip(action_sqns, self.action_min.astype(dtype), self.action_max.astype(dtype))
+            
+            # Always keep the current mean among the candidates
+            action_sqns[0, :, :] = action_sqn_mean
+            
+            J = self._actor_cost_batch(action_sqns, observation)
+            
+            if self.mode == 'MPPI':
+                J_spread = max(J.max() - J.min(), 1e-12)
+                weights = np.exp( -(J - J.min()) / (self.sampling_temperature * J_spread) )
+                weights /= np.sum(weights)
+                
+                action_sqn_mean = np.einsum('b,bij->ij', weights, action_sqns).astype(dtype)
+                action_sqn_std = np.sqrt( np.einsum('b,bij->ij', weights, (action_sqns - action_sqn_mean)**2) ).astype(dtype)
+            elif self.mode == 'CEM':
+                elite = action_sqns[np.argpartition(J, Nelite-1)[:Nelite], :, :]
+                
+                action_sqn_mean = np.mean(elite, axis=0)
+                action_sqn_std = np.std(elite, axis=0)
+        
+        action_sqn = action_sqn_mean.astype(np.float64)
+        
+        self.warm_start.record(is_warm, self.sampling_iters, self.sampling_iters*self.Nsamples)
+        self.warm_start.store(action_sqn)
+        
+        return action_sqn[0, :]    # Return first action
+                    
     def compute_action(self, t, observation):
         """
         Main method. See class documentation.
@@ -530,13 +1401,21 @@ class ControllerOptimalPredictive:
         
         time_in_sample = t - self.ctrl_clock
         
-        if time_in_sample >= self.sampling_time: # New sample
+        if time_in_sample >= self.sampling_time * (1 - 1e-9): # New sample (up to round-off in the clock of fixed-step simulators)
             # Update controller's internal clock
             self.ctrl_clock = t
             
-            if self.mode == 'MPC':  
+            if self.mode in ['MPC', 'RTI', 'RQL', 'SQL']:  
                 
                 action = self._actor_optimizer(observation)
+                
+            elif self.mode in ['MPPI', 'CEM']:
+                
+                action = self._actor_sampler(observation)
+                
+            elif self.mode == 'EMPC':
+                
+                action = self.policy_table.lookup(observation)
 
             elif self.mode == "N_CTRL":
                 
@@ -544,18 +1423,585 @@ class ControllerOptimalPredictive:
             
             self.action_curr = action
             
+            self.action_buffer.push(action)
+            self.observation_buffer.push(observation)
+            self.Nnew_samples += 1
+            
+            # Model and critic update. Both process the samples buffered since the previous update
+            if t - self.critic_clock >= self.critic_period:
+                self.critic_clock = t
+                
+                if self.is_est_model:
+                    self._model_est_update()
+                    
+                self._critic_update()
+            
             return action    
     
         else:
             return self.action_curr
 
-class N_CTRL:
-
-        #####################################################################################################
-        ########################## write down here nominal controller class #################################
-        #####################################################################################################
-
-        return [v,w]
+class DeadlineSupervisor:
+    """
+    Supervisor that enforces a wall-clock budget per sample on a controller, e.g., :class:`~controllers.ControllerOptimalPredictive`.
+    
+    At each new sample, the controller's ``compute_action`` runs in a worker thread.
+    If it has not finished within ``deadline`` seconds, the supervisor abandons it, counts a deadline miss and returns a fallback action instead.
+    An abandoned solve is left to finish in the background (its result is discarded), and samples arriving while it still occupies the worker are misses as well.
+    Since the solve runs in a thread, the supervisor regains control up to the interpreter's thread switch interval (see ``sys.getswitchinterval``) after the deadline.
+    
+    The supervisor is a drop-in replacement of the controller: all other attributes and methods are those of the controller.
+    Like the controller, it is closed by :func:`~controllers.DeadlineSupervisor.close` or at the end of a ``with`` statement.
+    
+    Attributes
+    ----------
+    ctrl : : object
+        Supervised controller.
+    deadline : : number
+        Wall-clock budget (in seconds) per sample.
+    fallback : : string
+        Fallback action on a deadline miss.
+        ``'nominal'``: action of the nominal controller ``ctrl.N_CTRL.pure_loop``,
+        ``'shift'``: the respective action of the last plan that was computed in time (as stored by the controller's warm start), or the nominal action if there is none.
+    samples, deadline_misses : : natural numbers
+        Statistics.
+    
+    """
+    def __init__(self, ctrl, deadline, fallback='nominal'):
+        if fallback not in ['nominal', 'shift']:
+            raise ValueError('Invalid deadline fallback: ' + str(fallback))
+        
+        self.ctrl = ctrl
+        self.deadline = deadline
+        self.fallback = fallback
+        
+        self.ctrl_clock = ctrl.ctrl_clock
+        self.sampling_time = ctrl.sampling_time
+        self.action_curr = ctrl.action_curr
+        self.state_sys = ctrl.state_sys
+        
+        # Started on the first sample, see close
+        self._executor = None
+        self._future = None
+        
+        # Last plan computed in time and the number of samples since
+        self._plan = None
+        self._plan_age = 0
+        
+        self.samples = 0
+        self.deadline_misses = 0
+        
+        self._accum_obj_clock = self.ctrl_clock
+        
+    def __getattr__(self, name):
+        return getattr(self.ctrl, name)
+    
+    def _solve(self, t, observation, state_sys):
+        self.ctrl.receive_sys_state(state_sys)
+        return self.ctrl.compute_action(t, observation)
+        
+    def _fallback_action(self, observation):
+        if self.fallback == 'shift' and self._plan is not None:
+            self._plan_age += 1
+            action = self._plan[min(self._plan_age * self.ctrl.warm_start.shift, self._plan.shape[0] - 1), :]
+        else:
+            action = self.ctrl.N_CTRL.pure_loop(observation)
+            
+        return np.clip(action, self.ctrl.action_min, self.ctrl.action_max)
+    
+    def receive_sys_state(self, state):
+        """
+        Fetch exogenous model state. It is handed to the controller at the start of the next solve, so that a running solve is not affected.
+        
+        """
+        self.state_sys = np.array(state)
+    
+    def compute_action(self, t, observation):
+        time_in_sample = t - self.ctrl_clock
+        
+        if time_in_sample >= self.sampling_time * (1 - 1e-9): # New sample (up to round-off in the clock of fixed-step simulators)
+            self.ctrl_clock = t
+            self.samples += 1
+            
+            if self._future is not None and not self._future.done():
+                # An abandoned solve still occupies the worker
+                self.deadline_misses += 1
+                action = self._fallback_action(observation)
+            else:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                    
+                self._future = self._executor.submit(self._solve, t, observation, self.state_sys)
+                
+                try:
+                    action = self._future.result(timeout=self.deadline)
+                    
+                    if self.ctrl.warm_start.is_ready():
+                        self._plan = self.ctrl.warm_start.action_sqn.copy()
+                        self._plan_age = 0
+                except FutureTimeoutError:
+                    self.deadline_misses += 1
+                    action = self._fallback_action(observation)
+            
+            self.action_curr = action
+            
+        return self.action_curr
+    
+    def upd_accum_obj(self, observation, action):
+        """
+        Accumulate the controller's running objective once per sample of the supervisor, including samples that missed the deadline.
+        See :func:`~controllers.ControllerOptimalPredictive.upd_accum_obj`.
+        
+        """
+        if self.ctrl_clock != self._accum_obj_clock:
+            self._accum_obj_clock = self.ctrl_clock
+            self.ctrl.accum_obj_val += self.ctrl.run_obj(observation, action)*self.sampling_time
+    
+    def reset(self, t0):
+        # Let an abandoned solve finish so that it does not interfere with the new episode
+        if self._future is not None:
+            self._future.result()
+            self._future = None
+            
+        self.ctrl.reset(t0)
+        
+        self.ctrl_clock = t0
+        self._accum_obj_clock = t0
+        self.action_curr = self.ctrl.action_curr
+        self._plan = None
+        self._plan_age = 0
+        
+    def get_stats(self):
+        return {'samples': self.samples,
+                'deadline_misses': self.deadline_misses,
+                'miss_rate': self.deadline_misses / max(self.samples, 1)}
+    
+    def close(self):
+        """
+        Wait for an abandoned solve, if any, shut down the worker thread and close the controller.
+        The supervisor remains usable: the next sample starts a new worker thread.
+        
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._future = None
+            
+        self.ctrl.close()
+        
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
+# Controller copy of a worker process of the multi-start actor optimizer
+_actor_worker = None
 
+def _actor_worker_init(ctrl):
+    global _actor_worker
+    _actor_worker = ctrl
+    
+def _actor_worker_solve(worker_state, observation, action_sqn_init):
+    _actor_worker.__dict__.update(worker_state)
+    
+    return _actor_worker._actor_solve_local(action_sqn_init, observation)
 
+class ActorWarmStart:
+    """
+    Receding-horizon warm start of the actor optimizer.
+    Keeps the last optimal action sequence and provides it, shifted in time, as the initial guess for the next solve.
+    Also records solver work (iterations and cost function evaluations) separately for warm- and cold-started solves.
+    
+    Attributes
+    ----------
+    Nactor, dim_input : : natural numbers
+        Shape of action sequences.
+    shift : : natural number
+        Number of prediction steps the stored sequence is shifted by, i.e., the number of prediction steps elapsing per controller sample.
+        Zero means that the stored sequence is reused as is (e.g., if the prediction step is much larger than the sampling time).
+    tail : : string
+        How to fill the tail of the shifted sequence: ``'repeat'`` the last action, ``'zero'`` action or ``'nominal'`` action passed to :func:`~controllers.ActorWarmStart.shifted`.
+    
+    """
+    def __init__(self, Nactor, dim_input, shift=1, tail='repeat'):
+        if tail not in ['repeat', 'zero', 'nominal']:
+            raise ValueError('Invalid warm start tail: ' + str(tail))
+        
+        self.Nactor = Nactor
+        self.dim_input = dim_input
+        self.shift = min(shift, Nactor)
+        self.tail = tail
+        
+        self.action_sqn = None
+        
+        self.stats = {'warm': {'solves': 0, 'nit': 0, 'nfev': 0},
+                      'cold': {'solves': 0, 'nit': 0, 'nfev': 0}}
+        
+    def reset(self):
+        """
+        Forget the stored sequence (solver statistics are retained).
+        
+        """
+        self.action_sqn = None
+        
+    def is_ready(self):
+        return self.action_sqn is not None
+    
+    def store(self, action_sqn):
+        """
+        Store an (optimal) action sequence of shape ``[Nactor, dim_input]``.
+        
+        """
+        self.action_sqn = np.array(action_sqn)
+    
+    def shifted(self, action_tail=None):
+        """
+        Stored sequence shifted by ``shift`` prediction steps. The freed tail is filled with ``action_tail`` if given, otherwise according to ``tail``.
+        
+        """
+        if self.shift == 0:
+            return self.action_sqn.copy()
+        
+        action_sqn = np.empty_like(self.action_sqn)
+        action_sqn[:-self.shift, :] = self.action_sqn[self.shift:, :]
+        
+        if action_tail is not None:
+            action_sqn[-self.shift:, :] = action_tail
+        elif self.tail == 'zero':
+            action_sqn[-self.shift:, :] = 0
+        else:
+            action_sqn[-self.shift:, :] = self.action_sqn[-1, :]
+            
+        return action_sqn
+    
+    def record(self, is_warm, nit, nfev):
+        """
+        Record the work of one solve.
+        
+        """
+        stats = self.stats['warm' if is_warm else 'cold']
+        stats['solves'] += 1
+        stats['nit'] += nit
+        stats['nfev'] += nfev
+        
+    def get_stats(self):
+        """
+        Average numbers of iterations and cost function evaluations per solve, separately for warm- and cold-started solves.
+        
+        """
+        avg_stats = {}
+        for key, stats in self.stats.items():
+            solves = max(stats['solves'], 1)
+            avg_stats[key] = {'solves': stats['solves'],
+                              'nit': stats['nit'] / solves,
+                              'nfev': stats['nfev'] / solves}
+        return avg_stats
+    
+class ActionCache:
+    """
+    Bounded cache of optimal action sequences keyed on quantized observations, with least-recently-used (LRU) eviction.
+    Runs that start from the same initial poses pass through nearly identical states and may reuse earlier solutions instead of re-solving.
+    
+    Attributes
+    ----------
+    size : : natural number
+        Maximal number of entries. When exceeded, the least recently used entry is evicted.
+    quant : : number or array of shape ``[dim_output, ]``
+        Quantization step of observations: observations that round to the same multiples of ``quant`` share an entry.
+    settings : : tuple
+        Settings that determine the cached solutions (e.g., horizon length, prediction step size and discount factor). They are a part of every key.
+    mode : : string
+        ``'exact'``: cached sequences are meant as final answers, ``'warm'``: cached sequences are meant as initial guesses only.
+    hits, misses : : natural numbers
+        Cache statistics.
+    
+    """
+    def __init__(self, size, quant, settings=(), mode='exact'):
+        if mode not in ['exact', 'warm']:
+            raise ValueError('Invalid cache mode: ' + str(mode))
+        
+        self.size = size
+        self.quant = np.asarray(quant, dtype=np.float64)
+        self.settings = tuple(settings)
+        self.mode = mode
+        
+        self._entries = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        
+    def _key(self, observation):
+        return tuple( np.round(np.asarray(observation) / self.quant).astype(int).tolist() ) + self.settings
+    
+    def get(self, observation):
+        """
+        Cached action sequence for ``observation`` or ``None``.
+        
+        """
+        key = self._key(observation)
+        
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key].copy()
+        
+        self.misses += 1
+        return None
+    
+    def put(self, observation, action_sqn):
+        key = self._key(observation)
+        
+        self._entries[key] = np.array(action_sqn)
+        self._entries.move_to_end(key)
+        
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            
+    def clear(self):
+        self._entries.clear()
+        
+    def get_stats(self):
+        lookups = max(self.hits + self.misses, 1)
+        
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups}
+    
+class PolicyTable:
+    """
+    Explicit (precomputed) policy: first actions of the MPC problem solved offline on a regular grid of observations, looked up by multilinear interpolation.
+    A lookup costs microseconds whereas an online solve costs many milliseconds.
+    
+    Attributes
+    ----------
+    axes : : list of arrays
+        Grid points along each observation component.
+    actions : : array of shape ``[len(axes[0]), ..., len(axes[-1]), dim_input]``
+        Actions at the grid points.
+    periodic_dims : : list of integers
+        Observation components that are periodic with period equal to the span of the respective axis, e.g., an angle on ``[-pi, pi]``.
+        Values along these components are wrapped, the others are clipped to the grid.
+    ctrl_pars : : dictionary
+        Settings of the controller the table was built with, see :func:`~controllers.PolicyTable.get_ctrl_pars`.
+        They are stored along with the table and checked against the controller that loads it, see :func:`~controllers.PolicyTable.check_ctrl`.
+        
+    See also
+    --------
+    
+    ``build_policy_table_3wrobot_NI.py``
+    
+    """
+    def __init__(self, axes, actions, periodic_dims=[], ctrl_pars={}):
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.actions = np.asarray(actions)
+        self.periodic_dims = list(periodic_dims)
+        self.ctrl_pars = dict(ctrl_pars)
+        
+        self.dim_grid = len(self.axes)
+        
+        # Offsets of the corners of a grid cell
+        self._corners = np.array( np.meshgrid(*[[0, 1]]*self.dim_grid, indexing='ij') ).reshape(self.dim_grid, -1).T
+        
+        self._lower = np.array([axis[0] for axis in self.axes])
+        self._upper = np.array([axis[-1] for axis in self.axes])
+        self._is_periodic = np.isin(np.arange(self.dim_grid), self.periodic_dims)
+    
+    @staticmethod
+    def get_ctrl_pars(ctrl):
+        """
+        Settings of the controller ``ctrl`` that determine the actions of a table: horizon, prediction step size, discount factor,
+        running objective (structure and the matrix ``R1``) and action bounds.
+        
+        """
+        return {'Nactor': ctrl.Nactor,
+                'pred_step_size': ctrl.pred_step_size,
+                'gamma': ctrl.gamma,
+                'run_obj_struct': ctrl.run_obj_struct,
+                'R1': np.asarray(ctrl.run_obj_pars[0], dtype=np.float64),
+                'action_min': ctrl.action_min,
+                'action_max': ctrl.action_max}
+    
+    def check_ctrl(self, ctrl):
+        """
+        Check that the controller ``ctrl`` has the settings the table was built with. Raises ``ValueError`` otherwise, or if the table stores no settings.
+        
+        """
+        if not self.ctrl_pars:
+            raise ValueError('Policy table stores no controller settings, rebuild it')
+        
+        mismatches = []
+        
+        for key, val in self.get_ctrl_pars(ctrl).items():
+            val_table = self.ctrl_pars.get(key)
+            
+            if isinstance(val, str):
+                is_match = str(val_table) == val
+            else:
+                is_match = val_table is not None and np.shape(val_table) == np.shape(val) and np.allclose(val_table, val)
+            
+            if not is_match:
+                mismatches.append('{}: {} in the table, {} in the controller'.format(key, val_table, val))
+        
+        if mismatches:
+            raise ValueError('Policy table was built for other controller settings. ' + '; '.join(mismatches))
+    
+    @classmethod
+    def build(cls, ctrl, axes, periodic_dims=[]):
+        """
+        Solve the MPC problem of the controller ``ctrl`` (an instance of :class:`~controllers.ControllerOptimalPredictive`) at every grid point.
+        The observation is taken as the model state, i.e., the model output is assumed to be the state.
+        Each solve is cold-started so that the table does not depend on the order of the grid points.
+        
+        """
+        grid_shape = [len(axis) for axis in axes]
+        actions = np.zeros(grid_shape + [ctrl.dim_input])
+        
+        for idx in np.ndindex(*grid_shape):
+            # Periodic end points duplicate the start points
+            src_idx = tuple(0 if (dim in periodic_dims and i == grid_shape[dim]-1) else i for dim, i in enumerate(idx))
+            if src_idx != idx:
+                continue
+            
+            observation = np.array([axes[dim][i] for dim, i in enumerate(idx)])
+            
+            ctrl.receive_sys_state(observation)
+            ctrl.warm_start.reset()
+            actions[idx] = ctrl._actor_optimizer(observation)
+        
+        for dim in periodic_dims:
+            first = [slice(None)]*len(axes)
+            last = [slice(None)]*len(axes)
+            first[dim] = 0
+            last[dim] = -1
+            actions[tuple(last)] = actions[tuple(first)]
+            
+        ctrl.warm_start.reset()
+            
+        return cls(axes, actions, periodic_dims, cls.get_ctrl_pars(ctrl))
+        
+    @classmethod
+    def load(cls, filename, ctrl=None):
+        """
+        Load a table stored by :func:`~controllers.PolicyTable.save`. If ``ctrl`` is given, it is checked by :func:`~controllers.PolicyTable.check_ctrl`.
+        
+        """
+        data = np.load(filename)
+        
+        axes = [data['axis_{}'.format(dim)] for dim in range(int(data['dim_grid']))]
+        ctrl_pars = {key[len('ctrl_'):]: data[key] for key in data.files if key.startswith('ctrl_')}
+        
+        policy_table = cls(axes, data['actions'], list(data['periodic_dims']), ctrl_pars)
+        
+        if ctrl is not None:
+            policy_table.check_ctrl(ctrl)
+        
+        return policy_table
+    
+    def save(self, filename):
+        """
+        Store the table along with the controller settings and the grid in a compressed ``.npz`` file. Actions are stored in single precision.
+        
+        """
+        axes = {'axis_{}'.format(dim): axis for dim, axis in enumerate(self.axes)}
+        ctrl_pars = {'ctrl_' + key: val for key, val in self.ctrl_pars.items()}
+        
+        np.savez_compressed(filename,
+                            dim_grid=self.dim_grid,
+                            periodic_dims=np.array(self.periodic_dims, dtype=int),
+                            actions=self.actions.astype(np.float32),
+                            **axes,
+                            **ctrl_pars)
+        
+    def lookup(self, observation):
+        """
+        Action at ``observation`` by multilinear interpolation between the actions at the corners of the enclosing grid cell.
+        
+        """
+        val = np.array(observation[:self.dim_grid], dtype=np.float64)
+        
+        # Wrap periodic components, clip the others to the grid
+        val = np.where(self._is_periodic, self._lower + (val - self._lower) % (self._upper - self._lower), np.clip(val, self._lower, self._upper))
+        
+        idx = np.array([min(np.searchsorted(axis, val[dim], side='right') - 1, axis.size - 2) for dim, axis in enumerate(self.axes)])
+        
+        lower = np.array([axis[i] for axis, i in zip(self.axes, idx)])
+        upper = np.array([axis[i+1] for axis, i in zip(self.axes, idx)])
+        weights = (val - lower) / (upper - lower)
+        
+        corner_weights = np.prod( np.where(self._corners, weights, 1 - weights), axis=1 )
+        corner_actions = self.actions[tuple( (idx + self._corners).T )]
+            
+        return corner_weights @ corner_actions
+    
+    def eval_error(self, ctrl, observations):
+        """
+        Interpolation error against the online solver of ``ctrl`` (cold-started) at given observations of shape ``[N, dim_output]``, e.g., held-out states not on the grid.
+        
+        Returns
+        -------
+        errors : : array of shape ``[N, dim_input]``
+            Absolute differences between interpolated and online actions.
+        lookup_time, solve_time : : numbers
+            Average wall-clock time (in seconds) of a lookup, resp., an online solve.
+        
+        """
+        errors = np.zeros([observations.shape[0], ctrl.dim_input])
+        lookup_time = 0
+        solve_time = 0
+        
+        for k, observation in enumerate(observations):
+            time_start = time.perf_counter()
+            action_table = self.lookup(observation)
+            lookup_time += time.perf_counter() - time_start
+            
+            ctrl.receive_sys_state(observation)
+            ctrl.warm_start.reset()
+            
+            time_start = time.perf_counter()
+            action_online = ctrl._actor_optimizer(observation)
+            solve_time += time.perf_counter() - time_start
+            
+            errors[k, :] = np.abs(action_table - action_online)
+            
+        ctrl.warm_start.reset()
+        
+        return errors, lookup_time / observations.shape[0], solve_time / observations.shape[0]
+    
+class N_CTRL:
+    """
+    Nominal controller of the 3-wheel robot: a kinematic polar-coordinate stabilizer that drives the robot to the origin.
+    
+    With the distance :math:`\\rho` to the origin and the heading error :math:`\\alpha` (the angle between the robot orientation and the direction to the origin, 
+    wrapped to :math:`[-\\pi, \\pi)`), the action is
+    
+    .. math::
+        v = k_\\rho \\rho \\cos \\alpha, \\quad \\omega = k_\\alpha \\alpha,
+    
+    clipped to the control constraints. The linear velocity is negative while the origin is behind the robot.
+    
+    Attributes
+    ----------
+    ctrl_bnds : : array of shape ``[dim_input, 2]``
+        Box control constraints as in :class:`~controllers.ControllerOptimalPredictive`.
+    k_rho, k_alpha : : positive numbers
+        Gains of the linear and angular velocities.
+    
+    """
+    def __init__(self, ctrl_bnds, k_rho=1, k_alpha=2):
+        self.ctrl_bnds = np.array(ctrl_bnds)
+        self.k_rho = k_rho
+        self.k_alpha = k_alpha
+        
+    def pure_loop(self, observation):
+        """
+        Action at the observation ``[x, y, alpha]``.
+        
+        """
+        rho = np.sqrt( observation[0]**2 + observation[1]**2 )
+        
+        alpha = np.arctan2(-observation[1], -observation[0]) - observation[2]
+        alpha = (alpha + np.pi) % (2*np.pi) - np.pi
+        
+        v = self.k_rho * rho * np.cos(alpha)
+        w = self.k_alpha * alpha
+        
+        return np.clip( np.array([v, w]), self.ctrl_bnds[:, 0], self.ctrl_bnds[:, 1] )
@@ -40,6 +40,61 @@ class Logger3WRobotNI(Logger):
     
         print(table)
     
+    def print_solver_stats(self, stats):
+        """
+        Print average actor optimizer work per solve, separately for warm- and cold-started solves, as returned by :func:`~controllers.ActorWarmStart.get_stats`.
+        
+        """
+        row_header = ['start', 'solves', 'nit', 'nfev']
+        rows = [[key, stats[key]['solves'], stats[key]['nit'], stats[key]['nfev']] for key in stats]
+        table = tabulate([row_header, *rows], floatfmt='8.1f', headers='firstrow', tablefmt='grid')
+        
+        print(table)
+    
+    def print_cache_stats(self, stats):
+        """
+        Print action cache statistics as returned by :func:`~controllers.ActionCache.get_stats`.
+        
+        """
+        row_header = ['entries', 'hits', 'misses', 'hit rate']
+        row_data = [stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']]
+        table = tabulate([row_header, row_data], floatfmt='8.3f', headers='firstrow', tablefmt='grid')
+        
+        print(table)
+    
+    def print_deadline_stats(self, stats):
+        """
+        Print deadline statistics as returned by :func:`~controllers.DeadlineSupervisor.get_stats`.
+        
+        """
+        row_header = ['samples', 'deadline misses', 'miss rate']
+        row_data = [stats['samples'], stats['deadline_misses'], stats['miss_rate']]
+        table = tabulate([row_header, row_data], floatfmt='8.3f', headers='firstrow', tablefmt='grid')
+        
+        print(table)
+    
+    def print_runs_summary(self, summaries):
+        """
+        Print per-run summaries, given as a list of dictionaries with equal keys (one per run).
+        
+        """
+        row_header = list(summaries[0].keys())
+        rows = [list(summary.values()) for summary in summaries]
+        table = tabulate([row_header, *rows], floatfmt='.4g', headers='firstrow', tablefmt='grid')
+        
+        print(table)
+        
+    def log_runs_summary(self, datafile, summaries):
+        """
+        Write per-run summaries, given as in :func:`~loggers.Logger3WRobotNI.print_runs_summary`, into a data file.
+        
+        """
+        with open(datafile, 'w', newline='') as outfile:
+                writer = csv.writer(outfile)
+                writer.writerow(list(summaries[0].keys()))
+                for summary in summaries:
+                    writer.writerow(list(summary.values()))
+    
     def log_data_row(self, datafile, t, xCoord, yCoord, alpha, run_obj, accum_obj, action):
         with open(datafile, 'a', newline='') as outfile:
                 writer = csv.writer(outfile)
@@ -3,6 +3,8 @@ Contains classes to be used in fitting system models.
 
 """
 
+import numpy as np
+
 class ModelSS:
     """
     State-space model
@@ -17,7 +19,8 @@ class ModelSS:
     ---------- 
     A, B, C, D : : arrays of proper shape
         State-space model parameters.
-    x0set : : array
+        Change them via :func:`~models.ModelSS.upd_pars` only, since the matrices used by :func:`~models.ModelSS.sim_batch` are cached.
+    x0est : : array
         Initial state estimate.
             
     """
@@ -29,14 +32,188 @@ class ModelSS:
         self.D = D
         self.x0est = x0est
         
+        # Observability and Toeplitz matrices of Markov parameters per sequence length
+        self._sim_mats = {}
+        
     def upd_pars(self, Anew, Bnew, Cnew, Dnew):
         self.A = Anew
         self.B = Bnew
         self.C = Cnew
         self.D = Dnew
         
+        self._sim_mats = {}
+        
     def updateIC(self, x0setNew):
-        self.x0set = x0setNew
+        self.x0est = x0setNew
+        
+    def _get_sim_mats(self, T):
+        """
+        Matrices that map the initial state, resp., the stacked input sequence of length ``T`` to the stacked output sequence:
+        
+        .. math::
+            \\begin{array}{ll}
+                \\mathcal O & = \\begin{bmatrix} C \\\\ C A \\\\ \\vdots \\\\ C A^{T-1} \\end{bmatrix}, \\newline
+                \\mathcal T & = \\begin{bmatrix} D & & & \\\\ C B & D & & \\\\ \\vdots & & \\ddots & \\\\ C A^{T-2} B & \\dots & C B & D \\end{bmatrix}.
+            \\end{array}
+        
+        """
+        if T not in self._sim_mats:
+            dim_output, dim_state = self.C.shape
+            dim_input = self.B.shape[1]
+            
+            obs_mat = np.zeros( [T, dim_output, dim_state] )
+            markov_pars = np.zeros( [T, dim_output, dim_input] )
+            
+            markov_pars[0] = self.D
+            CA_power = self.C
+            for k in range(T):
+                obs_mat[k] = CA_power
+                if k < T-1:
+                    markov_pars[k+1] = CA_power @ self.B
+                CA_power = CA_power @ self.A
+            
+            # Block (k, j) of the Toeplitz matrix is the Markov parameter k-j (zero for j > k)
+            k_idx, j_idx = np.meshgrid(np.arange(T), np.arange(T), indexing='ij')
+            toeplitz = markov_pars[np.maximum(k_idx - j_idx, 0)] * (k_idx >= j_idx)[:, :, np.newaxis, np.newaxis]
+            
+            self._sim_mats[T] = ( np.reshape(obs_mat, [T*dim_output, dim_state]),
+                                  np.reshape(toeplitz.transpose(0, 2, 1, 3), [T*dim_output, T*dim_input]) )
+            
+        return self._sim_mats[T]
+        
+    def sim_batch(self, action_sqns, x0=None):
+        """
+        Output sequences of the model for a batch of input sequences, i.e., :math:`y_k = C x_k + D u_k`, :math:`x_{k+1} = A x_k + B u_k`, :math:`k = 0, \\dots, T-1`.
+        
+        All sequences are propagated at once by two matrix products with the (cached) observability and Toeplitz matrices of Markov parameters.
+        
+        Parameters
+        ----------
+        action_sqns : : array of shape ``[batch, T, dim_input]``
+            Input sequences.
+        x0 : : array of shape ``[dim_state, ]`` or ``[batch, dim_state]``
+            Initial state(s). If ``None``, ``x0est`` is used.
+        
+        Returns
+        -------
+        observation_sqns : : array of shape ``[batch, T, dim_output]``
+        
+        """
+        if x0 is None:
+            x0 = self.x0est
+            
+        batch, T, dim_input = action_sqns.shape
+        
+        obs_mat, toeplitz = self._get_sim_mats(T)
+        
+        observation_sqns = np.reshape(action_sqns, [batch, T*dim_input]) @ toeplitz.T + np.atleast_2d(x0) @ obs_mat.T
+        
+        return np.reshape(observation_sqns, [batch, T, -1])
+         
+class RLS:
+    """
+    Recursive least squares (RLS) estimator of parameters :math:`\\theta` of a linear regression
+    
+    .. math::
+        y = \\theta^\\top \\varphi,
+        
+    where :math:`\\varphi` is the regressor and :math:`y` is the (scalar or vector) target.
+    Each update costs :math:`O(d^2)` with :math:`d` being the regressor dimension, independently of the number of processed data points.
+    
+    Attributes
+    ----------
+    theta : : array of shape ``[dim_regressor, ]`` or ``[dim_regressor, dim_target]``
+        Parameter estimate.
+    P : : array of shape ``[dim_regressor, dim_regressor]``
+        Scaled inverse of the information matrix.
+    forget : : number in (0, 1]
+        Forgetting factor. Values smaller than 1 discount old data exponentially (useful if the regression drifts).
+    theta_min, theta_max : : arrays of the shape of ``theta``
+        Box bounds on the parameters, enforced by projection after each update. If empty, parameters are unconstrained.
+    
+    """
+    def __init__(self, theta_init, P_init=1e3, forget=1, theta_min=[], theta_max=[]):
+        self.theta_init = np.array(theta_init, dtype=np.float64)
+        self.P_init = P_init
+        self.forget = forget
+        self.theta_min = np.array(theta_min)
+        self.theta_max = np.array(theta_max)
+        
+        self.reset()
+        
+    def reset(self):
+        self.theta = self.theta_init.copy()
+        self.P = self.P_init * np.eye(self.theta.shape[0])
+        
+    def update(self, regressor, target):
+        """
+        Update the estimate with one data point.
+        
+        """
+        P_regressor = self.P @ regressor
+        gain = P_regressor / ( self.forget + regressor @ P_regressor )
+        
+        error = target - regressor @ self.theta
+        
+        self.theta = self.theta + np.multiply.outer(gain, error)
+        self.P = ( self.P - np.outer(gain, P_regressor) ) / self.forget
+        
+        if self.theta_min.size > 0:
+            self.theta = np.clip(self.theta, self.theta_min, self.theta_max)
+        
+        return self.theta
+         
+class IdentifierSS:
+    """
+    Online identifier of a state-space model (see :class:`~models.ModelSS`) whose state is the observation itself, i.e., 
+    
+    .. math::
+        y^+ = A y + B u,
+        
+    so that :math:`C = I`, :math:`D = 0`.
+    The parameters :math:`[A \\; B]` are estimated by recursive least squares (see :class:`~models.RLS`) on pairs of consecutive samples,
+    so that each update costs the same independently of how much data has been processed.
+    
+    Attributes
+    ----------
+    dim_output, dim_input : : natural numbers
+        Dimensions of observation and action.
+    model : : :class:`~models.ModelSS`
+        Current model estimate.
+    
+    """
+    def __init__(self, dim_output, dim_input, forget=1, P_init=1e3):
+        self.dim_output = dim_output
+        self.dim_input = dim_input
+        
+        # Initial guess: constant observation
+        self.rls = RLS(np.vstack([np.eye(dim_output), np.zeros( [dim_input, dim_output] )]), P_init=P_init, forget=forget)
+        
+        self.model = ModelSS(np.eye(dim_output),
+                             np.zeros( [dim_output, dim_input] ),
+                             np.eye(dim_output),
+                             np.zeros( [dim_output, dim_input] ),
+                             np.zeros(dim_output))
+        
+    def _upd_model(self):
+        self.model.upd_pars(self.rls.theta[:self.dim_output, :].T,
+                            self.rls.theta[self.dim_output:, :].T,
+                            self.model.C,
+                            self.model.D)
+        
+    def reset(self):
+        self.rls.reset()
+        self._upd_model()
+        
+    def update(self, observations, actions):
+        """
+        Update the estimate with consecutive samples of observations of shape ``[T, dim_output]`` and actions of shape ``[T, dim_input]``, i.e., with ``T-1`` pairs.
+        
+        """
+        for k in range(observations.shape[0] - 1):
+            self.rls.update(np.concatenate([observations[k, :], actions[k, :]]), observations[k+1, :])
+            
+        self._upd_model()
          
 class ModelNN:
     def __init__(self, *args, **kwargs):
@@ -11,7 +11,7 @@ The system can be of three types:
 import numpy as np
 import scipy as sp
 
-from utilities import rej_sampling_rvs
+from utilities import RejSampler
 
 class Simulator:
     """
@@ -36,6 +36,8 @@ class Simulator:
         Right-hand side description of the closed-loop system.
         Say, if you instantiated a concrete system (i.e., as an instance of a subclass of ``system`` class with concrete ``closed_loop_rhs`` method) as ``my_sys``,
         this could be just ``my_sys.closed_loop_rhs``.
+        If ``sys_type`` is ``discr_prob``, this is the density of the next state, called with a single proposal of shape ``[dim_state]`` as in :func:`~utilities.rej_sampling_rvs`,
+        or, if ``is_batch_pdf`` is 1, with blocks of proposals of shape ``[Nenvs, block_size, dim_state]``, see :class:`~utilities.RejSampler`.
         
     sys_out : : function
         System output function.
@@ -53,6 +55,36 @@ class Simulator:
     max_step, first_step, atol, rtol : : numbers
         Parameters for an ODE solver (used if ``sys_type`` is ``diff_eqn``).
         
+    solver : : string
+        Integration scheme (used if ``sys_type`` is ``diff_eqn``):
+        
+        | ``RK45`` : adaptive Runge-Kutta scheme of ``scipy.integrate``, one solver step per :func:`~simulator.Simulator.sim_step`
+        | ``RK4`` : classical fixed-step Runge-Kutta scheme, exactly one step ``dt`` per :func:`~simulator.Simulator.sim_step`
+        | ``exact`` : closed-form solution ``closed_loop_step`` over exactly one step ``dt`` per :func:`~simulator.Simulator.sim_step`
+        
+        The fixed-step schemes suit systems under a zero-order hold action with ``dt`` equal to the controller sampling time.
+        ``RK4`` evaluates ``closed_loop_rhs`` on preallocated stage buffers that are reused from step to step, and lets it write the slopes into a preallocated buffer as well.
+        Thus, with ``RK4``, ``closed_loop_rhs`` must accept the ``out`` argument of :func:`~systems.System.closed_loop_rhs`.
+        
+    closed_loop_step : : function
+        Closed-form closed-loop state after a given time, e.g., ``my_sys.closed_loop_step``, see :func:`~systems.System.closed_loop_step`. Required if ``solver`` is ``exact``.
+        
+    is_event_driven : : 0 or 1
+        If 1, each :func:`~simulator.Simulator.sim_step` integrates straight to the next sample time, i.e., over ``dt``, 
+        so that the caller only has to deal with the controller and the logger at sample instants. With ``dt`` equal to the controller sampling time, this saves most of the Python round-trips 
+        per simulated second. Since the action is held over the step, the ``RK45`` scheme is not limited by ``max_step`` and tries the whole step first, 
+        so that, within the tolerances, a step often takes a single solver step. Only applies to ``RK45``: the fixed-step schemes always step by ``dt``, and setting it with them is an error.
+        
+    Ninterp : : natural number
+        Number of interpolated points per step in the event-driven mode, say, for plotting, see :func:`~simulator.Simulator.get_interp_data`. If 0, no dense output is computed.
+        Requires ``is_event_driven``.
+        
+    is_batch_pdf : : 0 or 1
+        If 1, the next-state density ``closed_loop_rhs`` of a ``discr_prob`` system is evaluated on whole blocks of proposals. Otherwise, per proposal.
+        
+    seed : : integer or ``numpy.random.SeedSequence``
+        Seed of the random number generator of the rejection sampler (used if ``sys_type`` is ``discr_prob``). If not specified, realizations are not reproducible.
+        
     See also
     --------
 
@@ -74,7 +106,13 @@ class Simulator:
                  atol=1e-5,
                  rtol=1e-3,
                  is_disturb=0,
-                 is_dyn_ctrl=0):
+                 is_dyn_ctrl=0,
+                 solver='RK45',
+                 closed_loop_step=None,
+                 is_event_driven=0,
+                 Ninterp=0,
+                 is_batch_pdf=0,
+                 seed=None):
         
         """
         Parameters
@@ -96,6 +134,7 @@ class Simulator:
             Right-hand side description of the closed-loop system.
             Say, if you instantiated a concrete system (i.e., as an instance of a subclass of ``System`` class with concrete ``closed_loop_rhs`` method) as ``my_sys``,
             this could be just ``my_sys.closed_loop_rhs``.
+            If ``sys_type`` is ``discr_prob``, this is the density of the next state, see class documentation.
             
         sys_out : : function
             System output function.
@@ -112,12 +151,40 @@ class Simulator:
             
         max_step, first_step, atol, rtol : : numbers
             Parameters for an ODE solver (used if ``sys_type`` is ``diff_eqn``).
+        solver : : string
+            Integration scheme (used if ``sys_type`` is ``diff_eqn``): ``RK45``, ``RK4`` or ``exact``, see class documentation.
+        closed_loop_step : : function
+            Closed-form closed-loop state after a given time. Required if ``solver`` is ``exact``.
+        is_event_driven : : 0 or 1
+            If 1, the ``RK45`` scheme integrates straight to the next sample time on each step, see class documentation.
+        Ninterp : : natural number
+            Number of interpolated points per step in the event-driven mode. Requires ``is_event_driven``.
+        is_batch_pdf : : 0 or 1
+            If 1, the next-state density of a ``discr_prob`` system accepts blocks of proposals, see class documentation.
+        seed : : integer or ``numpy.random.SeedSequence``
+            Seed of the rejection sampler.
         """
         
         self.sys_type = sys_type
         self.closed_loop_rhs = closed_loop_rhs
         self.sys_out = sys_out
         self.dt = dt
+        self.solver = solver
+        self.closed_loop_step = closed_loop_step
+        self.is_event_driven = is_event_driven
+        self.Ninterp = Ninterp
+        
+        if solver not in ['RK45', 'RK4', 'exact']:
+            raise ValueError('Invalid solver: ' + str(solver))
+        
+        if solver == 'exact' and closed_loop_step is None:
+            raise ValueError('Solver exact requires closed_loop_step')
+        
+        if is_event_driven and solver != 'RK45':
+            raise ValueError('Event-driven mode requires solver RK45, got: ' + str(solver))
+        
+        if Ninterp > 0 and not is_event_driven:
+            raise ValueError('Ninterp requires the event-driven mode')
         
         # Build full state of the closed-loop
         if is_dyn_ctrl:
@@ -132,22 +199,28 @@ class Simulator:
                 state_full_init = state_init
             
         self.state_full = state_full_init
+        self.state_full_init = state_full_init
             
         self.t = t0
+        self.t0 = t0
         self.state = state_init
         self.dim_state = state_init.shape[0]
         self.observation = self.sys_out(state_init)
         
-        if sys_type == "diff_eqn":
+        if sys_type == "diff_eqn" and solver == "RK45":
             
             # Store these for reset purposes
-            self.state_full_init = state_full_init
-            self.t0 = t0
             self.t1 = t1
             self.max_step = dt/2
             self.first_step = first_step
             self.atol = atol
             self.rtol = rtol
+            
+            self._Nsteps = 0
+            
+            # Dense output of the last step in the event-driven mode
+            self.interp_ts = np.array([t0])
+            self.interp_states_full = np.array([state_full_init])
                         
             # self.ODE_solver = sp.integrate.RK45(closed_loop_rhs, t0, state_full_init, t1, max_step = dt/2, first_step=first_step, atol=atol, rtol=rtol)
             self.ODE_solver = sp.integrate.RK45(self.closed_loop_rhs,
@@ -159,6 +232,28 @@ class Simulator:
                                                 atol=self.atol,
                                                 rtol=self.rtol
                                                 )
+            
+        elif sys_type == "diff_eqn" and solver == "RK4":
+            # Stage state, stage slope and slope accumulator
+            self._stage = np.zeros(state_full_init.shape[0])
+            self._stage_slope = np.zeros(state_full_init.shape[0])
+            self._slope = np.zeros(state_full_init.shape[0])
+            
+            # Steps are counted, so that time does not drift by round-off
+            self._Nsteps = 0
+            
+        elif sys_type == "diff_eqn" and solver == "exact":
+            self._Nsteps = 0
+            
+        elif sys_type == "discr_prob":
+            if is_batch_pdf:
+                pdf = self.closed_loop_rhs
+            else:
+                # The density is evaluated per proposal, as in rej_sampling_rvs
+                pdf = lambda proposals: np.apply_along_axis(self.closed_loop_rhs, -1, proposals)
+            
+            # The proposal is cached in the sampler
+            self.rej_sampler = RejSampler(self.dim_state, pdf, 10, rng=np.random.default_rng(seed))
                
     def sim_step(self):
         """
@@ -166,10 +261,51 @@ class Simulator:
 
         """
         if self.sys_type == "diff_eqn":
-            self.ODE_solver.step()
-            
-            self.t = self.ODE_solver.t
-            self.state_full = self.ODE_solver.y
+            if self.solver == "RK45" and self.is_event_driven:
+                t_next = self.t0 + (self._Nsteps + 1) * self.dt
+                
+                # The action is held over the step, so the right-hand side is smooth and the solver first tries the whole step at once. 
+                # The step size is only limited by the tolerances
+                ODE_solver = sp.integrate.RK45(self.closed_loop_rhs,
+                                               self.t,
+                                               self.state_full,
+                                               t_next,
+                                               first_step=t_next - self.t,
+                                               atol=self.atol,
+                                               rtol=self.rtol)
+                
+                solver_ts = [self.t]
+                interpolants = []
+                
+                while ODE_solver.status == 'running':
+                    ODE_solver.step()
+                    
+                    if self.Ninterp > 0:
+                        solver_ts.append(ODE_solver.t)
+                        interpolants.append(ODE_solver.dense_output())
+                
+                if self.Ninterp > 0:
+                    self.interp_ts = np.linspace(self.t, t_next, self.Ninterp + 1)
+                    self.interp_states_full = sp.integrate.OdeSolution(solver_ts, interpolants)(self.interp_ts).T
+                
+                self._Nsteps += 1
+                self.t = t_next
+                self.state_full = ODE_solver.y
+            elif self.solver == "RK45":
+                self.ODE_solver.step()
+                
+                self.t = self.ODE_solver.t
+                self.state_full = self.ODE_solver.y
+            elif self.solver == "RK4":
+                self.state_full = self._rk4_step(self.t, self.state_full)
+                
+                self._Nsteps += 1
+                self.t = self.t0 + self._Nsteps * self.dt
+            elif self.solver == "exact":
+                self.state_full = self.closed_loop_step(self.t, self.state_full, self.dt)
+                
+                self._Nsteps += 1
+                self.t = self.t0 + self._Nsteps * self.dt
             
             self.state = self.state_full[0:self.dim_state]
             self.observation = self.sys_out(self.state)
@@ -182,7 +318,7 @@ class Simulator:
             self.observation = self.sys_out(self.state)
             
         elif self.sys_type == "discr_prob":
-            self.state_full = rej_sampling_rvs(self.dim_state, self.closed_loop_rhs, 10)
+            self.state_full = self.rej_sampler.sample()[0, :]
             
             self.t = self.t + self.dt
             
@@ -191,6 +327,54 @@ class Simulator:
         else:
             raise ValueError('Invalid system description')
             
+    def _rk4_step(self, t, state_full):
+        """
+        One step ``dt`` of the classical Runge-Kutta scheme. 
+        Only the returned state is a new array (callers may keep references to it), the stages are computed in the preallocated buffers,
+        into which ``closed_loop_rhs`` writes via its ``out`` argument (see :func:`~systems.System.closed_loop_rhs`).
+        
+        Since the system tracks the state it was last evaluated at (see :func:`~systems.System.closed_loop_rhs`) and the last stage is an intermediate point,
+        ``closed_loop_rhs`` is evaluated once more at the returned state, so that the system tracks it as with the other schemes.
+        
+        """
+        dt = self.dt
+        
+        slope = self.closed_loop_rhs(t, state_full, out=self._stage_slope)
+        self._slope[:] = slope
+        
+        np.multiply(slope, dt/2, out=self._stage)
+        self._stage += state_full
+        slope = self.closed_loop_rhs(t + dt/2, self._stage, out=self._stage_slope)
+        self._slope += slope
+        self._slope += slope
+        
+        np.multiply(slope, dt/2, out=self._stage)
+        self._stage += state_full
+        slope = self.closed_loop_rhs(t + dt/2, self._stage, out=self._stage_slope)
+        self._slope += slope
+        self._slope += slope
+        
+        np.multiply(slope, dt, out=self._stage)
+        self._stage += state_full
+        self._slope += self.closed_loop_rhs(t + dt, self._stage, out=self._stage_slope)
+        
+        state_full_next = state_full + dt/6 * self._slope
+        
+        self.closed_loop_rhs(t + dt, state_full_next, out=self._stage_slope)
+        
+        return state_full_next
+    
+    def get_interp_data(self):
+        """
+        Interpolated data over the last step in the event-driven mode (including both ends of the step): times, system states and outputs.
+        
+        """
+        interp_states = self.interp_states_full[:, 0:self.dim_state]
+        
+        interp_observations = np.array( [self.sys_out(state) for state in interp_states] )
+        
+        return self.interp_ts, interp_states, interp_observations
+    
     def get_sim_step_data(self):
         """
         Collect current simulation data: time, system state and output, and, for completeness, full closed-loop state.
@@ -202,7 +386,11 @@ class Simulator:
         return t, state, observation, state_full
     
     def reset(self):
-        if self.sys_type == "diff_eqn":
+        if self.sys_type == "diff_eqn" and self.solver == "RK45":
+            self.interp_ts = np.array([self.t0])
+            self.interp_states_full = np.array([self.state_full_init])
+            
+        if self.sys_type == "diff_eqn" and self.solver == "RK45" and not self.is_event_driven:
             # The only real way to reset the solver seems to be recreating it altogether
             self.ODE_solver = sp.integrate.RK45(self.closed_loop_rhs,
                                     self.t0,
@@ -220,5 +408,140 @@ class Simulator:
             # self.ODE_solver.y = self.state_full_init
         else:
             self.t = self.t0
-            # self.state_full = self.state_full_init
-            self.ODE_solver.y = self.state_full_init
\ No newline at end of file
+            self.state_full = self.state_full_init
+            self._Nsteps = 0
+            
+        self.state = self.state_full_init[0:self.dim_state]
+        self.observation = self.sys_out(self.state)
+
+class VecSimulator:
+    """
+    Vectorized simulator of ``N`` independent copies (environments) of a system under a zero-order hold action.
+    
+    All states are held as one array of shape ``[N, dim_state]`` and stepped at once by the classical Runge-Kutta scheme applied to a batched right-hand side 
+    (such as :func:`~systems.Sys3WRobotNI._state_dyn`). Environments whose episode has ended are reset automatically, while the others continue.
+    Only systems without disturbances and with a static controller are supported.
+    
+    Attributes
+    ----------
+    state_dyn : : function
+        Right-hand side ``state_dyn(t, states, actions)`` of the system, accepting states of shape ``[N, dim_state]`` and actions of shape ``[N, dim_input]``.
+        Say, ``my_sys._state_dyn``.
+    sys_out : : function
+        System output, accepting states of shape ``[N, dim_state]``. Say, ``my_sys.out``.
+    state_inits : : array of shape ``[N, dim_state]``
+        Initial states of the environments.
+    ctrl_bnds : : array of shape ``[dim_input, 2]``
+        Box control constraints, enforced by clipping. If empty, control is unconstrained.
+    t0, t1, dt : : numbers
+        Initial, final times of each episode and time step size.
+    Nsubsteps : : natural number
+        Number of Runge-Kutta steps per step ``dt``.
+    is_terminal : : function
+        Termination condition ``is_terminal(observations)`` of shape ``[N, ]`` in addition to ``t >= t1``.
+        For the 3-wheel robot preset, it is ``lambda observations: np.linalg.norm(observations[:, :2], axis=1) < 0.2``.
+    state_init_sampler : : function
+        If specified, ``state_init_sampler(Nresets)`` returns initial states of shape ``[Nresets, dim_state]`` for the environments that are reset.
+        Otherwise, environments restart from their initial states.
+    
+    """
+    def __init__(self,
+                 state_dyn,
+                 sys_out,
+                 state_inits,
+                 ctrl_bnds=[],
+                 t0=0,
+                 t1=1,
+                 dt=1e-2,
+                 Nsubsteps=1,
+                 is_terminal=None,
+                 state_init_sampler=None):
+        
+        self.state_dyn = state_dyn
+        self.sys_out = sys_out
+        self.state_inits = np.array(state_inits, dtype=np.float64)
+        self.ctrl_bnds = np.array(ctrl_bnds)
+        self.t0 = t0
+        self.t1 = t1
+        self.dt = dt
+        self.Nsubsteps = Nsubsteps
+        self.is_terminal = is_terminal
+        self.state_init_sampler = state_init_sampler
+        
+        self.Nenvs, self.dim_state = self.state_inits.shape
+        
+        self.reset()
+        
+    def reset(self):
+        self.states = self.state_inits.copy()
+        self.observations = self.sys_out(self.states)
+        
+        # Steps are counted per environment, so that time does not drift by round-off
+        self._Nsteps = np.zeros(self.Nenvs, dtype=int)
+        self.ts = np.full(self.Nenvs, self.t0, dtype=np.float64)
+        
+        self.Nepisodes = np.zeros(self.Nenvs, dtype=int)
+        
+    def _rk4_step(self, ts, states, actions, dt):
+        slope1 = self.state_dyn(ts, states, actions)
+        slope2 = self.state_dyn(ts + dt/2, states + dt/2 * slope1, actions)
+        slope3 = self.state_dyn(ts + dt/2, states + dt/2 * slope2, actions)
+        slope4 = self.state_dyn(ts + dt, states + dt * slope3, actions)
+        
+        return states + dt/6 * ( slope1 + 2*slope2 + 2*slope3 + slope4 )
+        
+    def sim_step(self, actions):
+        """
+        Step all environments by ``dt`` with the actions of shape ``[N, dim_input]`` held over the step.
+        
+        Returns
+        -------
+        ts : : array of shape ``[N, ]``
+            Times of the environments. 
+        observations : : array of shape ``[N, dim_output]``
+            Observations of the environments. For those reset in this step, it is the initial observation of the new episode.
+        is_done : : array of shape ``[N, ]``
+            Flags of environments whose episode ended in this step. 
+            Their final times and observations are stored in ``final_ts`` and ``final_observations``.
+        
+        """
+        if self.ctrl_bnds.size > 0:
+            actions = np.clip(actions, self.ctrl_bnds[:, 0], self.ctrl_bnds[:, 1])
+            
+        substep = self.dt / self.Nsubsteps
+        for k in range(self.Nsubsteps):
+            self.states = self._rk4_step(self.ts + k*substep, self.states, actions, substep)
+            
+        self._Nsteps += 1
+        self.ts = self.t0 + self._Nsteps * self.dt
+        
+        self.observations = self.sys_out(self.states)
+        
+        is_done = self.ts >= self.t1 - 1e-9 * self.dt
+        if self.is_terminal is not None:
+            is_done |= self.is_terminal(self.observations)
+            
+        self.final_ts = self.ts[is_done]
+        self.final_observations = self.observations[is_done, :]
+        
+        # Auto-reset
+        if np.any(is_done):
+            if self.state_init_sampler is not None:
+                self.states[is_done, :] = self.state_init_sampler(np.count_nonzero(is_done))
+            else:
+                self.states[is_done, :] = self.state_inits[is_done, :]
+                
+            self.observations = self.sys_out(self.states)
+            self._Nsteps[is_done] = 0
+            self.ts[is_done] = self.t0
+            self.Nepisodes[is_done] += 1
+        
+        return self.ts, self.observations, is_done
+    
+    def get_sim_step_data(self):
+        """
+        Collect current simulation data: times, system states and outputs of all environments.
+
+        """
+        return self.ts, self.states, self.observations
+
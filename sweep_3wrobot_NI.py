@@ -0,0 +1,173 @@
+"""
+Parameter sweep over the 3-wheel robot preset (kinematic model a. k. a. non-holonomic integrator).
+
+Runs the preset ``PRESET_3wrobot_NI.py`` for a grid or a list of configurations of its command-line arguments.
+The configurations are scheduled over a local pool of worker processes. Each worker imports the preset (along with matplotlib, SciPy etc.) once,
+makes the preset configuration from the arguments of a configuration with :func:`PRESET_3wrobot_NI.setup` and runs the configuration's episodes with :func:`PRESET_3wrobot_NI.run_episode`.
+Every configuration is run ``--Nruns`` times with seeds derived from its ``--seed`` as in the ``--workers`` mode of the preset,
+so that the results do not depend on the number of workers.
+
+Example::
+
+    python sweep_3wrobot_NI.py --grid Nactor=4,6,8 dt=0.05,0.1 --workers 4 -- --ctrl_mode MPC --t1 10
+
+Arguments after ``--`` are passed to the preset for all configurations.
+
+"""
+
+import contextlib
+import csv
+import io
+import itertools
+import json
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tabulate import tabulate
+
+import argparse
+
+import PRESET_3wrobot_NI as preset
+
+def parse_grid(grid_spec):
+    """
+    Configurations of the cartesian product of argument values, given as ``KEY=V1,V2,...`` strings.
+    Elements of list-valued arguments, like ``R1_diag``, are separated by colons, e.g., ``R1_diag=100:100:10:0:0,10:10:1:0:0``.
+
+    """
+    keys = []
+    values = []
+
+    for spec in grid_spec:
+        key, vals = spec.split('=', 1)
+        keys.append(key)
+        values.append([val.split(':') if ':' in val else val for val in vals.split(',')])
+
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+def config2argv(config):
+    """
+    Command-line arguments of the preset for a configuration.
+
+    """
+    argv = []
+
+    for key, val in config.items():
+        argv.append('--' + key)
+        if isinstance(val, list):
+            argv.extend([str(elem) for elem in val])
+        else:
+            argv.append(str(val))
+
+    return argv
+
+def config2str(val):
+    """
+    Argument value as in a grid specification.
+
+    """
+    if isinstance(val, list):
+        return ':'.join([str(elem) for elem in val])
+
+    return str(val)
+
+def run_config(argv):
+    """
+    Make the preset configuration from ``argv`` and run all its ``--Nruns`` episodes with the preset's :func:`run_episode`.
+    Returns the summaries of the episodes. Runs in a worker process.
+
+    """
+    config = preset.setup([*argv, '--is_log_data', '0', '--is_visualization', '0', '--is_print_sim_step', '0'])
+
+    seed_seqs = np.random.SeedSequence(config.seed).spawn(config.Nruns)
+
+    # The controllers report their setup on construction
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [preset.run_episode(config, run, seed_seq, None) for run, seed_seq in enumerate(seed_seqs, start=1)]
+
+def summarize(summaries):
+    """
+    Summary of the runs of a configuration: mean accumulated objective, mean time-to-target over the runs that reached the target (NaN if none did),
+    share of runs that reached the target and mean controller latency over the runs that had controller samples (NaN if none had).
+
+    """
+    accum_objs = np.array([summary['accum_obj'] for summary in summaries])
+    t_finals = np.array([summary['t_final'] for summary in summaries])
+    is_target_reached = np.array([summary['is_target_reached'] for summary in summaries], dtype=bool)
+    latencies = np.array([summary['latency_mean'] for summary in summaries])
+
+    time_to_target = np.mean(t_finals[is_target_reached]) if np.any(is_target_reached) else np.nan
+
+    is_sampled = ~np.isnan(latencies)
+    latency = np.mean(latencies[is_sampled]) if np.any(is_sampled) else np.nan
+
+    return [np.mean(accum_objs), time_to_target, np.mean(is_target_reached), latency*1e3]
+
+if __name__ == '__main__':
+
+    description = "Parameter sweep over the 3-wheel robot preset."
+
+    parser = argparse.ArgumentParser(description=description, allow_abbrev=False)
+
+    parser.add_argument('--grid', type=str, nargs='+',
+                        default=[],
+                        help='Grid of preset arguments as KEY=V1,V2,... items, e.g., Nactor=4,6,8 dt=0.05,0.1. ' +
+                        'Elements of list-valued arguments are separated by colons, e.g., R1_diag=100:100:10:0:0,10:10:1:0:0.')
+    parser.add_argument('--configs', type=str,
+                        default=None,
+                        help='JSON file with a list of configurations, each a dictionary of preset arguments, ' +
+                        'e.g., [{"init_robot_pose_x": -3, "init_robot_pose_y": -3}, {"init_robot_pose_x": -2, "init_robot_pose_y": 0}]. ' +
+                        'If combined with --grid, every configuration is run over the whole grid.')
+    parser.add_argument('--Nruns', type=int,
+                        default=1,
+                        help='Number of episodes per configuration.')
+    parser.add_argument('--workers', type=int,
+                        default=None,
+                        help='Number of worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--summary_file', type=str,
+                        default=None,
+                        help='CSV file to store the summary table in.')
+
+    args, preset_argv = parser.parse_known_args()
+
+    if preset_argv[:1] == ['--']:
+        preset_argv = preset_argv[1:]
+
+    #----------------------------------------Configurations
+    if args.configs is not None:
+        with open(args.configs) as infile:
+            configs_list = json.load(infile)
+    else:
+        configs_list = [{}]
+
+    configs = [{**config_list, **config_grid} for config_list in configs_list for config_grid in parse_grid(args.grid)]
+
+    keys = list( dict.fromkeys(key for config in configs for key in config) )
+
+    print('Sweeping {} configurations, {} run(s) each...'.format(len(configs), args.Nruns))
+
+    #----------------------------------------Run
+    tasks = [preset_argv + config2argv(config) + ['--Nruns', str(args.Nruns)] for config in configs]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        config_summaries = list( pool.map(run_config, tasks) )
+
+    #----------------------------------------Summary
+    row_header = [*keys, 'accum_obj', 'time-to-target [s]', 'target reached', 'latency [ms]']
+    rows = []
+
+    for config, summaries in zip(configs, config_summaries):
+        rows.append([config2str(config.get(key, '')) for key in keys] + summarize(summaries))
+
+    print(tabulate([row_header, *rows], floatfmt='.4g', headers='firstrow', tablefmt='grid'))
+
+    if args.summary_file is not None:
+        pathlib.Path(args.summary_file).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(args.summary_file, 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(row_header)
+            writer.writerows(rows)
+
+        print('Summary stored to: ' + args.summary_file)
@@ -8,11 +8,12 @@ Remarks:
 - All vectors are treated as of type [n,]
 - All buffers are treated as of type [L, n] where each row is a vector
 - Buffers are updated from bottom to top
+- Systems may additionally support the batched interface, see :class:`~systems.System`
 
 """
 
 import numpy as np
-from numpy.random import randn
+from utilities import NoiseBlocks
 
 class System:
     """
@@ -64,6 +65,20 @@ class System:
         Parameters of the disturbance model
         
    Each concrete system must realize ``System`` and define ``name`` attribute.   
+    
+    Batched interface (optional)
+    ----------------------------
+    
+    A concrete system may let :func:`~systems.System._state_dyn`, :func:`~systems.System._disturb_dyn` and :func:`~systems.System.out` accept arguments 
+    with (equal) leading batch dimensions, i.e., states of shape ``[..., dim_state]``, actions of shape ``[..., dim_input]`` and disturbances of shape ``[..., dim_disturb]``,
+    and return results of shape ``[..., n]``, respectively. This amounts to ``[..., k]`` indexing and array operations in place of component loops.
+    The result should keep the floating-point precision of the arguments, so that, say, single-precision rollouts stay in single precision.
+    Then controllers (with ``is_batch_sys=1``, see :class:`~controllers.ControllerOptimalPredictive`) and vectorized simulators (see :class:`~simulator.VecSimulator`)
+    evaluate many states per call with the same dynamics implementation.
+    :class:`~systems.Sys3WRobotNI` implements the batched interface.
+    
+    For ``discr_prob`` systems, the simulator treats ``closed_loop_rhs`` as the density of the next state at a single proposal, 
+    or, with ``is_batch_pdf=1``, at blocks of proposals of shape ``[Nenvs, block_size, dim_state]`` (see :class:`~simulator.Simulator`).
         
     """
     def __init__(self,
@@ -130,6 +145,13 @@ class System:
         # Track system's state
         self._state = np.zeros(dim_state)
         
+        # Control constraints and a buffer for the clipped action
+        self._is_ctrl_bnds = np.size(ctrl_bnds) > 0 and np.any(ctrl_bnds)
+        if self._is_ctrl_bnds:
+            self._action_min = np.array(ctrl_bnds)[:, 0]
+            self._action_max = np.array(ctrl_bnds)[:, 1]
+            self._action_clipped = np.zeros(dim_input)
+        
         # Current input (a.k.a. action)
         self.action = np.zeros(dim_input)
         
@@ -144,12 +166,28 @@ class System:
             else:
                 self._dim_full_state = self.dim_state
             
-    def _state_dyn(self, t, state, action, disturb):
+    def _state_dyn(self, t, state, action, disturb, out=None):
         """
         Description of the system internal dynamics.
         Depending on the system type, may be either the right-hand side of the respective differential or difference equation, or a probability distribution.
         As a probability disitribution, ``_state_dyn`` should return a number in :math:`[0,1]`
         
+        If ``out`` (an array of the shape of ``state``) is specified, the result is written into it and returned. 
+        This lets :func:`~systems.System.closed_loop_rhs` and simulators reuse their buffers.
+        
+        """
+        pass
+
+    def _state_dyn_jac(self, t, state, action, disturb=[]):
+        """
+        Jacobians of :func:`~systems.system._state_dyn` with respect to the state and the action (optional).
+        Used by controllers to compute exact gradients of predictive costs.
+        
+        Returns
+        -------
+        Dstate_state : : array of shape ``[dim_state, dim_state]``
+        Dstate_action : : array of shape ``[dim_state, dim_input]``
+        
         """
         pass
 
@@ -197,6 +235,14 @@ class System:
         observation = state
         return observation
     
+    def out_jac(self, state, action=[]):
+        """
+        Jacobian of the system output :func:`~systems.system.out` with respect to the state, an array of shape ``[dim_output, dim_state]``.
+        
+        """
+        # Trivial case: output identical to state
+        return np.eye(self.dim_output, self.dim_state)
+    
     def receive_action(self, action):
         """
         Receive exogeneous control action to be fed into the system.
@@ -210,89 +256,175 @@ class System:
         """
         self.action = action
         
-    def closed_loop_rhs(self, t, state_full):
+    def closed_loop_rhs(self, t, state_full, out=None):
         """
         Right-hand side of the closed-loop system description.
         Combines everything into a single vector that corresponds to the right-hand side of the closed-loop system description for further use by simulators.
         
+        The action is clipped to ``ctrl_bnds`` into a preallocated buffer, the stored action itself is left intact.
+        Without disturbances and dynamical controller, the result of :func:`~systems.System._state_dyn` is returned as is.
+        
         Attributes
         ----------
         state_full : : vector
             Current closed-loop system state        
+        out : : vector
+            If specified, the right-hand side is written into it, down to :func:`~systems.System._state_dyn`, without allocating new arrays.
+            Leave empty for solvers that keep the returned arrays, like those of ``scipy.integrate``
         
         """
-        rhs_full_state = np.zeros(self._dim_full_state)
-        
         state = state_full[0:self.dim_state]
         
-        if self.is_disturb:
-            disturb = state_full[self.dim_state:]
-        else:
-            disturb = []
-        
         if self.is_dyn_ctrl:
             action = state_full[-self.dim_input:]
-            observation = self.out(state)
-            rhs_full_state[-self.dim_input:] = self._ctrlDyn(t, action, observation)
         else:
             # Fetch the control action stored in the system
             action = self.action
         
-        if self.ctrl_bnds.any():
-            for k in range(self.dim_input):
-                action[k] = np.clip(action[k], self.ctrl_bnds[k, 0], self.ctrl_bnds[k, 1])
+        if self._is_ctrl_bnds:
+            action = np.clip(action, self._action_min, self._action_max, out=self._action_clipped)
+        
+        # Track system's state. Copied in place, since simulators may pass buffers that they reuse
+        self._state[:] = state
+        
+        if not self.is_disturb and not self.is_dyn_ctrl:
+            if out is None:
+                return self._state_dyn(t, state, action, [])
+            
+            return self._state_dyn(t, state, action, [], out=out)
         
-        rhs_full_state[0:self.dim_state] = self._state_dyn(t, state, action, disturb)
+        if out is None:
+            out = np.zeros(self._dim_full_state)
         
         if self.is_disturb:
-            rhs_full_state[self.dim_state:] = self._disturb_dyn(t, disturb)
+            disturb = state_full[self.dim_state:self.dim_state + self.dim_disturb]
+            out[self.dim_state:self.dim_state + self.dim_disturb] = self._disturb_dyn(t, disturb)
+        else:
+            disturb = []
         
-        # Track system's state
-        self._state = state
+        if self.is_dyn_ctrl:
+            observation = self.out(state)
+            out[-self.dim_input:] = self._ctrl_dyn(t, action, observation)
+        
+        self._state_dyn(t, state, action, disturb, out=out[0:self.dim_state])
+        
+        return out    
+    
+    def closed_loop_step(self, t, state_full, dt):
+        """
+        Exact closed-loop state after the time ``dt`` under the currently held action (zero-order hold), if the system admits a closed-form solution.
+        Used by simulators as an alternative to numerical integration of :func:`~systems.System.closed_loop_rhs`.
+        
+        Not available in general. Override in concrete systems where possible.
         
-        return rhs_full_state    
+        """
+        raise NotImplementedError('System ' + self.__class__.__name__ + ' has no closed-form step')
     
 class Sys3WRobotNI(System):
     """
     System class: 3-wheel robot with static actuators (the NI - non-holonomic integrator).
     
+    Attributes
+    ----------
+    seed : : integer or ``numpy.random.SeedSequence``
+        Seed of the disturbance noise. If not specified, the noise is not reproducible.
     
     """ 
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, seed=None, **kwargs):
         super().__init__(*args, **kwargs)
         
         self.name = '3wrobotNI'
         
         if self.is_disturb:
-            self.sigma_disturb = self.pars_disturb[0]
-            self.mu_disturb = self.pars_disturb[1]
-            self.tau_disturb = self.pars_disturb[2]
+            self.sigma_disturb = np.asarray(self.pars_disturb[0])
+            self.mu_disturb = np.asarray(self.pars_disturb[1])
+            self.tau_disturb = np.asarray(self.pars_disturb[2])
+            
+            self.disturb_noise = NoiseBlocks(rng=np.random.default_rng(seed))
     
-    def _state_dyn(self, t, state, action, disturb=[]):   
-        Dstate = np.zeros(self.dim_state)
+    def _state_dyn(self, t, state, action, disturb=[], out=None):   
+        """
+        Kinematics of the robot. States and actions may have (equal) leading batch dimensions, i.e., be of shape ``[..., dim_state]``, resp., ``[..., dim_input]``.
+        The result is in single precision if both are.
         
-
-        #####################################################################################################
-        ############################# write down here math model of robot ###################################
-        #####################################################################################################    
+        """
+        if out is None:
+            out = np.empty(np.shape(state), dtype=np.result_type(state, action, np.float32))
+        
+        np.cos(state[..., 2], out=out[..., 0])
+        out[..., 0] *= action[..., 0]
+        np.sin(state[..., 2], out=out[..., 1])
+        out[..., 1] *= action[..., 0]
+        out[..., 2] = action[..., 1]
              
-        return Dstate    
+        return out    
+    
+    def _state_dyn_jac(self, t, state, action, disturb=[]):
+        Dstate_state = np.zeros([self.dim_state, self.dim_state])
+        Dstate_action = np.zeros([self.dim_state, self.dim_input])
+        
+        Dstate_state[0, 2] = -action[0] * np.sin(state[2])
+        Dstate_state[1, 2] = action[0] * np.cos(state[2])
+        
+        Dstate_action[0, 0] = np.cos(state[2])
+        Dstate_action[1, 0] = np.sin(state[2])
+        Dstate_action[2, 1] = 1
+        
+        return Dstate_state, Dstate_action
  
-    def _disturb_dyn(self, t, disturb):
+    def closed_loop_step(self, t, state_full, dt):
         """
+        Exact state after the time ``dt`` under the currently held action (clipped to ``ctrl_bnds``): 
+        with the linear velocity :math:`v` and the angular velocity :math:`\\omega` held constant, the robot moves along a circular arc
         
+        .. math::
+            \\begin{array}{ll}
+                x^+ & = x + v \\delta \\cos \\left( \\alpha + \\frac{\\omega \\delta}{2} \\right) \\text{sinc} \\left( \\frac{\\omega \\delta}{2} \\right), \\newline
+                y^+ & = y + v \\delta \\sin \\left( \\alpha + \\frac{\\omega \\delta}{2} \\right) \\text{sinc} \\left( \\frac{\\omega \\delta}{2} \\right), \\newline
+                \\alpha^+ & = \\alpha + \\omega \\delta,
+            \\end{array}
         
-        """       
-        Ddisturb = np.zeros(self.dim_disturb)
+        where :math:`\\delta` is ``dt`` and :math:`\\text{sinc}(a) = \\sin(a)/a` (the straight line if :math:`\\omega = 0`).
+        Works without disturbances and with a static controller only.
         
-        for k in range(0, self.dim_disturb):
-            Ddisturb[k] = - self.tau_disturb[k] * ( disturb[k] + self.sigma_disturb[k] * (randn() + self.mu_disturb[k]) )
+        """
+        if self.is_disturb or self.is_dyn_ctrl:
+            raise ValueError('Closed-form step of ' + self.name + ' requires is_disturb=0 and is_dyn_ctrl=0')
+        
+        if self._is_ctrl_bnds:
+            action = np.clip(self.action, self._action_min, self._action_max, out=self._action_clipped)
+        else:
+            action = self.action
+            
+        half_turn = action[1] * dt / 2
+        
+        # np.sinc is the normalized one
+        dist = action[0] * dt * np.sinc(half_turn / np.pi)
+        
+        state_next = np.array([state_full[0] + dist * np.cos(state_full[2] + half_turn),
+                               state_full[1] + dist * np.sin(state_full[2] + half_turn),
+                               state_full[2] + 2 * half_turn])
+        
+        self._state[:] = state_next
+        
+        return state_next
+ 
+    def _disturb_dyn(self, t, disturb):
+        """
+        Disturbance as a filtered Gaussian noise. Disturbances may have leading batch dimensions, i.e., be of shape ``[..., dim_disturb]``.
+        The noise is taken from pre-generated blocks, see :class:`~utilities.NoiseBlocks`.
+        
+        """       
+        Ddisturb = - self.tau_disturb * ( disturb + self.sigma_disturb * ( self.disturb_noise.take(np.shape(disturb)) + self.mu_disturb ) )
                 
         return Ddisturb   
     
     def out(self, state, action=[]):
-        observation = np.zeros(self.dim_output)
+        """
+        Output: the full state. States may have leading batch dimensions.
+        
+        """
         observation = state
         return observation
 
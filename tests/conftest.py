@@ -0,0 +1,35 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+# The modules of the package are imported by their plain names, as in the presets
+sys.path.insert(0, str( pathlib.Path(__file__).parents[1] ))
+
+import systems
+
+@pytest.fixture
+def ctrl_bnds():
+    """
+    Control constraints of the 3-wheel robot, as in the preset.
+    
+    """
+    return np.array([[-2.2, 2.2], [-2.84, 2.84]])
+
+@pytest.fixture
+def make_sys(ctrl_bnds):
+    """
+    Factory of 3-wheel robots (kinematic model) without disturbances.
+    
+    """
+    def make_sys():
+        return systems.Sys3WRobotNI(sys_type="diff_eqn",
+                                    dim_state=3,
+                                    dim_input=2,
+                                    dim_output=3,
+                                    dim_disturb=0,
+                                    pars=[],
+                                    ctrl_bnds=ctrl_bnds)
+    
+    return make_sys
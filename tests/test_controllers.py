@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+import controllers
+
+@pytest.fixture
+def make_ctrl(ctrl_bnds):
+    """
+    Factory of predictive controllers of the 3-wheel robot in a given mode.
+    
+    """
+    def make_ctrl(my_sys, mode, **kwargs):
+        state_init = np.array([-2.0, -1.5, 0.8])
+        
+        return controllers.ControllerOptimalPredictive(2,
+                                                       3,
+                                                       mode,
+                                                       ctrl_bnds = ctrl_bnds,
+                                                       sampling_time = 0.1,
+                                                       Nactor = 5,
+                                                       pred_step_size = 0.5,
+                                                       sys_rhs = my_sys._state_dyn,
+                                                       sys_out = my_sys.out,
+                                                       is_batch_sys = 1,
+                                                       state_sys = state_init,
+                                                       gamma = 0.9,
+                                                       run_obj_struct = 'quadratic',
+                                                       run_obj_pars = [np.diag([100, 100, 10, 0, 0])],
+                                                       sys_rhs_jac = my_sys._state_dyn_jac,
+                                                       sys_out_jac = my_sys.out_jac,
+                                                       **kwargs)
+    
+    return make_ctrl
+
+@pytest.mark.parametrize('mode', ['MPC', 'RQL', 'SQL'])
+def test_actor_cost_grad_matches_finite_differences(mode, make_sys, make_ctrl, ctrl_bnds):
+    my_ctrl = make_ctrl(make_sys(), mode)
+    observation = np.array([-2.0, -1.5, 0.8])
+    rng = np.random.default_rng(0)
+    action_sqn = rng.uniform(np.tile(ctrl_bnds[:, 0], 5), np.tile(ctrl_bnds[:, 1], 5))
+    
+    if mode in ['RQL', 'SQL']:
+        my_ctrl.w_critic = rng.uniform(0.1, 1, np.size(my_ctrl.w_critic))
+    
+    grad = my_ctrl._actor_cost_grad(action_sqn, observation)
+    
+    eps = 1e-6
+    grad_num = np.zeros(action_sqn.size)
+    for k in range(action_sqn.size):
+        delta = eps * np.eye(action_sqn.size)[k]
+        grad_num[k] = ( my_ctrl._actor_cost(action_sqn + delta, observation) - my_ctrl._actor_cost(action_sqn - delta, observation) ) / (2*eps)
+        
+    np.testing.assert_allclose(grad, grad_num, rtol=1e-5, atol=1e-4)
+
+def test_actor_pool_shut_down_on_exit(make_sys, make_ctrl):
+    observation = np.array([-2.0, -1.5, 0.8])
+    
+    with make_ctrl(make_sys(), 'MPC', is_glob_opt=1, Nstarts=2, Nworkers=2) as my_ctrl:
+        my_ctrl.compute_action(0.1, observation)
+        assert my_ctrl._actor_pool is not None
+        
+    assert my_ctrl._actor_pool is None
+
+def test_deadline_supervisor_shut_down_on_exit(make_sys, make_ctrl):
+    observation = np.array([-2.0, -1.5, 0.8])
+    
+    with controllers.DeadlineSupervisor(make_ctrl(make_sys(), 'MPC'), 1e-6) as my_ctrl:
+        my_ctrl.compute_action(0.1, observation)
+        assert my_ctrl.samples == 1
+        
+    assert my_ctrl._executor is None
+
+def test_accum_obj_once_per_sample(make_sys, make_ctrl):
+    my_ctrl = make_ctrl(make_sys(), 'N_CTRL')
+    observation = np.array([-2.0, -1.5, 0.8])
+    
+    # Several simulation steps per sample, as with the RK45 scheme
+    for t in [0.05, 0.1, 0.15, 0.2]:
+        action = my_ctrl.compute_action(t, observation)
+        my_ctrl.upd_accum_obj(observation, action)
+        
+    assert np.isclose(my_ctrl.accum_obj_val, 2 * my_ctrl.run_obj(observation, action) * 0.1)
+
+def test_policy_table_checks_ctrl_settings(tmp_path, make_sys, make_ctrl):
+    my_ctrl = make_ctrl(make_sys(), 'MPC')
+    axes = [np.linspace(-1, 0, 3), np.linspace(-1, 0, 3), np.linspace(-np.pi, np.pi, 3)]
+    actions = np.random.default_rng(0).uniform(-1, 1, [3, 3, 3, 2])
+    filename = str(tmp_path / 'policy_table.npz')
+    
+    controllers.PolicyTable(axes, actions, [2], controllers.PolicyTable.get_ctrl_pars(my_ctrl)).save(filename)
+    
+    policy_table = controllers.PolicyTable.load(filename, my_ctrl)
+    np.testing.assert_allclose(policy_table.actions, actions, atol=1e-6)
+    
+    my_ctrl.gamma = 0.8
+    
+    with pytest.raises(ValueError, match='gamma'):
+        controllers.PolicyTable.load(filename, my_ctrl)
+
+def test_multiple_shooting_refined_if_not_converged(make_sys, make_ctrl):
+    my_ctrl = make_ctrl(make_sys(), 'MPC', actor_formulation='multiple')
+    observation = np.array([-2.0, -1.5, 0.8])
+    action_sqn_init = np.tile(np.array([0.5, 0.5]), my_ctrl.Nactor)
+    
+    actor_solve_ms = my_ctrl._actor_solve_ms
+    assert actor_solve_ms(action_sqn_init, observation).success
+    
+    # Report every multiple-shooting solve as not converged
+    def actor_solve_ms_unconverged(*args):
+        opt_result = actor_solve_ms(*args)
+        opt_result.success = False
+        return opt_result
+    my_ctrl._actor_solve_ms = actor_solve_ms_unconverged
+    
+    with pytest.warns(UserWarning, match='did not converge'):
+        opt_result = my_ctrl._actor_solve_local(action_sqn_init, observation)
+        
+    assert my_ctrl._actor_cost(opt_result.x, observation) < my_ctrl._actor_cost(action_sqn_init, observation)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import models
+
+def make_model(rng, dim_state=4, dim_input=2, dim_output=3):
+    return models.ModelSS(0.5 * rng.normal(size=[dim_state, dim_state]),
+                          rng.normal(size=[dim_state, dim_input]),
+                          rng.normal(size=[dim_output, dim_state]),
+                          rng.normal(size=[dim_output, dim_input]),
+                          rng.normal(size=dim_state))
+
+def sim_loop(model, action_sqn, x0):
+    """
+    Output sequence of the model computed step by step.
+    
+    """
+    state = x0
+    observation_sqn = np.zeros( [action_sqn.shape[0], model.C.shape[0]] )
+    for k in range(action_sqn.shape[0]):
+        observation_sqn[k, :] = model.C @ state + model.D @ action_sqn[k, :]
+        state = model.A @ state + model.B @ action_sqn[k, :]
+        
+    return observation_sqn
+
+@pytest.mark.parametrize('is_x0_batched', [0, 1])
+def test_sim_batch_matches_loop(is_x0_batched):
+    rng = np.random.default_rng(0)
+    model = make_model(rng)
+    action_sqns = rng.normal(size=[6, 7, 2])
+    
+    if is_x0_batched:
+        x0 = rng.normal(size=[6, 4])
+        observation_sqns = model.sim_batch(action_sqns, x0)
+    else:
+        x0 = np.tile(model.x0est, [6, 1])
+        observation_sqns = model.sim_batch(action_sqns)
+    
+    assert observation_sqns.shape == (6, 7, 3)
+    for i in range(6):
+        np.testing.assert_allclose(observation_sqns[i], sim_loop(model, action_sqns[i], x0[i]))
+
+def test_sim_batch_cache_invalidated_by_upd_pars():
+    rng = np.random.default_rng(0)
+    model = make_model(rng)
+    action_sqns = rng.normal(size=[2, 5, 2])
+    model.sim_batch(action_sqns)
+    
+    model_new = make_model(rng)
+    model.upd_pars(model_new.A, model_new.B, model_new.C, model_new.D)
+    observation_sqns = model.sim_batch(action_sqns)
+    
+    for i in range(2):
+        np.testing.assert_allclose(observation_sqns[i], sim_loop(model, action_sqns[i], model.x0est))
+
+def make_id_data(rng, A, B, T):
+    observations = np.zeros( [T, A.shape[0]] )
+    observations[0, :] = rng.normal(size=A.shape[0])
+    actions = rng.normal(size=[T, B.shape[1]])
+    for k in range(T - 1):
+        observations[k+1, :] = A @ observations[k, :] + B @ actions[k, :]
+        
+    return observations, actions
+
+def test_identifier_recovers_model():
+    rng = np.random.default_rng(0)
+    A = np.array([[0.9, 0.1, 0.0], [0.0, 0.8, 0.2], [-0.1, 0.0, 0.95]])
+    B = rng.normal(size=[3, 2])
+    observations, actions = make_id_data(rng, A, B, 50)
+    identifier = models.IdentifierSS(3, 2)
+    
+    # Consecutive chunks share a sample, so that no pair is lost
+    identifier.update(observations[:20], actions[:20])
+    identifier.update(observations[19:], actions[19:])
+    
+    np.testing.assert_allclose(identifier.model.A, A, atol=1e-4)
+    np.testing.assert_allclose(identifier.model.B, B, atol=1e-4)
+    np.testing.assert_allclose(identifier.model.sim_batch(actions[np.newaxis, :-1], observations[0])[0], observations[:-1], atol=1e-3)
+
+def test_identifier_reset():
+    rng = np.random.default_rng(0)
+    observations, actions = make_id_data(rng, 0.5 * np.eye(3), rng.normal(size=[3, 2]), 10)
+    identifier = models.IdentifierSS(3, 2)
+    identifier.update(observations, actions)
+    
+    identifier.reset()
+    
+    np.testing.assert_array_equal(identifier.model.A, np.eye(3))
+    np.testing.assert_array_equal(identifier.model.B, np.zeros( [3, 2] ))
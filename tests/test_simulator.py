@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+import simulator
+
+def make_simulator(my_sys, state_init=[-2.0, -1.5, 0.8], **kwargs):
+    return simulator.Simulator(sys_type = "diff_eqn",
+                               closed_loop_rhs = my_sys.closed_loop_rhs,
+                               sys_out = my_sys.out,
+                               state_init = np.array(state_init),
+                               action_init = np.zeros(2),
+                               t0 = 0,
+                               t1 = 10,
+                               dt = 0.1,
+                               closed_loop_step = my_sys.closed_loop_step,
+                               **kwargs)
+
+def test_exact_solver_matches_rk45(make_sys, ctrl_bnds):
+    rng = np.random.default_rng(0)
+    actions = rng.uniform(ctrl_bnds[:, 0], ctrl_bnds[:, 1], [20, 2])
+    
+    sys_exact = make_sys()
+    sim_exact = make_simulator(sys_exact, solver='exact')
+    
+    sys_rk45 = make_sys()
+    sim_rk45 = make_simulator(sys_rk45, solver='RK45', is_event_driven=1, atol=1e-12, rtol=1e-12)
+    
+    for action in actions:
+        sys_exact.receive_action(action)
+        sys_rk45.receive_action(action)
+        
+        sim_exact.sim_step()
+        sim_rk45.sim_step()
+        
+        t_exact, _, observation_exact, _ = sim_exact.get_sim_step_data()
+        t_rk45, _, observation_rk45, _ = sim_rk45.get_sim_step_data()
+        
+        assert np.isclose(t_exact, t_rk45)
+        np.testing.assert_allclose(observation_exact, observation_rk45, atol=1e-8)
+
+def test_discr_prob_reproducible_and_batch_pdf_agrees():
+    mu = np.array([0.5, -0.3])
+    
+    def pdf(proposal):
+        return np.exp( -0.5 * np.sum( ((proposal - mu)/0.7)**2, axis=-1 ) ) / (2*np.pi*0.49)
+    
+    def sim_states(is_batch_pdf, seed):
+        my_simulator = simulator.Simulator(sys_type = "discr_prob",
+                                           closed_loop_rhs = pdf,
+                                           sys_out = lambda state: state,
+                                           state_init = np.zeros(2),
+                                           dt = 1,
+                                           is_batch_pdf = is_batch_pdf,
+                                           seed = seed)
+        states = []
+        for _ in range(200):
+            my_simulator.sim_step()
+            states.append(my_simulator.state.copy())
+            
+        return np.array(states)
+    
+    states = sim_states(0, 3)
+    
+    np.testing.assert_array_equal(states, sim_states(0, 3))
+    np.testing.assert_allclose(states, sim_states(1, 3))
+
+def test_event_driven_interp_data_and_reset(make_sys):
+    my_sys = make_sys()
+    my_simulator = make_simulator(my_sys, solver='RK45', is_event_driven=1, Ninterp=5)
+    my_sys.receive_action(np.array([1.0, 0.5]))
+    
+    my_simulator.sim_step()
+    interp_ts, interp_states, _ = my_simulator.get_interp_data()
+    
+    np.testing.assert_allclose(interp_ts, np.linspace(0, 0.1, 6))
+    np.testing.assert_allclose(interp_states[-1], my_simulator.state)
+    
+    my_simulator.reset()
+    interp_ts, interp_states, _ = my_simulator.get_interp_data()
+    
+    np.testing.assert_array_equal(interp_ts, [0])
+    np.testing.assert_array_equal(interp_states, [[-2.0, -1.5, 0.8]])
+
+@pytest.mark.parametrize('solver', ['RK4', 'exact'])
+def test_event_driven_requires_rk45(solver, make_sys):
+    with pytest.raises(ValueError):
+        make_simulator(make_sys(), solver=solver, is_event_driven=1)
+
+@pytest.mark.parametrize('solver, is_event_driven', [('RK45', 0), ('RK45', 1), ('RK4', 0), ('exact', 0)])
+def test_sys_tracks_sim_state(solver, is_event_driven, make_sys):
+    my_sys = make_sys()
+    my_simulator = make_simulator(my_sys, solver=solver, is_event_driven=is_event_driven)
+    my_sys.receive_action(np.array([1.0, 0.5]))
+    
+    for _ in range(3):
+        my_simulator.sim_step()
+        
+        np.testing.assert_array_equal(my_sys._state, my_simulator.state)
+
+def make_vec_simulator(my_sys, ctrl_bnds, state_inits, t1=10, **kwargs):
+    return simulator.VecSimulator(state_dyn = my_sys._state_dyn,
+                                  sys_out = my_sys.out,
+                                  state_inits = state_inits,
+                                  ctrl_bnds = ctrl_bnds,
+                                  t0 = 0,
+                                  t1 = t1,
+                                  dt = 0.1,
+                                  **kwargs)
+
+def test_vec_simulator_matches_rk4(make_sys, ctrl_bnds):
+    rng = np.random.default_rng(0)
+    state_inits = rng.normal(size=[3, 3])
+    # Actions partly outside of the control constraints, which both simulators enforce
+    actions = rng.uniform(1.5*ctrl_bnds[:, 0], 1.5*ctrl_bnds[:, 1], [20, 3, 2])
+    
+    my_vec_simulator = make_vec_simulator(make_sys(), ctrl_bnds, state_inits)
+    for k in range(20):
+        my_vec_simulator.sim_step(actions[k])
+        
+    for i in range(3):
+        my_sys = make_sys()
+        my_simulator = make_simulator(my_sys, solver='RK4', state_init=state_inits[i])
+        for k in range(20):
+            my_sys.receive_action( np.clip(actions[k, i], ctrl_bnds[:, 0], ctrl_bnds[:, 1]) )
+            my_simulator.sim_step()
+            
+        np.testing.assert_allclose(my_vec_simulator.states[i], my_simulator.state, rtol=1e-12, atol=1e-12)
+        
+    np.testing.assert_allclose(my_vec_simulator.ts, 2.0)
+
+def test_vec_simulator_resets_done_envs(make_sys, ctrl_bnds):
+    state_inits = np.array([[-2.0, -1.5, 0.8], [0.1, 0.0, 0.0], [1.0, 1.0, -0.5]])
+    actions = np.tile([1.0, 0.5], [3, 1])
+    my_vec_simulator = make_vec_simulator(make_sys(), ctrl_bnds, state_inits, t1=0.5,
+                                          is_terminal=lambda observations: np.linalg.norm(observations[:, :2], axis=1) < 0.2)
+    
+    # The second environment starts within the target area, so its episodes end after every step
+    ts, observations, is_done = my_vec_simulator.sim_step(actions)
+    
+    np.testing.assert_array_equal(is_done, [0, 1, 0])
+    np.testing.assert_array_equal(ts, [0.1, 0.0, 0.1])
+    np.testing.assert_array_equal(observations[1], state_inits[1])
+    
+    for k in range(4):
+        ts, observations, is_done = my_vec_simulator.sim_step(actions)
+        
+    np.testing.assert_array_equal(is_done, [1, 1, 1])
+    np.testing.assert_allclose(my_vec_simulator.final_ts, [0.5, 0.1, 0.5])
+    np.testing.assert_array_equal(my_vec_simulator.states, state_inits)
+    np.testing.assert_array_equal(my_vec_simulator.Nepisodes, [1, 5, 1])
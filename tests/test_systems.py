@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import scipy as sp
+import scipy.integrate
+
+import systems
+
+@pytest.mark.parametrize('action', [[1.5, 0.8], [-0.7, -2.5], [2.0, 0.0], [0.0, 1.0]])
+def test_state_dyn_jac_matches_finite_differences(action, make_sys):
+    my_sys = make_sys()
+    state = np.array([-1.0, 0.5, 0.7])
+    action = np.array(action)
+    eps = 1e-6
+    
+    Dstate_state, Dstate_action = my_sys._state_dyn_jac([], state, action)
+    
+    for k in range(3):
+        delta = eps * np.eye(3)[k]
+        Dstate_state_num = ( my_sys._state_dyn([], state + delta, action) - my_sys._state_dyn([], state - delta, action) ) / (2*eps)
+        np.testing.assert_allclose(Dstate_state[:, k], Dstate_state_num, atol=1e-8)
+        
+    for k in range(2):
+        delta = eps * np.eye(2)[k]
+        Dstate_action_num = ( my_sys._state_dyn([], state, action + delta) - my_sys._state_dyn([], state, action - delta) ) / (2*eps)
+        np.testing.assert_allclose(Dstate_action[:, k], Dstate_action_num, atol=1e-8)
+
+def test_state_dyn_batched_matches_single(make_sys):
+    my_sys = make_sys()
+    rng = np.random.default_rng(0)
+    states = rng.normal(size=[4, 5, 3])
+    actions = rng.normal(size=[4, 5, 2])
+    
+    Dstates = my_sys._state_dyn([], states, actions)
+    
+    for i in range(4):
+        for j in range(5):
+            np.testing.assert_allclose(Dstates[i, j], my_sys._state_dyn([], states[i, j], actions[i, j]))
+
+def test_closed_loop_rhs_writes_into_out(make_sys):
+    my_sys = make_sys()
+    my_sys.receive_action(np.array([1.5, 0.8]))
+    state = np.array([-1.0, 0.5, 0.7])
+    out = np.zeros(3)
+    
+    Dstate = my_sys.closed_loop_rhs(0, state, out=out)
+    
+    assert Dstate is out
+    np.testing.assert_array_equal(out, my_sys.closed_loop_rhs(0, state))
+
+def test_state_dyn_keeps_single_precision(make_sys):
+    my_sys = make_sys()
+    states = np.ones([4, 3], dtype=np.float32)
+    actions = np.ones([4, 2], dtype=np.float32)
+    
+    assert my_sys._state_dyn([], states, actions).dtype == np.float32
+    assert my_sys._state_dyn([], states.astype(np.float64), actions).dtype == np.float64
+
+@pytest.mark.parametrize('action', [[1.5, 0.8], [-0.7, -2.5], [2.0, 0.0], [5.0, 10.0]])
+def test_closed_loop_step_matches_rk45(action, make_sys):
+    my_sys = make_sys()
+    my_sys.receive_action(np.array(action))
+    state = np.array([-1.0, 0.5, 0.7])
+    dt = 0.1
+    
+    sol = sp.integrate.solve_ivp(my_sys.closed_loop_rhs, [0, dt], state, method='RK45', rtol=1e-12, atol=1e-12)
+    
+    np.testing.assert_allclose(my_sys.closed_loop_step(0, state, dt), sol.y[:, -1], atol=1e-9)
+
+def test_disturb_reproducible_by_seed(ctrl_bnds):
+    def disturb_sqn(seed):
+        my_sys = systems.Sys3WRobotNI(sys_type="diff_eqn",
+                                      dim_state=3,
+                                      dim_input=2,
+                                      dim_output=3,
+                                      dim_disturb=2,
+                                      pars=[],
+                                      ctrl_bnds=ctrl_bnds,
+                                      is_disturb=1,
+                                      pars_disturb=[np.array([0.5, 0.5]), np.zeros(2), np.array([10.0, 10.0])],
+                                      seed=seed)
+        
+        return np.array([ my_sys._disturb_dyn(0, np.ones( [5, 2] )) for _ in range(1000) ])
+    
+    np.testing.assert_array_equal(disturb_sqn(0), disturb_sqn(0))
+    assert not np.array_equal(disturb_sqn(0), disturb_sqn(1))
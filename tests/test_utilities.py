@@ -0,0 +1,171 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+import utilities
+
+def poly_features_ref(critic_struct, observation, action):
+    """
+    Features of a single observation and action, composed term by term.
+    
+    """
+    chi = np.concatenate([observation, action])
+    
+    if critic_struct == 'quad-lin':
+        return np.concatenate([ utilities.uptria2vec( np.outer(chi, chi) ), chi ])
+    elif critic_struct == 'quadratic':
+        return utilities.uptria2vec( np.outer(chi, chi) )
+    elif critic_struct == 'quad-nomix':
+        return chi * chi
+    elif critic_struct == 'quad-mix':
+        return np.concatenate([ observation**2, np.kron(observation, action), action**2 ])
+    elif critic_struct == 'poly3':
+        return np.concatenate([ utilities.uptria2vec( np.outer(chi**2, chi) ), utilities.uptria2vec( np.outer(chi, chi) ) ])
+    elif critic_struct == 'poly4':
+        return np.concatenate([ utilities.uptria2vec( np.outer(chi**2, chi**2) ),
+                                utilities.uptria2vec( np.outer(chi**2, chi) ),
+                                utilities.uptria2vec( np.outer(chi, chi) ) ])
+
+critic_structs = ['quad-lin', 'quadratic', 'quad-nomix', 'quad-mix', 'poly3', 'poly4']
+
+@pytest.mark.parametrize('critic_struct', critic_structs)
+def test_poly_features_match_reference(critic_struct):
+    feature_map = utilities.PolyFeatures(critic_struct, 3, 2)
+    rng = np.random.default_rng(0)
+    observations = rng.normal(size=[4, 5, 3])
+    actions = rng.normal(size=[4, 5, 2])
+    
+    features = feature_map(observations, actions)
+    
+    assert features.shape == (4, 5, feature_map.dim)
+    for i in range(4):
+        for j in range(5):
+            np.testing.assert_allclose(features[i, j], poly_features_ref(critic_struct, observations[i, j], actions[i, j]))
+
+@pytest.mark.parametrize('critic_struct', critic_structs)
+def test_poly_features_jac_matches_finite_differences(critic_struct):
+    feature_map = utilities.PolyFeatures(critic_struct, 3, 2)
+    rng = np.random.default_rng(1)
+    chi = rng.normal(size=5)
+    eps = 1e-6
+    
+    jac = feature_map.jac(chi[:3], chi[3:])
+    
+    assert jac.shape == (feature_map.dim, 5)
+    for k in range(5):
+        delta = np.zeros(5)
+        delta[k] = eps
+        jac_num = ( feature_map(chi[:3] + delta[:3], chi[3:] + delta[3:]) - feature_map(chi[:3] - delta[:3], chi[3:] - delta[3:]) ) / (2*eps)
+        np.testing.assert_allclose(jac[:, k], jac_num, atol=1e-6)
+
+def test_poly_features_reject_unknown_struct():
+    with pytest.raises(ValueError):
+        utilities.PolyFeatures('cubic', 3, 2)
+
+def test_ring_buffer_matches_push_vec():
+    rng = np.random.default_rng(0)
+    init_val = np.array([1.0, -1.0])
+    buffer = utilities.RingBuffer(5, 2, init_val)
+    stack = np.tile(init_val, [5, 1])
+    
+    for k in range(12):
+        vec = rng.normal(size=2)
+        buffer.push(vec)
+        stack = utilities.push_vec(stack, vec)
+        
+        np.testing.assert_array_equal(buffer.view(), stack)
+        assert buffer.count == min(k + 1, 5)
+
+@pytest.mark.parametrize('T', [1, 3, 5, 8])
+def test_ring_buffer_extend_matches_push(T):
+    rng = np.random.default_rng(0)
+    buffer_pushed = utilities.RingBuffer(5, 2)
+    buffer_extended = utilities.RingBuffer(5, 2)
+    
+    for _ in range(3):
+        block = rng.normal(size=[T, 2])
+        for vec in block:
+            buffer_pushed.push(vec)
+        buffer_extended.extend(block)
+        
+        np.testing.assert_array_equal(buffer_extended.view(), buffer_pushed.view())
+        assert buffer_extended.count == buffer_pushed.count
+
+def test_ring_buffer_reset():
+    buffer = utilities.RingBuffer(4, 2)
+    buffer.extend(np.ones( [3, 2] ))
+    buffer.reset(np.array([2.0, 3.0]))
+    
+    np.testing.assert_array_equal(buffer.view(), np.tile([2.0, 3.0], [4, 1]))
+    assert buffer.count == 0
+
+def lfilter_ref(filter_num, filter_den, init_val, signal_sqn):
+    """
+    Whole signal filtered offline, starting in the steady state of ``init_val``.
+    
+    """
+    zi = np.outer( signal.lfilter_zi(filter_num, filter_den), init_val )
+    
+    return signal.lfilter(filter_num, filter_den, signal_sqn, axis=0, zi=zi)[0]
+
+def test_dfilter_streaming_matches_lfilter():
+    filter_num, filter_den = signal.butter(3, 0.2)
+    rng = np.random.default_rng(0)
+    init_val = np.array([0.5, -1.0, 2.0])
+    signal_sqn = rng.normal(size=[40, 3])
+    dfilter = utilities.DFilter(filter_num, filter_den, buffer_size=8, init_val=init_val)
+    
+    filtered = np.array([ dfilter.filt(signal_val) for signal_val in signal_sqn ])
+    
+    np.testing.assert_allclose(filtered, lfilter_ref(filter_num, filter_den, init_val, signal_sqn))
+    np.testing.assert_array_equal(dfilter.buffer.view(), signal_sqn[-8:])
+
+def test_dfilter_blocks_match_lfilter():
+    filter_num, filter_den = signal.butter(3, 0.2)
+    rng = np.random.default_rng(0)
+    init_val = np.array([0.5, -1.0])
+    signal_sqn = rng.normal(size=[40, 2])
+    dfilter = utilities.DFilter(filter_num, filter_den, init_val=init_val)
+    
+    filtered = np.concatenate([ dfilter.filt(signal_sqn[:25]), [dfilter.filt(signal_sqn[25])], dfilter.filt(signal_sqn[26:]) ])
+    
+    np.testing.assert_allclose(filtered, lfilter_ref(filter_num, filter_den, init_val, signal_sqn))
+
+def test_dfilter_samples_only_at_sample_times():
+    filter_num, filter_den = signal.butter(2, 0.3)
+    rng = np.random.default_rng(0)
+    init_val = np.zeros(2)
+    signal_sqn = rng.normal(size=[10, 2])
+    dfilter = utilities.DFilter(filter_num, filter_den, init_val=init_val, sample_time=0.5)
+    
+    # Two calls per sample time, the second of which falls within the same sample
+    filtered = []
+    for k in range(10):
+        filtered.append( dfilter.filt(signal_sqn[k], t=0.5*(k + 1)).copy() )
+        np.testing.assert_array_equal(dfilter.filt(rng.normal(size=2), t=0.5*(k + 1) + 0.25), filtered[-1])
+        
+    np.testing.assert_allclose(filtered, lfilter_ref(filter_num, filter_den, init_val, signal_sqn))
+
+def take_sqn(noise_blocks, shapes):
+    return [ noise_blocks.take(shape).copy() for shape in shapes ]
+
+def test_noise_blocks_reproducible():
+    shapes = [3, [2, 3], 1, [4, 2], 20, 3]
+    
+    samples = take_sqn(utilities.NoiseBlocks(block_size=8, rng=np.random.default_rng(0)), shapes)
+    
+    for sample, shape in zip(samples, shapes):
+        assert sample.shape == np.empty(shape).shape
+    for sample, sample_rerun in zip(samples, take_sqn(utilities.NoiseBlocks(block_size=8, rng=np.random.default_rng(0)), shapes)):
+        np.testing.assert_array_equal(sample, sample_rerun)
+    assert not np.array_equal(samples[0], take_sqn(utilities.NoiseBlocks(block_size=8, rng=np.random.default_rng(1)), shapes)[0])
+
+def test_noise_blocks_serve_generator_stream():
+    noise_blocks = utilities.NoiseBlocks(block_size=8, rng=np.random.default_rng(0))
+    rng = np.random.default_rng(0)
+    
+    # Requests within a block are consecutive samples, the remainder of a block that does not fit a request is skipped
+    samples = take_sqn(noise_blocks, [3, 3, 3])
+    block = rng.standard_normal(8)
+    np.testing.assert_array_equal(np.concatenate(samples[:2]), block[:6])
+    np.testing.assert_array_equal(samples[2], rng.standard_normal(8)[:3])
@@ -47,6 +47,108 @@ def rej_sampling_rvs(dim, pdf, M):
         if unif_sample < pdf(proposal_sample) / M / normal_RV.pdf(proposal_sample):
             return proposal_sample
         
+        curr_iter += 1
+        
+class RejSampler:
+    """
+    Vectorized rejection sampler. Same as :func:`~utilities.rej_sampling_rvs`, but proposals are drawn and accepted in blocks 
+    and realizations for many independent random variables (say, next states of many environments) are produced at once.
+    
+    The proposal distribution is the standard normal one, whose density is evaluated directly (no distribution objects are created per call).
+    
+    Attributes
+    ----------
+    dim : : integer
+        Dimension of the random variable.
+    pdf : : function
+        Desired probability density function. It must accept an array of proposals of shape ``[Nenvs, block_size, dim]`` and return the densities of shape ``[Nenvs, block_size]``,
+        where row ``i`` is evaluated with the desired density of the ``i``-th random variable.
+    M : : number greater than 1
+        It must hold that :math:`\\text{pdf}_{\\text{desired}} \\le M \\text{pdf}_{\\text{proposal}}`. The expected acceptance rate is :math:`1/M`.
+    block_size : : natural number
+        Number of proposals per random variable and iteration.
+    max_iters : : natural number
+        Hard cap on the number of iterations (blocks).
+    rng : : ``numpy.random.Generator``
+        Random number generator.
+    
+    """
+    def __init__(self, dim, pdf, M, block_size=32, max_iters=1000, rng=None):
+        self.dim = dim
+        self.pdf = pdf
+        self.M = M
+        self.block_size = block_size
+        self.max_iters = max_iters
+        self.rng = rng if rng is not None else np.random.default_rng()
+        
+        self._proposal_pdf_const = ( 2*np.pi )**( -dim/2 )
+        
+    def sample(self, Nenvs=1):
+        """
+        Realizations of shape ``[Nenvs, dim]``.
+        
+        """
+        samples = np.zeros( [Nenvs, self.dim] )
+        is_done = np.zeros(Nenvs, dtype=bool)
+        
+        for _ in range(self.max_iters):
+            proposals = self.rng.standard_normal( [Nenvs, self.block_size, self.dim] )
+            
+            proposal_pdfs = self._proposal_pdf_const * np.exp( -0.5 * np.sum(proposals**2, axis=-1) )
+            
+            is_accepted = self.rng.random( [Nenvs, self.block_size] ) * self.M * proposal_pdfs < self.pdf(proposals)
+            
+            is_new = np.any(is_accepted, axis=1) & ~is_done
+            samples[is_new, :] = proposals[is_new, np.argmax(is_accepted[is_new, :], axis=1), :]
+            is_done |= is_new
+            
+            if np.all(is_done):
+                return samples
+            
+        raise RuntimeError('Rejection sampling did not produce all realizations within {} iterations'.format(self.max_iters))
+        
+class NoiseBlocks:
+    """
+    Source of standard normal noise. Samples are drawn ahead of time in blocks and handed out by index, 
+    so that frequent small requests (say, per right-hand side evaluation of a disturbance model) do not each call the generator.
+    
+    Requests of any shape are served, e.g., ``[dim_disturb]`` for a single system or ``[Nenvs, dim_disturb]`` for many environments.
+    For a fixed seed and sequence of requests, the samples are reproducible.
+    
+    Attributes
+    ----------
+    block_size : : natural number
+        Number of samples per block. Requests larger than a block are drawn directly.
+    rng : : ``numpy.random.Generator``
+        Random number generator.
+    
+    """
+    def __init__(self, block_size=4096, rng=None):
+        self.block_size = block_size
+        self.rng = rng if rng is not None else np.random.default_rng()
+        
+        self._block = np.zeros(block_size)
+        self._idx = block_size
+        
+    def take(self, shape):
+        """
+        Next samples, as an array of the given shape. The result is a view into the current block: use it right away or copy it, since the block is refilled later on.
+        
+        """
+        Nsamples = int( np.prod(shape) )
+        
+        if Nsamples > self.block_size:
+            return self.rng.standard_normal(shape)
+        
+        if self._idx + Nsamples > self.block_size:
+            self.rng.standard_normal(out=self._block)
+            self._idx = 0
+            
+        samples = self._block[self._idx:self._idx + Nsamples]
+        self._idx += Nsamples
+        
+        return samples.reshape(shape)
+        
 def to_col_vec(argin):
     """
     Convert input to a column vector.
@@ -70,22 +172,156 @@ def rep_mat(argin, n, m):
 def push_vec(matrix, vec):
     return np.vstack([matrix[1:,:], vec])
 
+class RingBuffer:
+    """
+    Preallocated ring buffer of the last ``size`` vectors, a replacement for stacks updated by :func:`~utilities.push_vec`.
+    
+    Every vector is written twice, at positions ``pos`` and ``pos + size`` of a storage of ``2*size`` rows.
+    Thus, a push costs :math:`O(dim)` independently of ``size`` and the chronologically ordered contents (the oldest row first, the newest one last) 
+    are always a contiguous slice of the storage, returned without copying by :func:`~utilities.RingBuffer.view`.
+    
+    Attributes
+    ----------
+    size : : natural number
+        Number of stored vectors.
+    dim : : natural number
+        Dimension of the vectors.
+    count : : natural number
+        Number of vectors pushed since the last reset, saturated at ``size``.
+    
+    """
+    def __init__(self, size, dim, init_val=0):
+        self.size = size
+        self.dim = dim
+        self._data = np.zeros( [2*size, dim] )
+        
+        self.reset(init_val)
+        
+    def reset(self, init_val=0):
+        """
+        Fill the buffer with ``init_val`` (a number or a vector), reusing the storage.
+        
+        """
+        self._data[:] = init_val
+        self._pos = 0
+        self.count = 0
+        
+    def push(self, vec):
+        self._data[self._pos, :] = vec
+        self._data[self._pos + self.size, :] = vec
+        self._pos = (self._pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        
+    def extend(self, block):
+        """
+        Push the rows of ``block`` (of shape ``[T, dim]``) in order. Only the last ``size`` rows are written.
+        
+        """
+        T = block.shape[0]
+        Twrite = min(T, self.size)
+        
+        self._pos = (self._pos + T) % self.size
+        idx = (self._pos - Twrite + np.arange(Twrite)) % self.size
+        
+        self._data[idx, :] = block[-Twrite:, :]
+        self._data[idx + self.size, :] = block[-Twrite:, :]
+        self.count = min(self.count + T, self.size)
+        
+    def view(self):
+        """
+        Contents of shape ``[size, dim]`` in chronological order. 
+        This is a view into the storage: it is overwritten by subsequent pushes and must not be modified.
+        
+        """
+        return self._data[self._pos:self._pos + self.size, :]
+
 def uptria2vec(mat):
     """
     Convert upper triangular square sub-matrix to column vector.
     
     """    
-    n = mat.shape[0]
+    return mat[np.triu_indices(mat.shape[0])]
+
+class PolyFeatures:
+    """
+    Polynomial features of the critic structures of :class:`~controllers.ControllerOptimalPredictive`.
+    
+    Every feature is a product of two entries of the extended vector :math:`[\\chi, \\chi^2, 1]`, where :math:`\\chi = [observation, action]` and the square is element-wise.
+    The index arrays of the factors are precomputed once per structure, so that the features of a whole batch are computed by a single fancy-indexing operation.
     
-    vec = np.zeros( (int(n*(n+1)/2)) )
+    Attributes
+    ----------
+    critic_struct : : string
+        Structure of the features, one of ``'quad-lin'``, ``'quadratic'``, ``'quad-nomix'``, ``'quad-mix'``, ``'poly3'``, ``'poly4'``.
+        See :class:`~controllers.ControllerOptimalPredictive`.
+    dim : : natural number
+        Number of features.
     
-    k = 0
-    for i in range(n):
-        for j in range(n):
-            vec[j] = mat[i, j]
-            k += 1
+    """
+    def __init__(self, critic_struct, dim_output, dim_input):
+        self.critic_struct = critic_struct
+        
+        n = dim_output + dim_input
+        
+        # Positions of chi, chi^2 and 1 in the extended vector
+        lin = np.arange(n)
+        sq = n + np.arange(n)
+        one = 2*n
+        
+        iu, ju = np.triu_indices(n)
+        
+        if critic_struct == 'quad-lin':
+            pairs = [ (iu, ju), (lin, np.full(n, one)) ]
+        elif critic_struct == 'quadratic':
+            pairs = [ (iu, ju) ]
+        elif critic_struct == 'quad-nomix':
+            pairs = [ (lin, lin) ]
+        elif critic_struct == 'quad-mix':
+            iy, ju_mix = np.meshgrid(np.arange(dim_output), dim_output + np.arange(dim_input), indexing='ij')
+            pairs = [ (lin[:dim_output], lin[:dim_output]),
+                      (iy.ravel(), ju_mix.ravel()),
+                      (lin[dim_output:], lin[dim_output:]) ]
+        elif critic_struct == 'poly3':
+            pairs = [ (sq[iu], ju), (iu, ju) ]
+        elif critic_struct == 'poly4':
+            pairs = [ (sq[iu], sq[ju]), (sq[iu], ju), (iu, ju) ]
+        else:
+            raise ValueError('Invalid critic structure: ' + str(critic_struct))
             
-    return vec
+        self.idx_left = np.concatenate([ pair[0] for pair in pairs ])
+        self.idx_right = np.concatenate([ pair[1] for pair in pairs ])
+        
+        self.dim = self.idx_left.size
+        
+    def __call__(self, observations, actions):
+        """
+        Features of observations and actions with arbitrary (equal) leading dimensions.
+        Returns an array of shape ``[..., dim]``.
+        
+        """
+        chi = np.concatenate([observations, actions], axis=-1)
+        
+        chi_ext = np.concatenate([chi, chi*chi, np.ones( chi.shape[:-1] + (1,) )], axis=-1)
+        
+        return chi_ext[..., self.idx_left] * chi_ext[..., self.idx_right]
+    
+    def jac(self, observations, actions):
+        """
+        Jacobian of the features with respect to :math:`\\chi = [observation, action]`.
+        Returns an array of shape ``[..., dim, dim_output + dim_input]``.
+        
+        """
+        chi = np.concatenate([observations, actions], axis=-1)
+        n = chi.shape[-1]
+        
+        chi_ext = np.concatenate([chi, chi*chi, np.ones( chi.shape[:-1] + (1,) )], axis=-1)
+        
+        chi_ext_jac = np.zeros( chi.shape[:-1] + (2*n + 1, n) )
+        chi_ext_jac[..., np.arange(n), np.arange(n)] = 1
+        chi_ext_jac[..., n + np.arange(n), np.arange(n)] = 2*chi
+        
+        return ( chi_ext_jac[..., self.idx_left, :] * chi_ext[..., self.idx_right, np.newaxis] 
+                 + chi_ext[..., self.idx_left, np.newaxis] * chi_ext_jac[..., self.idx_right, :] )
 
 class ZOH:
     """
@@ -109,31 +345,57 @@ class DFilter:
     """
     Real-time digital filter.
     
+    All channels are filtered at once: the filter state ``zi`` of shape ``[order, channels]`` is advanced by exactly the new sample(s) on each call,
+    so that the cost per sample does not depend on the buffer size.
+    
+    Attributes
+    ----------
+    filter_num, filter_den : : arrays
+        Numerator and denominator coefficients of the filter, as in ``scipy.signal.lfilter``.
+    buffer_size : : natural number
+        Size of the buffer of the last raw input samples.
+    init_val : : array of shape ``[channels, ]``
+        Initial signal value. The filter starts in the respective steady state.
+    sample_time : : number
+        Sampling time used if ``filt`` is called with the time argument.
+    
     """
     def __init__(self, filter_num, filter_den, buffer_size=16, init_time=0, init_val=0, sample_time=1):
         self.Num = filter_num
         self.Den = filter_den
-        self.zi = rep_mat( signal.lfilter_zi(filter_num, filter_den), 1, init_val.size)
+        self.zi = np.outer( signal.lfilter_zi(filter_num, filter_den), init_val )
         
         self.time_step = init_time
         self.sample_time = sample_time
-        self.buffer = rep_mat(init_val, 1, buffer_size)
+        self.buffer = RingBuffer(buffer_size, init_val.size, init_val)
+        self.val_filtered = np.array(init_val, dtype=np.float64)
         
     def filt(self, signal_val, t=None):
+        """
+        Filter a new sample of shape ``[channels, ]`` or a block of samples of shape ``[T, channels]`` (say, offline data) and return the filtered sample, resp., block.
+        
+        If ``t`` is specified, a sample is taken only at a new sample time. Otherwise, the last filtered sample is returned.
+        
+        """
         # Sample only if time is specified
         if t is not None:
             timeInSample = t - self.time_step
-            if timeInSample >= self.sample_time: # New sample
-                self.time_step = t
-                self.buffer = push_vec(self.buffer, signal_val)
-        else:
-            self.buffer = push_vec(self.buffer, signal_val)
+            if timeInSample < self.sample_time: # Not a new sample
+                return self.val_filtered
+            
+            self.time_step = t
+        
+        signal_block = np.reshape(signal_val, [-1, self.zi.shape[1]])
         
-        bufferFiltered = np.zeros(self.buffer.shape)
+        block_filtered, self.zi = signal.lfilter(self.Num, self.Den, signal_block, axis=0, zi=self.zi)
         
-        for k in range(0, signal_val.size):
-                bufferFiltered[k,:], self.zi[k] = signal.lfilter(self.Num, self.Den, self.buffer[k,:], zi=self.zi[k, :])
-        return bufferFiltered[-1,:]
+        self.buffer.extend(signal_block)
+        self.val_filtered = block_filtered[-1, :]
+        
+        if np.ndim(signal_val) < 2:
+            return self.val_filtered
+        else:
+            return block_filtered
     
 def dss_sim(A, B, C, D, uSqn, x0, y0):
     """
@@ -277,7 +277,13 @@ class Animator3WRobotNI(Animator):
         # xy plane  
         text_time = 't = {time:2.3f}'.format(time = t)
         upd_text(self.text_time_handle, text_time)
-        upd_line(self.line_traj, xCoord, yCoord)  # Update the robot's track on the plot
+        if not self.is_playback and self.simulator.Ninterp > 0:
+            # Event-driven simulator: draw the track between the samples from its dense output (the last point is the current sample)
+            interp_ts, interp_states, _ = self.simulator.get_interp_data()
+            
+            upd_line(self.line_traj, interp_states[1:, 0], interp_states[1:, 1])
+        else:
+            upd_line(self.line_traj, xCoord, yCoord)  # Update the robot's track on the plot
             
         
         self.robot_marker.rotate(alpha_deg)    # Rotate the robot on the plot  
@@ -285,8 +291,12 @@ class Animator3WRobotNI(Animator):
         self.scatter_sol = self.axs_xy_plane.scatter(xCoord, yCoord, marker=self.robot_marker.marker, s=400, c='b')
         
         # # Solution
-        upd_line(self.line_norm, t, la.norm([xCoord, yCoord]))
-        upd_line(self.line_alpha, t, alpha)
+        if not self.is_playback and self.simulator.Ninterp > 0:
+            upd_line(self.line_norm, interp_ts[1:], la.norm(interp_states[1:, :2], axis=1))
+            upd_line(self.line_alpha, interp_ts[1:], interp_states[1:, 2])
+        else:
+            upd_line(self.line_norm, t, la.norm([xCoord, yCoord]))
+            upd_line(self.line_alpha, t, alpha)
     
         # Cost
         upd_line(self.line_run_obj, t, run_obj)